@@ -0,0 +1,109 @@
+"""
+Admin import/export benchmark: django-import-export's default
+ModelResource for StressCalculation against StressCalculationResource.
+
+A throwaway SQLite database is seeded with excelexport.seeding, both
+resources export every row, and the exported dataset is imported back
+(updating each row in place):
+
+    python benchmarks/import_export_benchmark.py --rows 100000 --output io.json
+    python benchmarks/import_export_benchmark.py --rows 100000 --skip-default-import
+
+The default resource imports one row at a time, which takes a long time at
+100k rows; --skip-default-import only times its export.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'excel.settings')
+
+from suite import git_commit, setup_django  # noqa: E402
+
+
+def timed(fn):
+    """Run fn, returning (result, seconds, queries)"""
+    from django.db import connection
+
+    queries = 0
+
+    def count(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+    return result, elapsed, queries
+
+
+def bench_resource(resource, rows, import_data=True):
+    dataset, export_seconds, export_queries = timed(resource.export)
+    assert len(dataset) == rows, (len(dataset), rows)
+    results = {
+        'export_seconds': round(export_seconds, 3),
+        'export_queries': export_queries,
+        'export_rows_per_second': round(rows / export_seconds),
+    }
+    if import_data:
+        outcome, import_seconds, import_queries = timed(lambda: resource.import_data(dataset, raise_errors=True))
+        assert not outcome.has_errors()
+        results.update({
+            'import_seconds': round(import_seconds, 3),
+            'import_queries': import_queries,
+            'import_rows_per_second': round(rows / import_seconds),
+        })
+    return results
+
+
+def run(rows, database, skip_default_import):
+    setup_django(database)
+
+    from django.core.management import call_command
+    from import_export.resources import modelresource_factory
+
+    from excelexport.models import StressCalculation
+    from excelexport.resources import StressCalculationResource
+    from excelexport.seeding import seed_lab_data
+
+    call_command('migrate', verbosity=0)
+    print(f'seeding {rows} rows ...')
+    seed_lab_data(rows, seed=rows)
+
+    results = {'commit': git_commit(), 'rows': rows, 'benchmarks': {}}
+    print('default ModelResource ...')
+    results['benchmarks']['default'] = bench_resource(
+        modelresource_factory(StressCalculation)(), rows, import_data=not skip_default_import)
+    print('StressCalculationResource ...')
+    results['benchmarks']['bulk'] = bench_resource(StressCalculationResource(), rows)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000, help='StressCalculation rows to seed, export and import')
+    parser.add_argument('--skip-default-import', action='store_true', help='Only time the default resource export')
+    parser.add_argument('--database', help='SQLite file to use (default: a temporary file)')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    args = parser.parse_args()
+
+    database = args.database or os.path.join(tempfile.mkdtemp(), 'import_export_benchmark.sqlite3')
+    results = run(args.rows, database, args.skip_default_import)
+    for name, values in results['benchmarks'].items():
+        print(name, ' '.join(f'{key}={value}' for key, value in values.items()))
+
+    if args.output:
+        with open(args.output, 'w') as handle:
+            json.dump(results, handle, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+"""
+Query plans and latency of the hot report/admin queries with and without
+the indexes declared on the excelexport models.
+
+Runs against a throwaway SQLite database, never the project database:
+
+    python benchmarks/index_benchmark.py --rows 1000000 --output index_benchmark.json
+
+The database is seeded once, every query is timed with the indexes dropped,
+then the indexes are created, ANALYZE is run and the queries are timed again.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'excel.settings')
+
+
+def setup_django(database_path):
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = database_path
+
+    import django
+    django.setup()
+
+
+def seed(rows, seed_value=1234, batch_size=10000):
+    from excelexport.models import CountryGDP, InspectionReport, SampleParameters, StressCalculation
+
+    rng = random.Random(seed_value)
+    scales = [10, 25, 50, 100]
+    start = datetime(2024, 1, 1)
+
+    reports = InspectionReport.objects.bulk_create([
+        InspectionReport(date=date(2024, 1, 1) + timedelta(days=i % 365), batch_number=f'LOT-{i:05d}', section='12mm')
+        for i in range(max(rows // 1000, 1))
+    ])
+
+    for offset in range(0, rows, batch_size):
+        count = min(batch_size, rows - offset)
+        samples = SampleParameters.objects.bulk_create([
+            SampleParameters(
+                sample_number=f'S-{offset + i}',
+                heat_number=f'H-{rng.randrange(rows // 20 or 1):06d}',
+                mass=rng.uniform(3.5, 4.5),
+                length=1.0
+            )
+            for i in range(count)
+        ])
+        calculations = []
+        for i, sample in enumerate(samples):
+            scale = rng.choice(scales)
+            calculations.append(StressCalculation(
+                mass_per_meter=sample.mass,
+                cross_section_area=sample.mass / 0.00785,
+                yield_machine_reading=rng.uniform(9000, 15000),
+                tensile_machine_reading=rng.uniform(12000, 19000),
+                yield_stress=rng.uniform(400, 550),
+                tensile_stress=rng.uniform(550, 700),
+                division_type=f'Division {float(scale)}kgf',
+                sample_parameters=sample,
+                inspection_report=reports[(offset + i) * len(reports) // rows]
+            ))
+        StressCalculation.objects.bulk_create(calculations)
+        # created_at is auto_now_add; spread it over a year so range scans are realistic
+        StressCalculation.objects.filter(id__gte=calculations[0].id, id__lte=calculations[-1].id).update(
+            created_at=start + timedelta(seconds=(offset * 30))
+        )
+
+    CountryGDP.objects.bulk_create([
+        CountryGDP(name=f'Country {i % 5000:04d}', code=f'C{i % 5000:04d}', year=str(2013 + i % 4), value=i)
+        for i in range(rows)
+    ], batch_size=batch_size)
+
+
+def hot_queries():
+    """(label, queryset) pairs for the access paths the indexes target"""
+    from excelexport.models import CountryGDP, InspectionReport, SampleParameters, StressCalculation
+
+    middle_report = InspectionReport.objects.order_by('id').values_list('id', flat=True)[
+        InspectionReport.objects.count() // 2
+    ]
+    return [
+        ('stress_oldest_page', StressCalculation.objects.order_by('created_at')[:15]),
+        ('stress_lot_page', StressCalculation.objects.filter(
+            inspection_report_id=middle_report).order_by('created_at')[:15]),
+        ('stress_date_range', StressCalculation.objects.filter(
+            created_at__gte=datetime(2024, 6, 1), created_at__lt=datetime(2024, 6, 2)).order_by('created_at')),
+        ('stress_division_filter', StressCalculation.objects.filter(
+            division_type='Division 25.0kgf').order_by('-created_at')[:100]),
+        ('latest_inspection', InspectionReport.objects.order_by('-created_at')[:1]),
+        ('inspection_by_lot', InspectionReport.objects.filter(batch_number='LOT-00042')),
+        ('sample_by_heat', SampleParameters.objects.filter(heat_number='H-000042')),
+        ('gdp_year_page', CountryGDP.objects.filter(year='2015').order_by('name')[:30]),
+        ('gdp_name_page', CountryGDP.objects.order_by('name')[:30]),
+    ]
+
+
+def query_plan(queryset):
+    from django.db import connection
+
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def time_query(queryset, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        list(queryset.all())
+        timings.append((time.perf_counter() - started) * 1000)
+    return {
+        'median_ms': round(statistics.median(timings), 3),
+        'min_ms': round(min(timings), 3),
+    }
+
+
+def run_queries(repeat):
+    return {
+        label: {'plan': query_plan(queryset), **time_query(queryset, repeat)}
+        for label, queryset in hot_queries()
+    }
+
+
+def set_indexes(create):
+    from django.apps import apps
+    from django.db import connection
+
+    with connection.schema_editor() as editor:
+        for model in apps.get_app_config('excelexport').get_models():
+            for index in model._meta.indexes:
+                if create:
+                    editor.add_index(model, index)
+                else:
+                    editor.remove_index(model, index)
+    if create:
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000, help='StressCalculation and CountryGDP rows to seed')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per query')
+    parser.add_argument('--database', help='SQLite file to use (default: a temporary file)')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    args = parser.parse_args()
+
+    database = args.database or os.path.join(tempfile.mkdtemp(), 'index_benchmark.sqlite3')
+    setup_django(database)
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+    print(f'Seeding {args.rows} rows into {database} ...')
+    started = time.perf_counter()
+    seed(args.rows)
+    print(f'Seeded in {time.perf_counter() - started:.1f}s')
+
+    set_indexes(create=False)
+    before = run_queries(args.repeat)
+    set_indexes(create=True)
+    after = run_queries(args.repeat)
+
+    results = {
+        'rows': args.rows,
+        'queries': {
+            label: {'before': before[label], 'after': after[label]}
+            for label in before
+        }
+    }
+
+    for label, result in results['queries'].items():
+        print(f"\n{label}: {result['before']['median_ms']} ms -> {result['after']['median_ms']} ms")
+        print(f"  before: {'; '.join(result['before']['plan'])}")
+        print(f"  after:  {'; '.join(result['after']['plan'])}")
+
+    if args.output:
+        with open(args.output, 'w') as handle:
+            json.dump(results, handle, indent=2)
+
+
+if __name__ == '__main__':
+    main()
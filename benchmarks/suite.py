@@ -0,0 +1,258 @@
+"""
+Benchmark suite for the calculation engine, the intake view and the
+report/export views.
+
+Everything runs in-process through the Django test client against a
+throwaway SQLite database that is seeded up to each requested size with
+excelexport.seeding (the engine behind manage.py seed_lab_data):
+
+    python benchmarks/suite.py --sizes 1000,10000,100000 --output bench.json
+    python benchmarks/suite.py --sizes 1000000 --skip calibration,intake
+
+Results are written as JSON together with the current git commit, so two
+runs can be compared:
+
+    python benchmarks/suite.py --compare before.json after.json
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'excel.settings')
+
+SECTIONS = ('calibration', 'intake', 'report', 'exports')
+
+
+def setup_django(database_path):
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = database_path
+    # The test client talks to 'testserver'
+    settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'testserver']
+
+    import django
+    django.setup()
+
+
+def timings_summary(timings_ms):
+    timings_ms = sorted(timings_ms)
+    return {
+        'runs': len(timings_ms),
+        'median_ms': round(statistics.median(timings_ms), 4),
+        'min_ms': round(timings_ms[0], 4),
+        'p99_ms': round(timings_ms[min(len(timings_ms) - 1, int(len(timings_ms) * 0.99))], 4),
+    }
+
+
+def measure(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings_summary(timings)
+
+
+def measure_memory(fn):
+    """Peak Python allocation of one run, measured separately from timing"""
+    tracemalloc.start()
+    try:
+        fn()
+        return round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 2)
+    finally:
+        tracemalloc.stop()
+
+
+def bench_calibration(repeat):
+    import numpy as np
+    from excelexport.calclation import division_stress, division_stress_array
+
+    rng = np.random.default_rng(1234)
+    rows = 100000
+    scales = rng.choice([10.0, 25.0, 50.0, 100.0], rows)
+    yields = rng.uniform(9000, 15000, rows)
+    tensiles = rng.uniform(12000, 19000, rows)
+    areas = rng.uniform(450, 570, rows)
+    scalar_inputs = list(zip(scales[:10000].astype(int).tolist(), yields[:10000].tolist(),
+                             tensiles[:10000].tolist(), areas[:10000].tolist()))
+
+    def scalar():
+        for args in scalar_inputs:
+            division_stress(*args)
+
+    def batch():
+        division_stress_array(scales, yields, tensiles, areas)
+
+    return {
+        'scalar_10k_calls': measure(scalar, repeat),
+        'batch_100k_rows': measure(batch, repeat),
+    }
+
+
+def bench_intake(client, repeat):
+    rng = random.Random(1234)
+
+    def post():
+        record = {
+            'sample_parameters': {'sample_number': 'BENCH', 'heat_number': 'BENCH-H',
+                                  'mass': rng.uniform(3.5, 4.5), 'length': 1.0},
+            'water_system': {'water_pressure_in': 2.5, 'water_pressure_out': 1.8,
+                             'water_in_temperature': 25.0, 'water_out_temperature': 30.0},
+            'scale_load_measurements': {'utn_scale': rng.choice([10, 25, 50, 100]),
+                                        'yield_load_main_scale': 12000, 'yield_load_counter_part': 40,
+                                        'tensile_load_main_scale': 15000, 'tensile_load_counter_part': 60},
+        }
+        response = client.post('/advanced_materials_testing/', json.dumps(record), content_type='application/json')
+        assert response.status_code == 200, response.content
+
+    # Intake rows are removed again so they do not skew the seeded sizes
+    from excelexport.models import SampleParameters, StressCalculation
+    high_water = StressCalculation.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    result = {'post_single': measure(post, repeat * 40)}
+    StressCalculation.objects.filter(id__gt=high_water).delete()
+    SampleParameters.objects.filter(sample_number='BENCH').delete()
+    return result
+
+
+def consume(response):
+    """Drain a (streaming) response and return its size in bytes"""
+    assert response.status_code == 200, response.status_code
+    if response.streaming:
+        size = sum(len(chunk) for chunk in response.streaming_content)
+    else:
+        size = len(response.content)
+    response.close()
+    return size
+
+
+def bench_report(client, repeat):
+    return {
+        'first_page': measure(lambda: consume(client.get('/mechanical-inspection/')), repeat),
+        'summary_json': measure(lambda: consume(client.get('/mechanical-inspection/summary/')), repeat),
+    }
+
+
+def bench_exports(client, repeat):
+    exports = {
+        'countries_gdp_xlsx': '/countries_gdp_excel/',
+        'mechanical_inspection_csv': '/mechanical-inspection/export/?format=csv',
+        'mechanical_inspection_xlsx': '/mechanical-inspection/export/?format=xlsx',
+    }
+    results = {}
+    for label, url in exports.items():
+        size = consume(client.get(url))
+        results[label] = {
+            **measure(lambda: consume(client.get(url)), repeat),
+            'bytes': size,
+            'peak_memory_mb': measure_memory(lambda: consume(client.get(url))),
+        }
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes, repeat, skip, database):
+    setup_django(database)
+
+    from django.core.management import call_command
+    from django.test import Client
+
+    from excelexport.seeding import seed_lab_data
+
+    call_command('migrate', verbosity=0)
+    client = Client()
+    results = {'commit': git_commit(), 'repeat': repeat, 'benchmarks': {}}
+
+    if 'calibration' not in skip:
+        print('calibration ...')
+        results['benchmarks']['calibration'] = bench_calibration(repeat)
+
+    seeded = 0
+    for size in sizes:
+        print(f'seeding to {size} rows ...')
+        seed_lab_data(size - seeded, countries=size - seeded, seed=size)
+        seeded = size
+
+        sized = {}
+        if 'intake' not in skip:
+            sized['intake'] = bench_intake(client, repeat)
+        if 'report' not in skip:
+            sized['report'] = bench_report(client, repeat)
+        if 'exports' not in skip:
+            sized['exports'] = bench_exports(client, repeat)
+        results['benchmarks'][f'rows_{size}'] = sized
+
+    return results
+
+
+def flatten(tree, prefix=''):
+    for key, value in tree.items():
+        if isinstance(value, dict) and 'median_ms' not in value:
+            yield from flatten(value, f'{prefix}{key}.')
+        elif isinstance(value, dict):
+            yield f'{prefix}{key}', value
+
+
+def compare(before_path, after_path, threshold):
+    with open(before_path) as f:
+        before = dict(flatten(json.load(f)['benchmarks']))
+    with open(after_path) as f:
+        after = dict(flatten(json.load(f)['benchmarks']))
+
+    regressions = 0
+    for name in sorted(before.keys() & after.keys()):
+        old, new = before[name]['median_ms'], after[name]['median_ms']
+        ratio = new / old if old else float('inf')
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = '  REGRESSION'
+            regressions += 1
+        print(f'{name:60s} {old:12.3f} -> {new:12.3f} ms  x{ratio:.2f}{flag}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,10000', help='Comma separated StressCalculation row counts')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per benchmark')
+    parser.add_argument('--skip', default='', help=f'Comma separated sections to skip: {", ".join(SECTIONS)}')
+    parser.add_argument('--database', help='SQLite file to use (default: a temporary file)')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='Compare two result files')
+    parser.add_argument('--threshold', type=float, default=0.10, help='Slowdown reported as a regression')
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.threshold) else 0)
+
+    sizes = sorted(int(size) for size in args.sizes.split(','))
+    skip = {section for section in args.skip.split(',') if section}
+    database = args.database or os.path.join(tempfile.mkdtemp(), 'benchmark_suite.sqlite3')
+
+    results = run(sizes, args.repeat, skip, database)
+    for name, result in flatten(results['benchmarks']):
+        print(f"{name:60s} median {result['median_ms']:10.3f} ms")
+
+    if args.output:
+        with open(args.output, 'w') as handle:
+            json.dump(results, handle, indent=2)
+
+
+if __name__ == '__main__':
+    main()
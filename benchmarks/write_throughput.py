@@ -0,0 +1,230 @@
+"""
+Write throughput of advanced_materials_testing under concurrent submitters.
+
+In-process mode drives the view through the Django test client from one
+thread per submitter, against whatever database the environment selects:
+
+    python benchmarks/write_throughput.py --submitters 50 --requests 20
+    SQLITE_TUNING=0 python benchmarks/write_throughput.py --submitters 50
+    DB_ENGINE=postgresql DB_NAME=mls_bench python benchmarks/write_throughput.py
+
+SQLite runs use a throwaway database file unless --database is given.
+With --url the same load is sent over HTTP to a running server instead,
+e.g. gunicorn with several workers.
+
+--asgi drives excel.asgi:application (and so the async intake view) from
+one coroutine per submitter on a single event loop, to compare p99 latency
+with the threaded sync run above:
+
+    python benchmarks/write_throughput.py --submitters 200 --requests 10
+    python benchmarks/write_throughput.py --submitters 200 --requests 10 --asgi
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'excel.settings')
+
+PAYLOAD = {
+    'sample_parameters': {'sample_number': 'LOAD', 'heat_number': 'LOAD-HEAT', 'mass': 3.95, 'length': 1.0},
+    'water_system': {
+        'water_pressure_in': 2.5, 'water_pressure_out': 1.8,
+        'water_in_temperature': 25.0, 'water_out_temperature': 30.0
+    },
+    'scale_load_measurements': {
+        'utn_scale': 25, 'yield_load_main_scale': 12000, 'yield_load_counter_part': 40,
+        'tensile_load_main_scale': 15000, 'tensile_load_counter_part': 60
+    }
+}
+
+
+def in_process_submitter():
+    from django.db import connection
+    from django.test import Client
+
+    client = Client(HTTP_HOST='localhost')
+    body = json.dumps(PAYLOAD)
+
+    def submit():
+        response = client.post('/advanced_materials_testing/', body, content_type='application/json')
+        return response.status_code
+
+    def close():
+        connection.close()
+
+    return submit, close
+
+
+def http_submitter(url):
+    body = json.dumps(PAYLOAD).encode()
+
+    def submit():
+        request = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    return submit, lambda: None
+
+
+def asgi_submitter():
+    from excel.asgi import application
+
+    body = json.dumps(PAYLOAD).encode()
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'scheme': 'http',
+        'method': 'POST', 'path': '/advanced_materials_testing/', 'raw_path': b'/advanced_materials_testing/',
+        'query_string': b'', 'root_path': '', 'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+        'headers': [
+            (b'host', b'localhost'), (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+        ],
+    }
+
+    async def submit():
+        messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        response = {}
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            # The station stays connected until the response is sent
+            await asyncio.get_running_loop().create_future()
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+
+        await application(dict(scope), receive, send)
+        return response.get('status')
+
+    return submit
+
+
+def summarize(submitters, latencies, failures, duration):
+    latencies.sort()
+    return {
+        'submitters': submitters,
+        'requests': len(latencies),
+        'failures': len(failures),
+        'failure_samples': [str(status) for status in failures[:5]],
+        'duration_s': round(duration, 3),
+        'throughput_per_s': round((len(latencies) - len(failures)) / duration, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 2),
+        'p99_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 2),
+    }
+
+
+def run_async(submitters, requests_per_submitter, submit):
+    latencies = []
+    failures = []
+
+    async def station():
+        for _ in range(requests_per_submitter):
+            started = time.perf_counter()
+            try:
+                status = await submit()
+            except Exception as e:
+                status = repr(e)
+            latencies.append(time.perf_counter() - started)
+            if status != 200:
+                failures.append(status)
+
+    async def stations():
+        await asyncio.gather(*(station() for _ in range(submitters)))
+
+    started = time.perf_counter()
+    asyncio.run(stations())
+    return summarize(submitters, latencies, failures, time.perf_counter() - started)
+
+
+def run(submitters, requests_per_submitter, make_submitter):
+    latencies = []
+    failures = []
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(submitters)
+
+    def worker():
+        submit, close = make_submitter()
+        start_barrier.wait()
+        try:
+            for _ in range(requests_per_submitter):
+                started = time.perf_counter()
+                try:
+                    status = submit()
+                except Exception as e:
+                    status = repr(e)
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+                    if status != 200:
+                        failures.append(status)
+        finally:
+            close()
+
+    threads = [threading.Thread(target=worker) for _ in range(submitters)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(submitters, latencies, failures, time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--submitters', type=int, default=50, help='Concurrent lab stations')
+    parser.add_argument('--requests', type=int, default=20, help='Submissions per station')
+    parser.add_argument('--database', help='SQLite file to use (default: a temporary file)')
+    parser.add_argument('--url', help='Send requests to a running server instead, e.g. http://127.0.0.1:8000/advanced_materials_testing/')
+    parser.add_argument('--asgi', action='store_true', help='Drive the ASGI application and async views in-process')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    args = parser.parse_args()
+
+    if args.url:
+        label = args.url
+        results = run(args.submitters, args.requests, lambda: http_submitter(args.url))
+    else:
+        if args.asgi:
+            os.environ['ASYNC_VIEWS'] = '1'
+        from django.conf import settings
+        if settings.DATABASES['default']['ENGINE'].endswith('sqlite3'):
+            settings.DATABASES['default']['NAME'] = args.database or os.path.join(
+                tempfile.mkdtemp(), 'write_throughput.sqlite3'
+            )
+
+        import django
+        django.setup()
+
+        from django.core.management import call_command
+        call_command('migrate', verbosity=0)
+
+        label = f"{settings.DATABASES['default']['ENGINE']} pragmas={settings.SQLITE_PRAGMAS or 'default'}"
+        if args.asgi:
+            label = f'asgi threads={settings.ASYNC_DB_THREADS} {label}'
+            results = run_async(args.submitters, args.requests, asgi_submitter())
+        else:
+            results = run(args.submitters, args.requests, in_process_submitter)
+
+    results['target'] = label
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as handle:
+            json.dump(results, handle, indent=2)
+
+
+if __name__ == '__main__':
+    main()
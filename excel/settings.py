@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,6 +44,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'excelexport.metrics.MetricsMiddleware',
+    'excelexport.instrumentation.RequestInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -71,18 +74,149 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'excel.wsgi.application'
+ASGI_APPLICATION = 'excel.asgi.application'
+
+# ASGI mode (see excelexport/views_async.py): route the intake and login
+# endpoints to their async variants. excel/asgi.py switches this on; under
+# WSGI the synchronous views are cheaper. ASYNC_DB_THREADS bounds the
+# threads (and database connections) the async views write through; SQLite
+# takes one writer at a time, so raise it only for PostgreSQL.
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', '0') == '1'
+ASYNC_DB_THREADS = int(os.environ.get('ASYNC_DB_THREADS', '2'))
 
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
+# Selected with DB_ENGINE=sqlite3 (default) or DB_ENGINE=postgresql.
+#
+# PostgreSQL needs psycopg2 (or psycopg 3) installed. Connections persist for
+# DB_CONN_MAX_AGE seconds and are health-checked before reuse. Set
+# DB_POOLER=pgbouncer when connecting through PgBouncer in transaction
+# pooling mode: server-side cursors do not survive across pooled
+# transactions, so Django falls back to client-side cursors.
+
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite3')
+
+if DB_ENGINE in ('postgresql', 'postgres'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'mlsmasterapp'),
+            'USER': os.environ.get('DB_USER', 'postgres'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': os.environ.get('DB_CONN_HEALTH_CHECKS', '1') == '1',
+            'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('DB_POOLER') == 'pgbouncer',
+            'OPTIONS': {
+                'connect_timeout': int(os.environ.get('DB_CONNECT_TIMEOUT', '5')),
+                'application_name': 'mlsmasterapp',
+            },
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            # Write transactions take the lock at BEGIN (see excelexport/backends/sqlite3)
+            'ENGINE': 'excelexport.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '0')),
+            'OPTIONS': {
+                # Seconds a writer waits on the database lock before failing
+                'timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', '20')),
+            },
+        }
+    }
+
+# PRAGMAs applied to every new SQLite connection (see excelexport/db.py).
+# WAL lets readers run alongside the single writer, synchronous=NORMAL is
+# durable across application crashes in WAL mode, and mmap avoids read()
+# copies for hot pages. Set SQLITE_TUNING=0 to keep SQLite defaults.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', '20')) * 1000,
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))),
+    'temp_store': 'MEMORY',
+    'cache_size': -20000,  # KiB
+} if os.environ.get('SQLITE_TUNING', '1') == '1' else {}
+
+# Cache backend: CACHE_BACKEND=locmem (default, per process), file or redis,
+# with CACHE_LOCATION as the directory or redis:// URL. Use file or redis
+# when running several workers, so cache invalidation reaches all of them.
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+CACHE_LOCATIONS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'excelexport'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', '/var/tmp/excelexport_cache'),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://127.0.0.1:6379/1'),
+}
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': CACHE_LOCATIONS[CACHE_BACKEND][0],
+        'LOCATION': os.environ.get('CACHE_LOCATION', CACHE_LOCATIONS[CACHE_BACKEND][1]),
     }
 }
 
+# Sessions hold only the login now (calculation results and list filters
+# travel in the URL), so they are read through the cache and written to the
+# database only on login and logout. SESSION_ENGINE=signed_cookies keeps them
+# out of the database altogether.
+SESSION_ENGINE = 'django.contrib.sessions.backends.' + os.environ.get('SESSION_ENGINE', 'cached_db')
+
+# Seconds a rendered report page is kept; pages are invalidated on writes anyway
+REPORT_CACHE_TIMEOUT = int(os.environ.get('REPORT_CACHE_TIMEOUT', '3600'))
+
+# Write-behind intake (see excelexport/intake_queue.py): submissions are
+# answered once calculated and appended to the journal at INTAKE_QUEUE_PATH;
+# `manage.py drain_intake_queue` stores them in the database.
+INTAKE_WRITE_BEHIND = os.environ.get('INTAKE_WRITE_BEHIND', '0') == '1'
+INTAKE_QUEUE_PATH = os.environ.get('INTAKE_QUEUE_PATH', BASE_DIR / 'intake_queue.sqlite3')
+
+# Seconds a submission's Idempotency-Key is honoured (see
+# excelexport/idempotency.py); run `manage.py purge_idempotency_keys`
+# periodically to delete older keys.
+IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', str(7 * 24 * 3600)))
+
+# Instrumentation (see excelexport/instrumentation.py). Off by default; when
+# off the middleware unloads itself and spans cost nothing. The sample rate
+# is the fraction of requests traced.
+INSTRUMENTATION_ENABLED = os.environ.get('INSTRUMENTATION_ENABLED', '0') == '1'
+INSTRUMENTATION_SAMPLE_RATE = float(os.environ.get('INSTRUMENTATION_SAMPLE_RATE', '1.0'))
+
+# Prometheus-style metrics served at /metrics (see excelexport/metrics.py).
+# Under gunicorn set METRICS_DIR to a directory shared by the workers and
+# emptied at startup, so the endpoint reports every worker rather than the
+# one that happened to serve the scrape.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+# Seconds between a worker's writes to METRICS_DIR while it serves requests
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', '5'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {
+            '()': 'excelexport.instrumentation.JsonFormatter',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'json',
+        },
+    },
+    'loggers': {
+        'excelexport': {
+            'handlers': ['console'],
+            'level': os.environ.get('LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/4.2/howto/static-files/
 
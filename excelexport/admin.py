@@ -1,10 +1,46 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.template.response import TemplateResponse
 from .models import *
 from import_export.admin import ImportExportModelAdmin
 
+from .admin_filters import AutocompleteFilterMixin, AutocompleteValueFilter, DivisionTypeFilter
+from .forms import TensileImportForm
+from .importer import REQUIRED_COLUMNS, import_records
+from .pagination import EstimatedCountPaginator
+from .resources import (
+    CountryGDPResource,
+    InspectionReportResource,
+    SampleParametersResource,
+    ScaleLoadMeasurementsResource,
+    StressCalculationResource,
+    WaterSystemResource
+)
+
+
+class HeatNumberFilter(AutocompleteValueFilter):
+    title = 'heat number'
+    parameter_name = 'heat_number'
+    field_path = 'heat_number'
+    source_model = SampleParameters
+    source_field = 'heat_number'
+
+
+class SampleHeatNumberFilter(HeatNumberFilter):
+    field_path = 'sample_parameters__heat_number'
+
+
+class BatchNumberFilter(AutocompleteValueFilter):
+    title = 'batch number'
+    parameter_name = 'batch_number'
+    field_path = 'inspection_report__batch_number'
+    source_model = InspectionReport
+    source_field = 'batch_number'
+
 
 @admin.register(CountryGDP)
 class CountryGDPAdmin(ImportExportModelAdmin):
+    resource_classes = [CountryGDPResource]
     list_display = ('name','year','code','value')
     list_filter = ['name']
     search_fields = ['name']
@@ -12,29 +48,78 @@ class CountryGDPAdmin(ImportExportModelAdmin):
 
 @admin.register(InspectionReport)
 class InspectionReportAdmin(ImportExportModelAdmin):
+    resource_classes = [InspectionReportResource]
     list_display = ('date', 'batch_number', 'section', 'created_at', 'updated_at')
     list_filter = ['date', 'section']
     search_fields = ['batch_number', 'section']
     readonly_fields = ('created_at', 'updated_at')
     ordering = ('-date', '-created_at')
+    actions = ['import_tensile_records']
     
     def get_readonly_fields(self, request, obj=None):
         if obj:  # Editing an existing object
             return self.readonly_fields
         return ()
 
+    @admin.action(description='Import tensile test records (CSV/XLSX) into the selected lot',
+                  permissions=['change'])
+    def import_tensile_records(self, request, queryset):
+        """
+        Bulk import through the streaming importer rather than
+        django-import-export's row-by-row diffing
+        """
+        if queryset.count() != 1:
+            self.message_user(request, 'Select exactly one inspection report to import into', messages.ERROR)
+            return None
+        inspection_report = queryset.get()
+
+        if 'apply' in request.POST:
+            form = TensileImportForm(request.POST, request.FILES)
+            if form.is_valid():
+                try:
+                    result = import_records(
+                        form.cleaned_data['file'], form.cleaned_data['format'], inspection_report=inspection_report
+                    )
+                except ValueError as e:
+                    self.message_user(request, f'Import failed: {e}', messages.ERROR)
+                    return None
+                level = messages.SUCCESS if not result.rejected else messages.WARNING
+                self.message_user(request, result.summary(), level)
+                for line, message in result.rejects[:10]:
+                    self.message_user(request, f'Line {line}: {message}', messages.WARNING)
+                return None
+        else:
+            form = TensileImportForm()
+
+        return TemplateResponse(request, 'admin/excelexport/inspectionreport/import_tensile_records.html', {
+            **self.admin_site.each_context(request),
+            'title': 'Import tensile test records',
+            'opts': self.model._meta,
+            'form': form,
+            'inspection_report': inspection_report,
+            'required_columns': REQUIRED_COLUMNS,
+            'action_checkbox_name': ACTION_CHECKBOX_NAME,
+        })
+
 
 @admin.register(SampleParameters)
-class SampleParametersAdmin(ImportExportModelAdmin):
+class SampleParametersAdmin(AutocompleteFilterMixin, ImportExportModelAdmin):
+    resource_classes = [SampleParametersResource]
     list_display = ('sample_number', 'heat_number', 'mass', 'length', 'created_at')
-    list_filter = ['heat_number', 'created_at']
+    list_filter = [HeatNumberFilter]
+    date_hierarchy = 'created_at'
+    # Date drilldown through index probes rather than SELECT DISTINCT
+    change_list_template = 'admin/excelexport/change_list.html'
     search_fields = ['sample_number', 'heat_number']
     readonly_fields = ('created_at', 'updated_at')
     ordering = ('-created_at',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(WaterSystem)
 class WaterSystemAdmin(ImportExportModelAdmin):
+    resource_classes = [WaterSystemResource]
     list_display = ('water_in_temperature', 'water_out_temperature', 'water_pressure_in', 'water_pressure_out', 'created_at')
     list_filter = ['created_at']
     readonly_fields = ('created_at', 'updated_at')
@@ -48,6 +133,7 @@ class WaterSystemAdmin(ImportExportModelAdmin):
 
 @admin.register(ScaleLoadMeasurements)
 class ScaleLoadMeasurementsAdmin(ImportExportModelAdmin):
+    resource_classes = [ScaleLoadMeasurementsResource]
     list_display = ('utn_scale', 'yield_load_main_scale', 'tensile_load_main_scale', 'created_at')
     list_filter = ['created_at']
     readonly_fields = ('created_at', 'updated_at')
@@ -61,19 +147,28 @@ class ScaleLoadMeasurementsAdmin(ImportExportModelAdmin):
 
 
 @admin.register(StressCalculation)
-class StressCalculationAdmin(ImportExportModelAdmin):
+class StressCalculationAdmin(AutocompleteFilterMixin, ImportExportModelAdmin):
+    resource_classes = [StressCalculationResource]
     list_display = (
         'yield_stress', 
         'tensile_stress', 
         'division_type',
         'mass_per_meter',
         'cross_section_area',
+        'batch_number',
+        'heat_number',
         'created_at'
     )
-    list_filter = ['division_type', 'created_at']
+    list_select_related = ('inspection_report', 'sample_parameters')
+    list_filter = [DivisionTypeFilter, BatchNumberFilter, SampleHeatNumberFilter]
+    date_hierarchy = 'created_at'
+    # Date drilldown through index probes rather than SELECT DISTINCT
+    change_list_template = 'admin/excelexport/change_list.html'
     search_fields = ['division_type']
     readonly_fields = ('created_at', 'updated_at')
     ordering = ('-created_at',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     fieldsets = (
         ('Physical Properties', {
@@ -92,4 +187,24 @@ class StressCalculationAdmin(ImportExportModelAdmin):
             'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)
         }),
-    )
\ No newline at end of file
+    )
+
+    @admin.display(description='Batch number', ordering='inspection_report__batch_number')
+    def batch_number(self, obj):
+        return obj.inspection_report.batch_number if obj.inspection_report else None
+
+    @admin.display(description='Heat number', ordering='sample_parameters__heat_number')
+    def heat_number(self, obj):
+        return obj.sample_parameters.heat_number if obj.sample_parameters else None
+
+
+@admin.register(LotStatistics)
+class LotStatisticsAdmin(admin.ModelAdmin):
+    list_display = ('inspection_report', 'division_type', 'count', 'yield_min', 'yield_max',
+                    'tensile_min', 'tensile_max', 'updated_at')
+    list_select_related = ('inspection_report',)
+    readonly_fields = [field.name for field in LotStatistics._meta.fields]
+
+    def has_add_permission(self, request):
+        # Rows are maintained from StressCalculation writes only
+        return False
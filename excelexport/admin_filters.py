@@ -0,0 +1,114 @@
+"""
+Admin list filters that never scan a whole table.
+
+Django's default filter for a plain CharField (AllValuesFieldListFilter)
+runs SELECT DISTINCT over every row to build its links. The filters here
+either know their choices up front or take a typed value, with suggestions
+served by a prefix range query on an indexed column and a LIMIT.
+"""
+from django.contrib import admin
+from django.contrib.admin.views.main import PAGE_VAR
+from django.http import JsonResponse
+from django.urls import path, reverse
+
+from .calclation import DIVISION_COEFFICIENTS
+
+AUTOCOMPLETE_LIMIT = 20
+
+
+class DivisionTypeFilter(admin.SimpleListFilter):
+    """The UTN scales are fixed, so the choices come from the calibration table"""
+    title = 'division type'
+    parameter_name = 'division_type'
+
+    def lookups(self, request, model_admin):
+        return [(str(scale), f'{scale} kgf') for scale in sorted(DIVISION_COEFFICIENTS)]
+
+    def queryset(self, request, queryset):
+        if self.value() not in {str(scale) for scale in DIVISION_COEFFICIENTS}:
+            return queryset
+        scale = int(self.value())
+        # The scale is stored as entered: "Division 25kgf" or "Division 25.0kgf"
+        return queryset.filter(division_type__in=[f'Division {scale}kgf', f'Division {float(scale)}kgf'])
+
+
+class AutocompleteValueFilter(admin.SimpleListFilter):
+    """
+    Exact-match filter on field_path, entered in a text box.
+
+    Suggestions come from source_field of source_model, which must be
+    indexed; the ModelAdmin needs AutocompleteFilterMixin to serve them.
+    """
+    template = 'admin/excelexport/autocomplete_filter.html'
+    field_path = None
+    source_model = None
+    source_field = None
+
+    def __init__(self, request, params, model, model_admin):
+        super().__init__(request, params, model, model_admin)
+        self.autocomplete_url = model_admin.filter_autocomplete_url(self.parameter_name)
+
+    def has_output(self):
+        return True
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(**{self.field_path: self.value()})
+        return queryset
+
+    def choices(self, changelist):
+        yield {
+            'selected': self.value() is None,
+            'query_string': changelist.get_query_string(remove=[self.parameter_name]),
+            'display': 'All',
+            'value': self.value() or '',
+            # Other filters, search and ordering, carried through the text box's GET form
+            'params': [
+                (key, value) for key, value in changelist.params.items()
+                if key not in (self.parameter_name, PAGE_VAR)
+            ],
+        }
+
+    @classmethod
+    def suggestions(cls, term):
+        """
+        Up to AUTOCOMPLETE_LIMIT distinct values starting with term.
+
+        A range (>= term, < term + U+10FFFF) rather than __startswith, which
+        SQLite runs as a case-insensitive LIKE that cannot use the index.
+        """
+        field = cls.source_field
+        return list(
+            cls.source_model._default_manager
+            .filter(**{f'{field}__gte': term, f'{field}__lt': term + '\U0010ffff'})
+            .order_by(field).values_list(field, flat=True).distinct()[:AUTOCOMPLETE_LIMIT]
+        )
+
+
+class AutocompleteFilterMixin:
+    """Serves suggestions for the AutocompleteValueFilter classes in list_filter"""
+
+    def get_urls(self):
+        info = self.model._meta.app_label, self.model._meta.model_name
+        return [
+            path('filter-autocomplete/<str:parameter_name>/',
+                 self.admin_site.admin_view(self.filter_autocomplete_view),
+                 name='%s_%s_filter_autocomplete' % info),
+        ] + super().get_urls()
+
+    def filter_autocomplete_url(self, parameter_name):
+        info = self.model._meta.app_label, self.model._meta.model_name
+        return reverse('admin:%s_%s_filter_autocomplete' % info, args=[parameter_name],
+                       current_app=self.admin_site.name)
+
+    def filter_autocomplete_view(self, request, parameter_name):
+        if not self.has_view_permission(request):
+            return JsonResponse({'status': 'error', 'message': 'Permission denied'}, status=403)
+        for list_filter in self.list_filter:
+            if isinstance(list_filter, type) and issubclass(list_filter, AutocompleteValueFilter) \
+                    and list_filter.parameter_name == parameter_name:
+                return JsonResponse({'results': list_filter.suggestions(request.GET.get('term', ''))})
+        return JsonResponse({'status': 'error', 'message': f'Unknown filter "{parameter_name}"'}, status=404)
@@ -4,3 +4,17 @@ from django.apps import AppConfig
 class ExcelexportConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'excelexport'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_migrate
+
+        from .db import configure_sqlite_connection
+        from .search import repair_after_migrate
+
+        connection_created.connect(configure_sqlite_connection)
+        # Table-remaking migrations drop the search index triggers
+        post_migrate.connect(repair_after_migrate, sender=self)
+
+        # Register the LotStatistics and report cache signal handlers
+        from . import lot_statistics, report_cache  # noqa: F401
@@ -0,0 +1,16 @@
+"""
+SQLite backend whose transactions begin with BEGIN IMMEDIATE.
+
+A plain BEGIN starts as a reader. The search index triggers of migration
+0007 read their FTS5 tables before the row insert takes the write lock, so
+when another connection commits in between SQLite refuses the upgrade with
+"database is locked" straight away, without waiting out busy_timeout.
+Taking the write lock at BEGIN makes concurrent writers queue instead.
+Django 5.1 offers the same through OPTIONS["transaction_mode"].
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
@@ -1,90 +1,76 @@
-def division_25kgf(yield_machine_reading, tensile_machine_reading, cross_section_area):
-    """Division 25kgf function"""
-    A = 7.44259E-02
-    B = 1.08840E-02
-    C = -2.11336E-07
-    D = 2.84359E-11
-    
-    x = yield_machine_reading
-    y = tensile_machine_reading
-    
-    fy = A + B*x + C*x*x + D*x*x*x  
-    ft = A + B*y + C*y*y + D*y*y*y
-    
-    yield_stress = 1000 * fy / cross_section_area
-    tensile_stress = 1000 * ft / cross_section_area
-    
-    print("Division 25kgf Results:")
-    print("Yield stress: {:.2f}".format(yield_stress))
-    print("Tensile stress: {:.2f}".format(tensile_stress))
-    
+import numpy as np
+
+# Cubic calibration coefficients (A, B, C, D) for each UTN scale division.
+# Load in kN is A + B*x + C*x*x + D*x*x*x for a machine reading x in kgf.
+DIVISION_COEFFICIENTS = {
+    10: (-4.81989E-01, 1.17226E-02, -6.85762E-07, 1.60764E-10),
+    25: (7.44259E-02, 1.08840E-02, -2.11336E-07, 2.84359E-11),
+    50: (1.25491E-01, 1.11779E-02, -1.34602E-07, 7.57921E-12),
+    100: (8.14388E-01, 1.17947E-02, -1.26474E-07, 3.03105E-12),
+}
+
+_SCALES = np.array(sorted(DIVISION_COEFFICIENTS), dtype=float)
+_COEFFICIENTS = np.array([DIVISION_COEFFICIENTS[scale] for scale in sorted(DIVISION_COEFFICIENTS)])
+
+
+def calibrated_load(utn_scale, machine_reading):
+    """Evaluate the calibration polynomial for one reading (Horner form)"""
+    if utn_scale not in DIVISION_COEFFICIENTS:
+        raise ValueError(f"Invalid UTN scale value: {utn_scale}. Must be 10, 25, 50, or 100")
+    A, B, C, D = DIVISION_COEFFICIENTS[utn_scale]
+    x = machine_reading
+    return A + x * (B + x * (C + x * D))
+
+
+def division_stress(utn_scale, yield_machine_reading, tensile_machine_reading, cross_section_area):
+    """Yield and tensile stress for a single sample"""
+    yield_stress = 1000 * calibrated_load(utn_scale, yield_machine_reading) / cross_section_area
+    tensile_stress = 1000 * calibrated_load(utn_scale, tensile_machine_reading) / cross_section_area
     return yield_stress, tensile_stress
 
+
+def division_stress_array(utn_scale, yield_machine_reading, tensile_machine_reading, cross_section_area):
+    """
+    Yield and tensile stress for whole arrays of samples at once.
+
+    Every argument may be a scalar or an array; they are broadcast together,
+    so a batch mixing several UTN scales resolves in a single call.
+    """
+    utn_scale = np.asarray(utn_scale, dtype=float)
+    x = np.asarray(yield_machine_reading, dtype=float)
+    y = np.asarray(tensile_machine_reading, dtype=float)
+    area = np.asarray(cross_section_area, dtype=float)
+
+    index = np.minimum(np.searchsorted(_SCALES, utn_scale), len(_SCALES) - 1)
+    invalid = _SCALES[index] != utn_scale
+    if invalid.any():
+        bad = np.unique(utn_scale[invalid])
+        raise ValueError(
+            f"Invalid UTN scale value(s): {', '.join(f'{v:g}' for v in bad)}. Must be 10, 25, 50, or 100"
+        )
+
+    A, B, C, D = np.moveaxis(_COEFFICIENTS[index], -1, 0)
+    fy = A + x * (B + x * (C + x * D))
+    ft = A + y * (B + y * (C + y * D))
+
+    return 1000 * fy / area, 1000 * ft / area
+
+
 def division_10kgf(yield_machine_reading, tensile_machine_reading, cross_section_area):
     """Division 10kgf function"""
-    A = -4.81989E-01
-    B = 1.17226E-02
-    C = -6.85762E-07
-    D = 1.60764E-10
-    
-    x = yield_machine_reading
-    y = tensile_machine_reading
-    
-    fy = A + B*x + C*x*x + D*x*x*x  
-    ft = A + B*y + C*y*y + D*y*y*y
-    
-    yield_stress = 1000 * fy / cross_section_area
-    tensile_stress = 1000 * ft / cross_section_area
-    
-    print("Division 10kgf Results:")
-    print("Yield stress: {:.2f}".format(yield_stress))
-    print("Tensile stress: {:.2f}".format(tensile_stress))
-    
-    return yield_stress, tensile_stress
+    return division_stress(10, yield_machine_reading, tensile_machine_reading, cross_section_area)
+
+def division_25kgf(yield_machine_reading, tensile_machine_reading, cross_section_area):
+    """Division 25kgf function"""
+    return division_stress(25, yield_machine_reading, tensile_machine_reading, cross_section_area)
 
 def division_50kgf(yield_machine_reading, tensile_machine_reading, cross_section_area):
     """Division 50kgf function"""
-    A = 1.25491E-01
-    B = 1.11779E-02
-    C = -1.34602E-07
-    D = 7.57921E-12
-    
-    x = yield_machine_reading
-    y = tensile_machine_reading
-    
-    fy = A + B*x + C*x*x + D*x*x*x  
-    ft = A + B*y + C*y*y + D*y*y*y
-    
-    yield_stress = 1000 * fy / cross_section_area
-    tensile_stress = 1000 * ft / cross_section_area
-    
-    print("Division 50kgf Results:")
-    print("Yield stress: {:.2f}".format(yield_stress))
-    print("Tensile stress: {:.2f}".format(tensile_stress))
-    
-    return yield_stress, tensile_stress
+    return division_stress(50, yield_machine_reading, tensile_machine_reading, cross_section_area)
 
 def division_100kgf(yield_machine_reading, tensile_machine_reading, cross_section_area):
     """Division 100kgf function"""
-    A = 8.14388E-01
-    B = 1.17947E-02
-    C = -1.26474E-07
-    D = 3.03105E-12
-    
-    x = yield_machine_reading
-    y = tensile_machine_reading
-    
-    fy = A + B*x + C*x*x + D*x*x*x  
-    ft = A + B*y + C*y*y + D*y*y*y
-    
-    yield_stress = 1000 * fy / cross_section_area
-    tensile_stress = 1000 * ft / cross_section_area
-    
-    print("Division 100kgf Results:")
-    print("Yield stress: {:.2f}".format(yield_stress))
-    print("Tensile stress: {:.2f}".format(tensile_stress))
-    
-    return yield_stress, tensile_stress
+    return division_stress(100, yield_machine_reading, tensile_machine_reading, cross_section_area)
 
 def main():
     print("Material Stress Calculator")
@@ -119,18 +105,18 @@ def main():
         print("Selected division based on UTN scale value ({:.0f}):".format(utn_scale))
         print("-" * 40)
         
-        if utn_scale == 10:
-            yield_stress, tensile_stress = division_10kgf(yield_machine_reading, tensile_machine_reading, cross_section_area)
-        elif utn_scale == 25:
-            yield_stress, tensile_stress = division_25kgf(yield_machine_reading, tensile_machine_reading, cross_section_area)
-        elif utn_scale == 50:
-            yield_stress, tensile_stress = division_50kgf(yield_machine_reading, tensile_machine_reading, cross_section_area)
-        elif utn_scale == 100:
-            yield_stress, tensile_stress = division_100kgf(yield_machine_reading, tensile_machine_reading, cross_section_area)
-        else:
+        if utn_scale not in DIVISION_COEFFICIENTS:
             print("Error: UTN scale value must be 10, 25, 50, or 100")
             print("You entered: {:.0f}".format(utn_scale))
             return
+
+        yield_stress, tensile_stress = division_stress(
+            utn_scale, yield_machine_reading, tensile_machine_reading, cross_section_area
+        )
+
+        print("Division {:.0f}kgf Results:".format(utn_scale))
+        print("Yield stress: {:.2f}".format(yield_stress))
+        print("Tensile stress: {:.2f}".format(tensile_stress))
         
     except ValueError as e:
         print("Error: Invalid input - {}".format(e))
@@ -0,0 +1,260 @@
+"""
+Streaming, resumable CSV exports of whole tables.
+
+Each export streams its rows through a pseudo-buffer csv.writer in primary
+key order, reading them in chunks with .iterator(chunk_size=...), and ends
+with Min / Max / Mean footer rows accumulated while the rows went by, so
+the table is read once however large it is.
+
+A byte Range cannot be served for a file that is generated as it is sent
+(responses say Accept-Ranges: none); instead an interrupted download is
+resumed with ?after=<id>, the id in the first column of the last complete
+line received. The resumed response carries neither the title nor the
+column header, so it can be appended to the partial file as it is, and its
+footer still covers the whole export: rows before the resume point are
+folded in with one aggregate query over the primary key range.
+"""
+import csv
+
+from django.db.models import Count, Max, Min, Sum
+
+from . import search
+from .models import CountryGDP, SampleParameters, StressCalculation, WaterSystem
+from .reports import filter_stress_calculations, parse_report_filters
+from .xlsx_writer import EXPORT_CHUNK_SIZE
+
+
+class Echo:
+    """
+    File-like object whose write() hands the line straight back, so csv.writer
+    can feed a StreamingHttpResponse without buffering the whole file
+    """
+
+    def write(self, value):
+        return value
+
+
+class RunningStats:
+    """
+    Count, min, max, mean and (population) standard deviation of a stream of
+    numbers in one pass; None values are skipped, like SQL aggregates do
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.minimum = None
+        self.maximum = None
+        self._mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, value):
+        if value is None:
+            return
+        self.count += 1
+        self.total += value
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+        # Welford's update keeps the variance accurate without a second pass
+        delta = float(value) - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (float(value) - self._mean)
+
+    def merge_aggregate(self, count, total, minimum, maximum):
+        """
+        Fold in the count, sum, min and max of values seen elsewhere. The
+        standard deviation no longer covers every value afterwards.
+        """
+        if not count:
+            return
+        self.count += count
+        self.total += total
+        self.minimum = minimum if self.minimum is None else min(self.minimum, minimum)
+        self.maximum = maximum if self.maximum is None else max(self.maximum, maximum)
+
+    def result(self):
+        """{'min', 'max', 'avg', 'stddev', 'count'}, as summarize_stress_calculations reports a field"""
+        if not self.count:
+            return {'min': None, 'max': None, 'avg': None, 'stddev': None, 'count': 0}
+        return {
+            'min': self.minimum,
+            'max': self.maximum,
+            'avg': self.total / self.count,
+            'stddev': (self._m2 / self.count) ** 0.5,
+            'count': self.count,
+        }
+
+
+class TableExport:
+    """
+    One table's CSV export: columns is a list of (field, header), starting
+    with the primary key; summary lists the numeric fields given a footer
+    """
+
+    def __init__(self, title, model, columns, summary, filter_queryset=None):
+        self.title = title
+        self.model = model
+        self.columns = columns
+        self.summary = summary
+        self.filter_queryset = filter_queryset
+
+    @property
+    def headers(self):
+        return [header for _, header in self.columns]
+
+    def queryset(self, params):
+        """Rows selected by the request's filters; raises ValueError for bad ones"""
+        qs = self.model._default_manager.all()
+        if self.filter_queryset:
+            qs = self.filter_queryset(qs, params)
+        return qs.order_by('pk')
+
+    def rows(self, queryset, after=None):
+        """Value tuples in primary key order, from just past after"""
+        if after is not None:
+            queryset = queryset.filter(pk__gt=after)
+        fields = [field for field, _ in self.columns]
+        return queryset.values_list(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+    def stats_before(self, queryset, after):
+        """RunningStats per summary field, seeded with the rows up to after"""
+        stats = {field: RunningStats() for field in self.summary}
+        if after is None:
+            return stats
+        aggregates = {}
+        for field in self.summary:
+            aggregates.update({
+                f'{field}__count': Count(field), f'{field}__sum': Sum(field),
+                f'{field}__min': Min(field), f'{field}__max': Max(field),
+            })
+        row = queryset.filter(pk__lte=after).order_by().aggregate(**aggregates)
+        for field in self.summary:
+            stats[field].merge_aggregate(
+                row[f'{field}__count'], row[f'{field}__sum'], row[f'{field}__min'], row[f'{field}__max']
+            )
+        return stats
+
+    def footer(self, stats):
+        """Min / Max / Mean rows under the summarized columns"""
+        results = {field: stats[field].result() for field in self.summary}
+        rows = []
+        for label, key in (('Min', 'min'), ('Max', 'max'), ('Mean', 'avg')):
+            row = []
+            for position, (field, _) in enumerate(self.columns):
+                if field in results:
+                    value = results[field][key]
+                    row.append(f'{value:.2f}' if value is not None else '')
+                else:
+                    row.append(label if position == 0 else '')
+            rows.append(row)
+        return rows
+
+
+def parse_after(value):
+    """The ?after= resume point as a primary key, or None; raises ValueError"""
+    value = (value or '').strip()
+    if not value:
+        return None
+    if not value.isdigit():
+        raise ValueError('after must be the numeric id of the last row received')
+    return int(value)
+
+
+def _filter_stress_calculations(queryset, params):
+    return filter_stress_calculations(parse_report_filters(params))
+
+
+def _filter_countries(queryset, params):
+    name = (params.get('name') or '').strip()
+    year = (params.get('year') or '').strip()
+    if name:
+        queryset = search.contains(queryset, 'name', name)
+    if year:
+        queryset = queryset.filter(year=year)
+    return queryset
+
+
+CSV_EXPORTS = {
+    'stress-calculations': TableExport(
+        'Stress Calculations', StressCalculation,
+        [
+            ('id', 'ID'),
+            ('sample_parameters_id', 'Sample ID'),
+            ('inspection_report_id', 'Inspection Report ID'),
+            ('mass_per_meter', 'Mass/Meter (kg/m)'),
+            ('cross_section_area', 'Cross Sec Area (mm²)'),
+            ('yield_machine_reading', 'Yield Machine Reading (kgf)'),
+            ('tensile_machine_reading', 'Tensile Machine Reading (kgf)'),
+            ('yield_stress', 'Yield Stress (N/mm²)'),
+            ('tensile_stress', 'Tensile Stress (N/mm²)'),
+            ('division_type', 'Division Type'),
+            ('created_at', 'Created At'),
+        ],
+        ['mass_per_meter', 'cross_section_area', 'yield_machine_reading', 'tensile_machine_reading',
+         'yield_stress', 'tensile_stress'],
+        _filter_stress_calculations
+    ),
+    'sample-parameters': TableExport(
+        'Sample Parameters', SampleParameters,
+        [
+            ('id', 'ID'),
+            ('sample_number', 'Sample Number'),
+            ('heat_number', 'Heat Number'),
+            ('mass', 'Mass'),
+            ('length', 'Length'),
+            ('created_at', 'Created At'),
+        ],
+        ['mass', 'length']
+    ),
+    'water-systems': TableExport(
+        'Water Systems', WaterSystem,
+        [
+            ('id', 'ID'),
+            ('water_pressure_in', 'Inlet Pressure (bar)'),
+            ('water_pressure_out', 'Outlet Pressure (bar)'),
+            ('water_in_temperature', 'Inlet Temperature (°C)'),
+            ('water_out_temperature', 'Outlet Temperature (°C)'),
+            ('created_at', 'Created At'),
+        ],
+        ['water_pressure_in', 'water_pressure_out', 'water_in_temperature', 'water_out_temperature']
+    ),
+    'countries-gdp': TableExport(
+        'Countries GDP', CountryGDP,
+        [
+            ('id', 'ID'),
+            ('name', 'Country Name'),
+            ('code', 'Country Code'),
+            ('year', 'Year'),
+            ('value', 'Value'),
+        ],
+        ['value'],
+        _filter_countries
+    ),
+}
+
+
+def stream_rows(export, queryset, after=None, done=None):
+    """
+    CSV lines of export: title and header (unless resuming), the rows past
+    after, then the footer; done(rows) is called once the last line is out
+    """
+    writer = csv.writer(Echo())
+    if after is None:
+        yield writer.writerow([export.title])
+        yield writer.writerow(export.headers)
+
+    stats = export.stats_before(queryset, after)
+    positions = [(index, stats[field]) for index, (field, _) in enumerate(export.columns) if field in stats]
+    rows = 0
+    for rows, values in enumerate(export.rows(queryset, after), 1):
+        for index, field_stats in positions:
+            field_stats.add(values[index])
+        yield writer.writerow(values)
+
+    yield writer.writerow([])
+    for row in export.footer(stats):
+        yield writer.writerow(row)
+    if done:
+        done(rows)
@@ -0,0 +1,17 @@
+from django import forms
+
+from .importer import detect_format
+
+
+class TensileImportForm(forms.Form):
+    """Upload used by the admin import action"""
+
+    file = forms.FileField(help_text='CSV or XLSX; the first row holds the column names')
+
+    def clean_file(self):
+        upload = self.cleaned_data['file']
+        try:
+            self.cleaned_data['format'] = detect_format(upload.name)
+        except ValueError as e:
+            raise forms.ValidationError(str(e))
+        return upload
@@ -0,0 +1,142 @@
+"""
+Idempotency keys for submission endpoints.
+
+A client that may resend a submission (after a timeout, a dropped
+connection or a failed page request) sends the same Idempotency-Key header
+with every attempt. The first successful response for a key is stored in
+IdempotencyKey, in the same transaction as the rows the view writes; later
+attempts are answered with the stored response through the unique
+(scope, key) index, without calculating or writing anything again. Looking
+a key up is a plain read and the transaction covers the writes alone, so a
+request never holds (or waits on) the database write lock while it parses
+and calculates.
+
+Requests without the header behave as before. Keys are honoured for
+settings.IDEMPOTENCY_KEY_TTL seconds, after which a key counts as new again
+whether or not purge_idempotency_keys has deleted it yet.
+"""
+import datetime
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http.response import JsonResponse
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+REPLAYED_HEADER = 'Idempotent-Replayed'
+
+
+def request_key(request):
+    """
+    The request's Idempotency-Key, or None without one.
+    Raises ValueError for keys too long to store.
+    """
+    key = request.headers.get(IDEMPOTENCY_HEADER, '').strip()
+    if len(key) > MAX_KEY_LENGTH:
+        raise ValueError(f'{IDEMPOTENCY_HEADER} may be at most {MAX_KEY_LENGTH} characters')
+    return key or None
+
+
+def _cutoff(ttl=None):
+    ttl = settings.IDEMPOTENCY_KEY_TTL if ttl is None else ttl
+    return timezone.now() - datetime.timedelta(seconds=ttl)
+
+
+def live_keys(scope):
+    """IdempotencyKey rows of scope stored within the last IDEMPOTENCY_KEY_TTL seconds"""
+    return IdempotencyKey.objects.filter(scope=scope, created_at__gte=_cutoff())
+
+
+def release_expired(scope, keys):
+    """Delete expired rows of keys not yet purged, so the keys can be stored again"""
+    IdempotencyKey.objects.filter(scope=scope, key__in=keys, created_at__lt=_cutoff()).delete()
+
+
+def stored_response(scope, key):
+    """The response stored for key within IDEMPOTENCY_KEY_TTL, or None"""
+    stored = live_keys(scope).filter(key=key).values_list('response', 'status_code').first()
+    if stored is None:
+        return None
+    response = JsonResponse(stored[0], status=stored[1])
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def _storable(response):
+    # 202 Accepted means the work is still to be done (see intake_queue)
+    return (200 <= response.status_code < 300 and response.status_code != 202
+            and response.get('Content-Type', '').startswith('application/json'))
+
+
+def persist_once(scope, key, persist):
+    """
+    The response of persist(), stored for key in the same transaction as
+    the rows persist() writes. Without a key, just persist().
+
+    Only persist() runs in the transaction: everything before it (parsing,
+    validation, the calculation, a write-behind enqueue) runs outside it and
+    never waits on the database write lock. Of two concurrent calls with the
+    same key only one keeps its writes; the other is rolled back and
+    answered with the winner's response.
+    """
+    if key is None:
+        return persist()
+    try:
+        with transaction.atomic():
+            response = persist()
+            if _storable(response):
+                release_expired(scope, [key])
+                IdempotencyKey.objects.create(
+                    scope=scope, key=key, response=json.loads(response.content), status_code=response.status_code
+                )
+    except IntegrityError:
+        replay = stored_response(scope, key)
+        if replay is None:
+            raise
+        return replay
+    return response
+
+
+def persist_request(request, persist):
+    """persist_once() under the scope and key idempotent() found on request"""
+    scope, key = getattr(request, 'idempotency', (None, None))
+    return persist_once(scope, key, persist)
+
+
+def idempotent(scope):
+    """
+    Answer each POST carrying an Idempotency-Key once: a retry of a stored
+    one gets the stored response before the view runs, and the view saves
+    its writes through persist_request() so the response is stored with
+    them (see persist_once)
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'POST':
+                return view(request, *args, **kwargs)
+            try:
+                key = request_key(request)
+            except ValueError as e:
+                return JsonResponse({
+                    'status': 'error',
+                    'message': str(e)
+                }, status=400)
+            if key is not None:
+                replay = stored_response(scope, key)
+                if replay is not None:
+                    return replay
+            request.idempotency = (scope, key)
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def purge_expired(ttl=None):
+    """Delete keys older than ttl seconds (settings.IDEMPOTENCY_KEY_TTL); returns the number deleted"""
+    return IdempotencyKey.objects.filter(created_at__lt=_cutoff(ttl)).delete()[0]
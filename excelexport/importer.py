@@ -0,0 +1,154 @@
+"""
+Streaming import of historical tensile test records from CSV or XLSX.
+
+Files are read row by row (openpyxl in read-only mode for XLSX), grouped
+into chunks and handed to calculate_and_store_stress_batch, so each chunk
+is validated, calculated with the vectorised calibration and written with
+bulk_create in one transaction. Memory stays flat whatever the file size.
+
+The first row holds the column names: the SampleParameters,
+ScaleLoadMeasurements and WaterSystem field names (case and spacing are
+ignored, so "Yield Load Main Scale" works). Water system columns are
+optional.
+"""
+import codecs
+import csv
+import os
+import time
+import zipfile
+
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+
+from .stress_calculator import SAMPLE_FIELDS, SCALE_FIELDS, WATER_FIELDS, calculate_and_store_stress_batch
+
+IMPORT_CHUNK_SIZE = 5000
+
+# Rejected rows kept for the report; the rest are only counted
+MAX_REPORTED_REJECTS = 1000
+
+SAMPLE_COLUMNS = ('sample_number', 'heat_number') + SAMPLE_FIELDS
+IMPORT_COLUMNS = SAMPLE_COLUMNS + SCALE_FIELDS + WATER_FIELDS
+REQUIRED_COLUMNS = SAMPLE_FIELDS + SCALE_FIELDS
+
+
+def _column_name(header):
+    return '_'.join(str(header or '').strip().lower().replace('-', ' ').split())
+
+
+def _rows_from_csv(handle):
+    # Uploaded and on-disk files arrive as bytes; Excel likes to add a BOM
+    reader = csv.reader(codecs.getreader('utf-8-sig')(handle))
+    yield from reader
+
+
+def _rows_from_xlsx(handle):
+    try:
+        workbook = load_workbook(handle, read_only=True, data_only=True)
+    except (InvalidFileException, zipfile.BadZipFile, KeyError) as e:
+        raise ValueError(f'Not a readable XLSX file: {e}')
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def detect_format(name):
+    extension = os.path.splitext(name)[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    if extension in ('.xlsx', '.xlsm'):
+        return 'xlsx'
+    raise ValueError(f'Unsupported file type "{extension}"; use .csv or .xlsx')
+
+
+def read_records(handle, file_format):
+    """
+    Yield (line number, record) pairs, where record has the nested shape
+    advanced_materials_testing accepts. handle is a binary file object.
+    """
+    rows = _rows_from_csv(handle) if file_format == 'csv' else _rows_from_xlsx(handle)
+    header = next(rows, None)
+    if header is None:
+        raise ValueError('The file is empty')
+
+    columns = [_column_name(name) for name in header]
+    missing = [column for column in REQUIRED_COLUMNS if column not in columns]
+    if missing:
+        raise ValueError(f'Missing required columns: {", ".join(missing)}')
+    positions = {column: columns.index(column) for column in IMPORT_COLUMNS if column in columns}
+
+    for line, row in enumerate(rows, 2):
+        if not any(value not in (None, '') for value in row):
+            continue
+        values = {
+            column: row[position] if position < len(row) else None
+            for column, position in positions.items()
+        }
+        yield line, {
+            'sample_parameters': {column: values.get(column) for column in SAMPLE_COLUMNS},
+            'scale_load_measurements': {column: values[column] for column in SCALE_FIELDS},
+            'water_system': {column: values.get(column) for column in WATER_FIELDS},
+        }
+
+
+class ImportResult:
+    """Totals and rejects of one import run"""
+
+    def __init__(self):
+        self.rows = 0
+        self.imported = 0
+        self.rejected = 0
+        self.rejects = []
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def add_reject(self, line, message):
+        self.rejected += 1
+        if len(self.rejects) < MAX_REPORTED_REJECTS:
+            self.rejects.append((line, message))
+
+    def summary(self):
+        return (
+            f'{self.imported} of {self.rows} rows imported, {self.rejected} rejected '
+            f'in {self.elapsed:.1f}s ({self.rows_per_second:,.0f} rows/s)'
+        )
+
+
+def import_records(handle, file_format, inspection_report=None, chunk_size=IMPORT_CHUNK_SIZE, progress=None):
+    """
+    Import every record of an open binary CSV/XLSX file.
+
+    Rows are committed chunk by chunk, so a failure part way through keeps
+    the chunks already written. progress, if given, is called with the
+    ImportResult after every chunk.
+    """
+    result = ImportResult()
+    started = time.perf_counter()
+
+    def flush(chunk):
+        lines = [line for line, _ in chunk]
+        for outcome in calculate_and_store_stress_batch([record for _, record in chunk], inspection_report):
+            if outcome['status'] == 'success':
+                result.imported += 1
+            else:
+                result.add_reject(lines[outcome['index']], outcome['message'])
+        result.elapsed = time.perf_counter() - started
+        if progress:
+            progress(result)
+
+    chunk = []
+    for line, record in read_records(handle, file_format):
+        result.rows += 1
+        chunk.append((line, record))
+        if len(chunk) == chunk_size:
+            flush(chunk)
+            chunk = []
+    if chunk:
+        flush(chunk)
+
+    result.elapsed = time.perf_counter() - started
+    return result
@@ -0,0 +1,186 @@
+"""
+Request instrumentation: timing spans and a per-request SQL query counter.
+
+Enabled with settings.INSTRUMENTATION_ENABLED. When it is off,
+RequestInstrumentationMiddleware removes itself at startup and span() hands
+back a shared no-op object, so production pays one context-variable lookup
+per span and nothing per query.
+
+When on, a sampled fraction of requests (INSTRUMENTATION_SAMPLE_RATE) is
+traced: every span and every SQL query is timed, and one structured record
+is logged to the 'excelexport.instrumentation' logger when the response
+is returned.
+"""
+import contextlib
+import contextvars
+import json
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('excelexport.instrumentation')
+
+_current_trace = contextvars.ContextVar('excelexport_trace', default=None)
+
+
+class RequestTrace:
+    """Span timings and query totals collected for one request"""
+
+    def __init__(self):
+        self.spans = {}
+        self.queries = 0
+        self.query_ms = 0.0
+
+    def add_span(self, name, elapsed_ms):
+        self.spans[name] = round(self.spans.get(name, 0.0) + elapsed_ms, 3)
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.query_ms += (time.perf_counter() - started) * 1000
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.trace.add_span(self.name, (time.perf_counter() - self.started) * 1000)
+        return False
+
+
+def span(name):
+    """
+    Time a block as part of the current request trace:
+
+        with span('calculate'):
+            ...
+
+    A no-op outside a traced request.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return _NULL_SPAN
+    return _Span(trace, name)
+
+
+def trace_queries():
+    """
+    Count the SQL queries of the current thread into the current request
+    trace. The middleware does this for the thread serving the request;
+    work handed to other threads (see views_async) opts in with this.
+    A no-op outside a traced request.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return contextlib.nullcontext()
+    return connections['default'].execute_wrapper(trace)
+
+
+class RequestInstrumentationMiddleware:
+    """
+    Trace a sample of requests and log one structured record for each.
+
+    Works under WSGI and ASGI. Under ASGI only queries run through
+    trace_queries() are counted, as the ORM runs outside the event loop.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'INSTRUMENTATION_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'INSTRUMENTATION_SAMPLE_RATE', 1.0)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _sampled(self):
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._sampled():
+            return self.get_response(request)
+
+        trace = RequestTrace()
+        token = _current_trace.set(trace)
+        started = time.perf_counter()
+        status = 500
+        try:
+            with connections['default'].execute_wrapper(trace):
+                response = self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            _current_trace.reset(token)
+            self._log(request, status, started, trace)
+
+    async def __acall__(self, request):
+        if not self._sampled():
+            return await self.get_response(request)
+
+        trace = RequestTrace()
+        token = _current_trace.set(trace)
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            _current_trace.reset(token)
+            self._log(request, status, started, trace)
+
+    def _log(self, request, status, started, trace):
+        logger.info('request', extra={'event': {
+            'method': request.method,
+            'path': request.path,
+            'status': status,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 3),
+            'queries': trace.queries,
+            'query_ms': round(trace.query_ms, 3),
+            'spans': trace.spans,
+        }})
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; fields passed as extra={'event': {...}} are merged in"""
+
+    def format(self, record):
+        payload = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        payload.update(getattr(record, 'event', {}))
+        if record.exc_info:
+            payload['exception'] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
@@ -0,0 +1,214 @@
+"""
+Write-behind queue for intake submissions.
+
+With settings.INTAKE_WRITE_BEHIND the intake view validates and calculates
+a submission, appends it to a journal and answers at once; the
+drain_intake_queue command writes the journal to the database in batches
+with bulk_create.
+
+The journal is a SQLite file of its own (settings.INTAKE_QUEUE_PATH), so
+appending never waits on the main database, whatever holds its write lock.
+Every entry carries the client's idempotency key (the Idempotency-Key
+header, or a generated one), which makes storing exactly-once:
+
+- a retry of a submission that is still queued hits the journal's unique
+  key and is not queued again;
+- a retry of one already stored is answered from IdempotencyKey (see
+  idempotency.idempotent);
+- entries leave the journal only after the transaction that stored them
+  and their IdempotencyKey rows has committed, so an entry redelivered
+  after a crash in between is found in IdempotencyKey and skipped.
+
+An entry that cannot be stored (bad data, a constraint it breaks) is moved
+to the journal's dead-letter table with its error and logged, rather than
+retried at the head of the queue forever; `drain_intake_queue
+--requeue-failed` puts such entries back once the cause is fixed. Only
+OperationalError (the database locked or unreachable) leaves a batch
+queued as it is.
+
+Run one drain_intake_queue per journal file.
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+
+from .idempotency import live_keys, release_expired, request_key
+from .models import IdempotencyKey
+from .result_handles import calculation_results, intake_result
+from .stress_calculator import store_submission_batch
+
+SCOPE = 'intake'
+DRAIN_BATCH_SIZE = 500
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+def _journal():
+    """This thread's connection to the journal, opened on first use"""
+    path = str(settings.INTAKE_QUEUE_PATH)
+    if getattr(_local, 'path', None) != path:
+        connection = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode = WAL')
+        # An acknowledged submission has to survive a power cut
+        connection.execute('PRAGMA synchronous = FULL')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS intake_journal ('
+            'seq INTEGER PRIMARY KEY AUTOINCREMENT, '
+            'idempotency_key TEXT NOT NULL UNIQUE, '
+            'record TEXT NOT NULL, '
+            'enqueued_at REAL NOT NULL)'
+        )
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS intake_dead_letter ('
+            'seq INTEGER PRIMARY KEY, '
+            'idempotency_key TEXT NOT NULL, '
+            'record TEXT NOT NULL, '
+            'enqueued_at REAL NOT NULL, '
+            'failed_at REAL NOT NULL, '
+            'error TEXT NOT NULL)'
+        )
+        _local.connection, _local.path = connection, path
+    return _local.connection
+
+
+def idempotency_key(request):
+    """
+    The client's Idempotency-Key, or a new random one when it sent none.
+    Raises ValueError for keys too long to store.
+    """
+    return request_key(request) or uuid.uuid4().hex
+
+
+def enqueue(key, cleaned, calculated_values):
+    """
+    Append one validated submission to the journal. Returns False when a
+    submission with this key is queued already.
+    """
+    cursor = _journal().execute(
+        'INSERT OR IGNORE INTO intake_journal (idempotency_key, record, enqueued_at) VALUES (?, ?, ?)',
+        [key, json.dumps({**cleaned, 'calculated_values': calculated_values}), time.time()]
+    )
+    return cursor.rowcount == 1
+
+
+def pending():
+    """Submissions waiting in the journal"""
+    return _journal().execute('SELECT COUNT(*) FROM intake_journal').fetchone()[0]
+
+
+def failed():
+    """Entries moved to the dead-letter table"""
+    return _journal().execute('SELECT COUNT(*) FROM intake_dead_letter').fetchone()[0]
+
+
+def requeue_failed():
+    """Put the dead-letter entries back at the end of the journal; returns the number requeued"""
+    journal = _journal()
+    journal.execute('BEGIN IMMEDIATE')
+    try:
+        # A retry of the submission may have queued its key again meanwhile
+        journal.execute(
+            'INSERT OR IGNORE INTO intake_journal (idempotency_key, record, enqueued_at) '
+            'SELECT idempotency_key, record, enqueued_at FROM intake_dead_letter ORDER BY seq'
+        )
+        count = journal.execute('DELETE FROM intake_dead_letter').rowcount
+    except BaseException:
+        journal.execute('ROLLBACK')
+        raise
+    journal.execute('COMMIT')
+    return count
+
+
+def _store(entries):
+    """
+    Store (idempotency key, record) journal entries and their
+    IdempotencyKey rows in one transaction, skipping those stored before
+    """
+    with transaction.atomic():
+        done = set(live_keys(SCOPE).filter(key__in=[key for key, _ in entries]).values_list('key', flat=True))
+        new = [(key, json.loads(record)) for key, record in entries if key not in done]
+        if new:
+            release_expired(SCOPE, [key for key, _ in new])
+            stored = store_submission_batch([cleaned for _, cleaned in new])
+            IdempotencyKey.objects.bulk_create([
+                IdempotencyKey(scope=SCOPE, key=key, response=intake_result(ids, calculation_results(
+                    cleaned['calculated_values'], cleaned['scale']['utn_scale'], ids
+                )))
+                for (key, cleaned), ids in zip(new, stored)
+            ])
+
+
+def _bury(seq, key, error):
+    """Move one journal entry to the dead-letter table"""
+    journal = _journal()
+    journal.execute('BEGIN IMMEDIATE')
+    try:
+        journal.execute(
+            'INSERT OR REPLACE INTO intake_dead_letter (seq, idempotency_key, record, enqueued_at, failed_at, error) '
+            'SELECT seq, idempotency_key, record, enqueued_at, ?, ? FROM intake_journal WHERE seq = ?',
+            [time.time(), f'{type(error).__name__}: {error}', seq]
+        )
+        journal.execute('DELETE FROM intake_journal WHERE seq = ?', [seq])
+    except BaseException:
+        journal.execute('ROLLBACK')
+        raise
+    journal.execute('COMMIT')
+
+
+def drain_batch(batch_size=DRAIN_BATCH_SIZE):
+    """
+    Store the oldest batch_size journal entries in one transaction, then
+    remove them from the journal. Returns the number of entries taken off
+    the journal (stored, skipped as stored before, or moved to the
+    dead-letter table); 0 once it is empty.
+
+    When the batch fails, its entries are stored one by one and those that
+    still fail are moved to the dead-letter table. OperationalError is
+    raised as it is, leaving the entries not yet stored queued.
+    """
+    journal = _journal()
+    entries = journal.execute(
+        'SELECT seq, idempotency_key, record FROM intake_journal ORDER BY seq LIMIT ?', [batch_size]
+    ).fetchall()
+    if not entries:
+        return 0
+
+    try:
+        _store([(key, record) for _, key, record in entries])
+    except OperationalError:
+        raise
+    except Exception:
+        # Find the entries at fault without holding up the rest
+        for seq, key, record in entries:
+            try:
+                _store([(key, record)])
+            except OperationalError:
+                raise
+            except Exception as e:
+                logger.exception('Queued submission could not be stored; moved to the dead-letter table',
+                                 extra={'event': {'idempotency_key': key, 'seq': seq}})
+                _bury(seq, key, e)
+            else:
+                journal.execute('DELETE FROM intake_journal WHERE seq = ?', [seq])
+        return len(entries)
+
+    journal.execute('DELETE FROM intake_journal WHERE seq <= ?', [entries[-1][0]])
+    return len(entries)
+
+
+def drain(batch_size=DRAIN_BATCH_SIZE):
+    """Drain the journal until it is empty; returns the entries handled"""
+    handled = 0
+    while True:
+        count = drain_batch(batch_size)
+        if not count:
+            return handled
+        handled += count
@@ -0,0 +1,137 @@
+"""
+Incremental maintenance of the LotStatistics summary table.
+
+Inserts are folded in with a single UPDATE per (lot, division) group, so a
+lot's statistics can be read in O(1) however many tests it holds. Min and
+max cannot be decremented, so deletes and edits recompute the affected lots
+from their StressCalculation rows instead.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Min, Q, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, Least
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import InspectionReport, LotStatistics, StressCalculation
+from .report_cache import invalidate
+
+
+def _group_totals(calculations):
+    """Per (inspection_report_id, division_type) totals of the given rows"""
+    groups = {}
+    for calc in calculations:
+        key = (calc.inspection_report_id, calc.division_type)
+        totals = groups.setdefault(key, {
+            'count': 0,
+            'yield_sum': 0.0, 'yield_sum_squares': 0.0, 'yield_min': None, 'yield_max': None,
+            'tensile_sum': 0.0, 'tensile_sum_squares': 0.0, 'tensile_min': None, 'tensile_max': None,
+        })
+        totals['count'] += 1
+        for prefix, value in (('yield', calc.yield_stress), ('tensile', calc.tensile_stress)):
+            totals[f'{prefix}_sum'] += value
+            totals[f'{prefix}_sum_squares'] += value * value
+            low, high = totals[f'{prefix}_min'], totals[f'{prefix}_max']
+            totals[f'{prefix}_min'] = value if low is None else min(low, value)
+            totals[f'{prefix}_max'] = value if high is None else max(high, value)
+    return groups
+
+
+def _apply_totals(inspection_report_id, division_type, totals):
+    rows = LotStatistics.objects.filter(
+        inspection_report_id=inspection_report_id,
+        division_type=division_type
+    )
+    return rows.update(
+        count=F('count') + totals['count'],
+        yield_sum=F('yield_sum') + totals['yield_sum'],
+        yield_sum_squares=F('yield_sum_squares') + totals['yield_sum_squares'],
+        yield_min=Least(F('yield_min'), totals['yield_min']),
+        yield_max=Greatest(F('yield_max'), totals['yield_max']),
+        tensile_sum=F('tensile_sum') + totals['tensile_sum'],
+        tensile_sum_squares=F('tensile_sum_squares') + totals['tensile_sum_squares'],
+        tensile_min=Least(F('tensile_min'), totals['tensile_min']),
+        tensile_max=Greatest(F('tensile_max'), totals['tensile_max']),
+    )
+
+
+def record_stress_calculations(calculations):
+    """
+    Fold newly inserted StressCalculation rows into LotStatistics.
+
+    Must run inside the transaction that inserted the rows; bulk_create
+    callers invoke it explicitly, StressCalculation.save() does it for
+    single inserts.
+    """
+    with transaction.atomic(savepoint=False):
+        groups = _group_totals(calculations)
+        invalidate({inspection_report_id for inspection_report_id, _ in groups})
+        for (inspection_report_id, division_type), totals in groups.items():
+            if _apply_totals(inspection_report_id, division_type, totals):
+                continue
+            try:
+                with transaction.atomic():
+                    LotStatistics.objects.create(
+                        inspection_report_id=inspection_report_id,
+                        division_type=division_type,
+                        **totals
+                    )
+            except IntegrityError:
+                # Another writer created the group first; add on top of it
+                _apply_totals(inspection_report_id, division_type, totals)
+
+
+def recompute_lot_statistics(inspection_report_ids):
+    """
+    Rebuild LotStatistics for the given lots (None is the unassigned lot)
+    from their StressCalculation rows
+    """
+    inspection_report_ids = set(inspection_report_ids)
+    if not inspection_report_ids:
+        return
+
+    lots = Q(inspection_report_id__in=[i for i in inspection_report_ids if i is not None])
+    if None in inspection_report_ids:
+        lots |= Q(inspection_report__isnull=True)
+
+    with transaction.atomic(savepoint=False):
+        invalidate(inspection_report_ids)
+        LotStatistics.objects.filter(lots).delete()
+        groups = StressCalculation.objects.filter(lots).order_by().values(
+            'inspection_report_id', 'division_type'
+        ).annotate(
+            count=Count('id'),
+            yield_sum=Sum('yield_stress'),
+            yield_sum_squares=Sum(F('yield_stress') * F('yield_stress')),
+            yield_min=Min('yield_stress'),
+            yield_max=Max('yield_stress'),
+            tensile_sum=Sum('tensile_stress'),
+            tensile_sum_squares=Sum(F('tensile_stress') * F('tensile_stress')),
+            tensile_min=Min('tensile_stress'),
+            tensile_max=Max('tensile_stress'),
+        )
+        LotStatistics.objects.bulk_create([LotStatistics(**group) for group in groups])
+
+
+# Keyset of lot_statistics_for; unique, with the unassigned lot (NULL) as 0
+LOT_STATISTICS_ORDERING = ('lot_key', 'division_type')
+
+
+def lot_statistics_for(inspection_report_id=None):
+    """LotStatistics rows for one lot, or every lot when no id is given"""
+    rows = (
+        LotStatistics.objects.select_related('inspection_report')
+        .annotate(lot_key=Coalesce('inspection_report_id', Value(0)))
+        .order_by(*LOT_STATISTICS_ORDERING)
+    )
+    if inspection_report_id is not None:
+        rows = rows.filter(inspection_report_id=inspection_report_id)
+    return rows
+
+
+@receiver(post_delete, sender=InspectionReport)
+def _unassigned_lot_changed(sender, instance, **kwargs):
+    """
+    Deleting an inspection report moves its tests to the unassigned lot
+    (SET_NULL has already run when post_delete fires), so rebuild that lot
+    """
+    recompute_lot_statistics({None})
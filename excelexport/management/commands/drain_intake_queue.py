@@ -0,0 +1,52 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections
+
+from excelexport import intake_queue
+
+logger = logging.getLogger('excelexport.intake_queue')
+
+
+class Command(BaseCommand):
+    help = 'Store write-behind intake submissions (INTAKE_WRITE_BEHIND) from the journal in the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=intake_queue.DRAIN_BATCH_SIZE,
+                            help='Submissions stored per transaction')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds between polls of an empty journal')
+        parser.add_argument('--once', action='store_true', help='Drain what is queued now and exit')
+        parser.add_argument('--requeue-failed', action='store_true',
+                            help='Put entries from the dead-letter table back in the journal first')
+
+    def handle(self, *args, **options):
+        if options['requeue_failed']:
+            self.stdout.write(f'{intake_queue.requeue_failed()} failed submissions requeued')
+        while True:
+            close_old_connections()
+            try:
+                handled = intake_queue.drain(options['batch_size'])
+            except OperationalError as e:
+                # e.g. the database stayed locked past the busy timeout; the batch is still queued
+                if options['once']:
+                    raise CommandError(f'Drain failed: {e}')
+                self.stderr.write(f'Drain failed, retrying: {e}')
+                handled = 0
+            except Exception as e:
+                # Entries that fail to store are dead-lettered inside drain(); this is the journal itself failing
+                logger.exception('Drain failed')
+                if options['once']:
+                    raise CommandError(f'Drain failed: {e}')
+                handled = 0
+            if handled and options['verbosity'] > 0:
+                self.stdout.write(
+                    f'{handled} queued submissions handled, {intake_queue.pending()} pending, '
+                    f'{intake_queue.failed()} failed'
+                )
+            if options['once']:
+                return
+            try:
+                time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                return
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from excelexport.importer import IMPORT_CHUNK_SIZE, detect_format, import_records
+from excelexport.models import InspectionReport
+
+
+class Command(BaseCommand):
+    help = 'Import historical tensile test records from a CSV or XLSX file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or XLSX file; the first row holds the column names')
+        parser.add_argument('--format', choices=('csv', 'xlsx'), help='Override detection from the file extension')
+        parser.add_argument('--inspection-report', type=int, help='Id of the InspectionReport (lot) to attach rows to')
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE, help='Rows written per transaction')
+        parser.add_argument('--show-rejects', type=int, default=20, help='Rejected rows to list (0 for none)')
+
+    def handle(self, *args, **options):
+        try:
+            file_format = options['format'] or detect_format(options['path'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        inspection_report = None
+        if options['inspection_report'] is not None:
+            try:
+                inspection_report = InspectionReport.objects.get(pk=options['inspection_report'])
+            except InspectionReport.DoesNotExist:
+                raise CommandError(f"InspectionReport {options['inspection_report']} does not exist")
+
+        def progress(result):
+            self.stdout.write(result.summary())
+
+        try:
+            with open(options['path'], 'rb') as handle:
+                result = import_records(
+                    handle,
+                    file_format,
+                    inspection_report=inspection_report,
+                    chunk_size=options['chunk_size'],
+                    progress=progress if options['verbosity'] > 1 else None
+                )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for line, message in result.rejects[:options['show_rejects']]:
+            self.stderr.write(f'Line {line}: {message}')
+        if result.rejected > options['show_rejects']:
+            self.stderr.write(f'... and {result.rejected - options["show_rejects"]} more rejected rows')
+
+        style = self.style.SUCCESS if not result.rejected else self.style.WARNING
+        self.stdout.write(style(result.summary()))
@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from excelexport.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    help = 'Delete idempotency keys older than IDEMPOTENCY_KEY_TTL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ttl', type=int, default=settings.IDEMPOTENCY_KEY_TTL,
+                            help='Delete keys older than this many seconds')
+
+    def handle(self, *args, **options):
+        deleted = purge_expired(options['ttl'])
+        self.stdout.write(f'{deleted} idempotency keys deleted')
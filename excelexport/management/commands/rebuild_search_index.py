@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from excelexport.search import missing_search_triggers, repair_search_index
+
+
+class Command(BaseCommand):
+    help = 'Recreate missing search index triggers and rebuild the indexes affected'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only report missing triggers; exit with an error if there are any')
+        parser.add_argument('--all', action='store_true', help='Rebuild every search index')
+
+    def handle(self, *args, **options):
+        if options['check']:
+            missing = missing_search_triggers()
+            for index, actions in missing.items():
+                self.stdout.write(f"{index}: missing {', '.join(actions)} trigger(s)")
+            if missing:
+                raise CommandError('Search index triggers are missing; run rebuild_search_index')
+            self.stdout.write('Search index triggers are in place')
+            return
+
+        rebuilt = repair_search_index(rebuild_all=options['all'])
+        self.stdout.write(f"{len(rebuilt)} search indexes rebuilt{': ' + ', '.join(rebuilt) if rebuilt else ''}")
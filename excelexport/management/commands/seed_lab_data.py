@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from excelexport.seeding import seed_lab_data
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic inspection lots, samples, stress calculations and GDP rows for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--samples', type=int, default=100000, help='Test records to generate')
+        parser.add_argument('--countries', type=int, default=0, help='CountryGDP rows to generate')
+        parser.add_argument('--samples-per-lot', type=int, default=50, help='Samples per inspection report')
+        parser.add_argument('--batch-size', type=int, default=10000, help='Samples written per transaction')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed gives the same data')
+
+    def handle(self, *args, **options):
+        for option in ('samples', 'samples_per_lot', 'batch_size'):
+            if options[option] < 1:
+                raise CommandError(f"--{option.replace('_', '-')} must be positive")
+
+        started = time.perf_counter()
+
+        def progress(written):
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'{written} rows, {written / elapsed:,.0f} rows/s')
+
+        written = seed_lab_data(
+            options['samples'],
+            countries=options['countries'],
+            seed=options['seed'],
+            samples_per_lot=options['samples_per_lot'],
+            batch_size=options['batch_size'],
+            progress=progress if options['verbosity'] > 1 else None
+        )
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {written} rows in {elapsed:.1f}s ({written / elapsed:,.0f} rows/s)'
+        ))
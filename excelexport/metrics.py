@@ -0,0 +1,226 @@
+"""
+In-process metrics registry rendered in the Prometheus text format.
+
+Counters and histograms live in a dict per process. Under gunicorn each
+worker has its own registry, so when settings.METRICS_DIR is set every
+worker also writes its values to a file of its own in METRICS_DIR
+(atomically via rename) and the /metrics view sums the files of all
+workers. A worker writes its file at most every METRICS_FLUSH_INTERVAL
+seconds while serving requests, when it serves a scrape and when it exits,
+so other workers' values may lag a scrape by up to that interval.
+
+Files are named by pid and the time of the worker's first write, so a
+worker that reuses a dead worker's pid does not overwrite its file; files
+of exited workers are kept so counters never go backwards. Empty the
+directory when the server starts, as with prometheus_client's
+multiprocess mode.
+"""
+import atexit
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+ROW_BUCKETS = (10, 100, 1000, 10000, 100000, 1000000)
+
+# name: (type, help, buckets)
+METRICS = {
+    'excelexport_request_duration_seconds': (
+        'histogram', 'Time spent in a view, by URL name', LATENCY_BUCKETS),
+    'excelexport_stress_calculations_total': (
+        'counter', 'Stress calculations stored, by division type', None),
+    'excelexport_export_rows': (
+        'histogram', 'Data rows written per export', ROW_BUCKETS),
+    'excelexport_export_duration_seconds': (
+        'histogram', 'Time taken to produce an export, including streaming', LATENCY_BUCKETS),
+}
+
+_lock = threading.Lock()
+_values = {name: {} for name in METRICS}
+_dirty = False
+_last_flush = 0.0
+_file_name = None
+_file_pid = None
+
+
+def _label_key(labels):
+    return json.dumps(sorted(labels.items()))
+
+
+def inc(name, amount=1, **labels):
+    """Add amount to a counter"""
+    global _dirty
+    key = _label_key(labels)
+    with _lock:
+        series = _values[name]
+        series[key] = series.get(key, 0) + amount
+        _dirty = True
+
+
+def observe(name, value, **labels):
+    """Record one observation in a histogram"""
+    global _dirty
+    buckets = METRICS[name][2]
+    key = _label_key(labels)
+    with _lock:
+        series = _values[name]
+        state = series.get(key)
+        if state is None:
+            state = series[key] = {'buckets': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+        for position, bound in enumerate(buckets):
+            if value <= bound:
+                state['buckets'][position] += 1
+                break
+        state['sum'] += value
+        state['count'] += 1
+        _dirty = True
+
+
+def record_export(export, rows, started):
+    """Observe the size and duration of a finished export; started is a perf_counter() value"""
+    observe('excelexport_export_rows', rows, export=export)
+    observe('excelexport_export_duration_seconds', time.perf_counter() - started, export=export)
+
+
+def _worker_file():
+    """This process's file name; looked up per call, as workers fork after import"""
+    global _file_name, _file_pid
+    pid = os.getpid()
+    if _file_pid != pid:
+        _file_name, _file_pid = f'{pid}-{time.time_ns()}.json', pid
+    return _file_name
+
+
+def flush():
+    """Write this process's values to METRICS_DIR, if one is configured"""
+    global _dirty, _last_flush
+    directory = getattr(settings, 'METRICS_DIR', None)
+    if not directory or not _dirty:
+        return
+    with _lock:
+        handle, path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(handle, 'w') as f:
+            json.dump(_values, f)
+        os.replace(path, os.path.join(directory, _worker_file()))
+        _dirty = False
+        _last_flush = time.monotonic()
+
+
+def flush_soon():
+    """flush(), unless this process flushed within METRICS_FLUSH_INTERVAL seconds"""
+    if time.monotonic() - _last_flush >= getattr(settings, 'METRICS_FLUSH_INTERVAL', 5.0):
+        flush()
+
+
+atexit.register(flush)
+
+
+def _merge(total, values):
+    for name, series in values.items():
+        if name not in METRICS:
+            continue
+        merged = total.setdefault(name, {})
+        for key, value in series.items():
+            if isinstance(value, dict):
+                state = merged.setdefault(key, {'buckets': [0] * len(value['buckets']), 'sum': 0.0, 'count': 0})
+                state['buckets'] = [a + b for a, b in zip(state['buckets'], value['buckets'])]
+                state['sum'] += value['sum']
+                state['count'] += value['count']
+            else:
+                merged[key] = merged.get(key, 0) + value
+
+
+def collect():
+    """Values summed over every worker (or just this process without METRICS_DIR)"""
+    directory = getattr(settings, 'METRICS_DIR', None)
+    total = {}
+    if not directory:
+        with _lock:
+            _merge(total, _values)
+        return total
+
+    flush()
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        try:
+            with open(path) as f:
+                _merge(total, json.load(f))
+        except (OSError, ValueError):
+            # Worker file mid-replace or unreadable; it is picked up next scrape
+            continue
+    return total
+
+
+def _format_labels(items):
+    if not items:
+        return ''
+    escaped = (
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in items
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    values = collect()
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for key, value in sorted(values.get(name, {}).items()):
+            labels = [tuple(item) for item in json.loads(key)]
+            if kind == 'counter':
+                lines.append(f'{name}{_format_labels(labels)} {_format_number(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets, value['buckets']):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format_labels(labels + [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_bucket{_format_labels(labels + [("le", "+Inf")])} {value["count"]}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_format_number(value["sum"])}')
+            lines.append(f'{name}_count{_format_labels(labels)} {value["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsMiddleware:
+    """Observe the latency of every routed view, under WSGI or ASGI"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self._observe(request, started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self._observe(request, started)
+        return response
+
+    def _observe(self, request, started):
+        match = getattr(request, 'resolver_match', None)
+        if match is not None and match.url_name != 'metrics':
+            observe('excelexport_request_duration_seconds', time.perf_counter() - started, view=match.url_name)
+            flush_soon()
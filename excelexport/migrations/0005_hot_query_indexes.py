@@ -0,0 +1,61 @@
+# Generated by Django 4.2.1 on 2026-10-18 06:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('excelexport', '0004_stresscalculation'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='countrygdp',
+            index=models.Index(fields=['year', 'name'], name='countrygdp_year_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='countrygdp',
+            index=models.Index(fields=['name'], name='countrygdp_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inspectionreport',
+            index=models.Index(fields=['date', 'created_at'], name='inspection_date_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inspectionreport',
+            index=models.Index(fields=['created_at'], name='inspection_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inspectionreport',
+            index=models.Index(fields=['batch_number'], name='inspection_batch_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sampleparameters',
+            index=models.Index(fields=['heat_number'], name='sample_heat_number_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sampleparameters',
+            index=models.Index(fields=['created_at'], name='sample_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='scaleloadmeasurements',
+            index=models.Index(fields=['created_at'], name='scaleload_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stresscalculation',
+            index=models.Index(fields=['created_at'], name='stresscalc_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stresscalculation',
+            index=models.Index(fields=['inspection_report', 'created_at'], name='stresscalc_report_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stresscalculation',
+            index=models.Index(fields=['division_type'], name='stresscalc_division_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='watersystem',
+            index=models.Index(fields=['created_at'], name='water_created_idx'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 4.2.1 on 2026-10-18 06:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_lot_statistics(apps, schema_editor):
+    StressCalculation = apps.get_model('excelexport', 'StressCalculation')
+    LotStatistics = apps.get_model('excelexport', 'LotStatistics')
+
+    groups = StressCalculation.objects.order_by().values('inspection_report_id', 'division_type').annotate(
+        count=models.Count('id'),
+        yield_sum=models.Sum('yield_stress'),
+        yield_sum_squares=models.Sum(models.F('yield_stress') * models.F('yield_stress')),
+        yield_min=models.Min('yield_stress'),
+        yield_max=models.Max('yield_stress'),
+        tensile_sum=models.Sum('tensile_stress'),
+        tensile_sum_squares=models.Sum(models.F('tensile_stress') * models.F('tensile_stress')),
+        tensile_min=models.Min('tensile_stress'),
+        tensile_max=models.Max('tensile_stress'),
+    )
+    LotStatistics.objects.bulk_create([LotStatistics(**group) for group in groups], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('excelexport', '0005_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LotStatistics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('division_type', models.CharField(max_length=50)),
+                ('count', models.PositiveBigIntegerField(default=0)),
+                ('yield_sum', models.FloatField(default=0)),
+                ('yield_sum_squares', models.FloatField(default=0)),
+                ('yield_min', models.FloatField(blank=True, null=True)),
+                ('yield_max', models.FloatField(blank=True, null=True)),
+                ('tensile_sum', models.FloatField(default=0)),
+                ('tensile_sum_squares', models.FloatField(default=0)),
+                ('tensile_min', models.FloatField(blank=True, null=True)),
+                ('tensile_max', models.FloatField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('inspection_report', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='lot_statistics', to='excelexport.inspectionreport')),
+            ],
+            options={
+                'verbose_name': 'Lot Statistics',
+                'verbose_name_plural': 'Lot Statistics',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='lotstatistics',
+            constraint=models.UniqueConstraint(fields=('inspection_report', 'division_type'), name='lotstats_report_division_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='lotstatistics',
+            constraint=models.UniqueConstraint(condition=models.Q(('inspection_report__isnull', True)), fields=('division_type',), name='lotstats_unassigned_division_uniq'),
+        ),
+        migrations.RunPython(backfill_lot_statistics, migrations.RunPython.noop),
+    ]
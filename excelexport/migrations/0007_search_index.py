@@ -0,0 +1,66 @@
+from django.db import migrations
+
+# Source table: columns covered by its search index
+SEARCH_COLUMNS = {
+    'excelexport_countrygdp': ('name',),
+    'excelexport_sampleparameters': ('sample_number', 'heat_number'),
+    'excelexport_inspectionreport': ('batch_number',),
+}
+
+
+def _sqlite_statements(table, columns):
+    index = f'{table}_search'
+    names = ', '.join(columns)
+    new = ', '.join(f'new.{column}' for column in columns)
+    old = ', '.join(f'old.{column}' for column in columns)
+    # External content table: the text lives in the source table only, triggers keep the index in step
+    return [
+        f"CREATE VIRTUAL TABLE {index} USING fts5({names}, content='{table}', content_rowid='id', tokenize='trigram')",
+        f"INSERT INTO {index}({index}) VALUES ('rebuild')",
+        f"CREATE TRIGGER {index}_insert AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {index}(rowid, {names}) VALUES (new.id, {new}); END",
+        f"CREATE TRIGGER {index}_delete AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {index}({index}, rowid, {names}) VALUES ('delete', old.id, {old}); END",
+        f"CREATE TRIGGER {index}_update AFTER UPDATE OF {names} ON {table} BEGIN "
+        f"INSERT INTO {index}({index}, rowid, {names}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {index}(rowid, {names}) VALUES (new.id, {new}); END",
+    ]
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for table, columns in SEARCH_COLUMNS.items():
+            for statement in _sqlite_statements(table, columns):
+                schema_editor.execute(statement)
+    elif vendor == 'postgresql':
+        # Trigram GIN indexes serve ILIKE '%term%' and similarity() ranking
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for table, columns in SEARCH_COLUMNS.items():
+            for column in columns:
+                schema_editor.execute(
+                    f'CREATE INDEX IF NOT EXISTS {table}_{column}_trgm ON {table} USING gin ({column} gin_trgm_ops)'
+                )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for table, columns in SEARCH_COLUMNS.items():
+        if vendor == 'sqlite':
+            for action in ('insert', 'delete', 'update'):
+                schema_editor.execute(f'DROP TRIGGER IF EXISTS {table}_search_{action}')
+            schema_editor.execute(f'DROP TABLE IF EXISTS {table}_search')
+        elif vendor == 'postgresql':
+            for column in columns:
+                schema_editor.execute(f'DROP INDEX IF EXISTS {table}_{column}_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('excelexport', '0006_lotstatistics'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator
 
 class CountryGDP(models.Model):
@@ -7,6 +7,12 @@ class CountryGDP(models.Model):
     year = models.CharField(max_length=4)
     value = models.DecimalField(default=0.00,max_digits=1000,decimal_places=2)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['year', 'name'], name='countrygdp_year_name_idx'),
+            models.Index(fields=['name'], name='countrygdp_name_idx'),
+        ]
+
     def str(self):
         return self.name
 
@@ -19,6 +25,11 @@ class InspectionReport(models.Model):
 
     class Meta:
         ordering = ['-date', '-created_at']
+        indexes = [
+            models.Index(fields=['date', 'created_at'], name='inspection_date_created_idx'),
+            models.Index(fields=['created_at'], name='inspection_created_idx'),
+            models.Index(fields=['batch_number'], name='inspection_batch_idx'),
+        ]
 
     def str(self):
         return f"Inspection Report - Batch {self.batch_number} ({self.date})"
@@ -50,6 +61,10 @@ class SampleParameters(models.Model):
         verbose_name = "Sample Parameters"
         verbose_name_plural = "Sample Parameters"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['heat_number'], name='sample_heat_number_idx'),
+            models.Index(fields=['created_at'], name='sample_created_idx'),
+        ]
 
     def __str__(self):
         return f"Sample {self.sample_number} - Heat {self.heat_number}"
@@ -79,6 +94,9 @@ class WaterSystem(models.Model):
         verbose_name = "Water System"
         verbose_name_plural = "Water Systems"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='water_created_idx'),
+        ]
 
     def __str__(self):
         return f"Water System - In: {self.water_in_temperature}°C, Out: {self.water_out_temperature}°C"
@@ -124,6 +142,9 @@ class ScaleLoadMeasurements(models.Model):
         verbose_name = "Scale & Load Measurements"
         verbose_name_plural = "Scale & Load Measurements"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='scaleload_created_idx'),
+        ]
 
     def __str__(self):
         return f"UTN Scale: {self.utn_scale} - Yield: {self.yield_load_main_scale}kN"
@@ -148,6 +169,64 @@ class ScaleLoadMeasurements(models.Model):
         """Calculate difference between main and counter tensile loads"""
         return abs(self.tensile_load_main_scale - self.tensile_load_counter_part)
 
+# Fields whose changes invalidate LotStatistics
+LOT_STATISTICS_FIELDS = {'inspection_report', 'inspection_report_id', 'division_type', 'yield_stress', 'tensile_stress'}
+
+
+class StressCalculationQuerySet(models.QuerySet):
+    """
+    Keeps LotStatistics and the report cache in step with bulk deletes and
+    updates
+    """
+
+    def delete(self):
+        from .lot_statistics import recompute_lot_statistics
+
+        with transaction.atomic(using=self.db, savepoint=False):
+            lots = set(self.order_by().values_list('inspection_report_id', flat=True).distinct())
+            result = super().delete()
+            recompute_lot_statistics(lots)
+        return result
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+    def update(self, **kwargs):
+        if not LOT_STATISTICS_FIELDS.intersection(kwargs):
+            from .report_cache import invalidate
+
+            # Sends no signals, but the rows still show on cached report pages
+            with transaction.atomic(using=self.db, savepoint=False):
+                lots = set(self.order_by().values_list('inspection_report_id', flat=True).distinct())
+                rows = super().update(**kwargs)
+                invalidate(lots)
+            return rows
+
+        from .lot_statistics import recompute_lot_statistics
+
+        with transaction.atomic(using=self.db, savepoint=False):
+            lots = set(self.order_by().values_list('inspection_report_id', flat=True).distinct())
+            moved_by_expression = None
+            for key in ('inspection_report', 'inspection_report_id'):
+                if key not in kwargs:
+                    continue
+                if hasattr(kwargs[key], 'resolve_expression'):
+                    # e.g. the Case() built by bulk_update; read the new lots back afterwards
+                    moved_by_expression = list(self.values_list('pk', flat=True))
+                else:
+                    lots.add(getattr(kwargs[key], 'pk', kwargs[key]))
+            rows = super().update(**kwargs)
+            if moved_by_expression:
+                lots.update(
+                    self.model._base_manager.using(self.db).filter(pk__in=moved_by_expression)
+                    .order_by().values_list('inspection_report_id', flat=True).distinct()
+                )
+            recompute_lot_statistics(lots)
+        return rows
+
+    update.alters_data = True
+
+
 class StressCalculation(models.Model):
     """
     Stores material stress calculation results
@@ -210,6 +289,136 @@ class StressCalculation(models.Model):
         verbose_name = "Stress Calculation"
         verbose_name_plural = "Stress Calculations"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='stresscalc_created_idx'),
+            models.Index(fields=['inspection_report', 'created_at'], name='stresscalc_report_created_idx'),
+            models.Index(fields=['division_type'], name='stresscalc_division_idx'),
+        ]
+
+    objects = StressCalculationQuerySet.as_manager()
+
+    def __str__(self):
+        return f"Stress Calculation - Yield: {self.yield_stress} N/mm², Tensile: {self.tensile_stress} N/mm²"
+
+    def save(self, *args, **kwargs):
+        from .lot_statistics import record_stress_calculations, recompute_lot_statistics
+
+        # Inserts fold into LotStatistics inside the same transaction;
+        # edits recompute both the lot the row left and the one it joined
+        with transaction.atomic(savepoint=False):
+            if self._state.adding:
+                super().save(*args, **kwargs)
+                record_stress_calculations([self])
+            else:
+                previous_lot = StressCalculation.objects.filter(pk=self.pk).values_list(
+                    'inspection_report_id', flat=True
+                ).first()
+                super().save(*args, **kwargs)
+                recompute_lot_statistics({previous_lot, self.inspection_report_id})
+
+    def delete(self, *args, **kwargs):
+        from .lot_statistics import recompute_lot_statistics
+
+        with transaction.atomic(savepoint=False):
+            result = super().delete(*args, **kwargs)
+            recompute_lot_statistics({self.inspection_report_id})
+        return result
+
+
+class LotStatistics(models.Model):
+    """
+    Running yield / tensile stress statistics per inspection report and
+    division type, maintained as StressCalculation rows are written
+    """
+    inspection_report = models.ForeignKey(
+        InspectionReport,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='lot_statistics'
+    )
+    division_type = models.CharField(max_length=50)
+
+    count = models.PositiveBigIntegerField(default=0)
+
+    yield_sum = models.FloatField(default=0)
+    yield_sum_squares = models.FloatField(default=0)
+    yield_min = models.FloatField(null=True, blank=True)
+    yield_max = models.FloatField(null=True, blank=True)
+
+    tensile_sum = models.FloatField(default=0)
+    tensile_sum_squares = models.FloatField(default=0)
+    tensile_min = models.FloatField(null=True, blank=True)
+    tensile_max = models.FloatField(null=True, blank=True)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Lot Statistics"
+        verbose_name_plural = "Lot Statistics"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['inspection_report', 'division_type'],
+                name='lotstats_report_division_uniq'
+            ),
+            models.UniqueConstraint(
+                fields=['division_type'],
+                condition=models.Q(inspection_report__isnull=True),
+                name='lotstats_unassigned_division_uniq'
+            ),
+        ]
+
+    def __str__(self):
+        return f"Lot Statistics - {self.inspection_report_id or 'Unassigned'} / {self.division_type} ({self.count})"
+
+    def _mean(self, total):
+        return total / self.count if self.count else None
+
+    def _stddev(self, total, total_squares):
+        if not self.count:
+            return None
+        mean = total / self.count
+        return max(total_squares / self.count - mean * mean, 0) ** 0.5
+
+    @property
+    def yield_mean(self):
+        return self._mean(self.yield_sum)
+
+    @property
+    def yield_stddev(self):
+        """Population standard deviation of yield stress"""
+        return self._stddev(self.yield_sum, self.yield_sum_squares)
+
+    @property
+    def tensile_mean(self):
+        return self._mean(self.tensile_sum)
+
+    @property
+    def tensile_stddev(self):
+        """Population standard deviation of tensile stress"""
+        return self._stddev(self.tensile_sum, self.tensile_sum_squares)
+
+class IdempotencyKey(models.Model):
+    """
+    Client-supplied key of a submission that has been stored, with the
+    response it produced, so a retried or redelivered submission is
+    answered from here instead of being stored twice
+    """
+    scope = models.CharField(max_length=50, help_text="Endpoint the key belongs to")
+    key = models.CharField(max_length=255)
+    response = models.JSONField()
+    status_code = models.PositiveSmallIntegerField(default=200)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Idempotency Key"
+        verbose_name_plural = "Idempotency Keys"
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key'], name='idempotency_scope_key_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['created_at'], name='idempotency_created_idx'),
+        ]
 
     def __str__(self):
-        return f"Stress Calculation - Yield: {self.yield_stress} N/mm², Tensile: {self.tensile_stress} N/mm²"
\ No newline at end of file
+        return f"{self.scope}: {self.key}"
@@ -0,0 +1,227 @@
+"""
+Keyset (cursor) pagination, and cheap estimates of result totals.
+
+Pages are addressed by the sort key of the row at their edge instead of an
+OFFSET, so page N costs one index seek no matter how deep it is. Totals
+shown next to such pages come from estimated_count rather than a COUNT(*)
+per request.
+"""
+import hashlib
+import json
+
+from django.core import signing
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+CURSOR_SALT = 'excelexport.pagination'
+
+# Below this many rows an exact COUNT(*) is cheap enough
+ESTIMATE_THRESHOLD = 10000
+
+# How long an exact count of a filtered queryset is reused
+COUNT_CACHE_TIMEOUT = 60
+
+
+def estimated_row_count(model, using='default'):
+    """
+    Approximate row count of model's whole table without scanning it, or
+    None when the backend offers no estimate
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # Maintained by VACUUM/ANALYZE; -1 until the table was first analyzed
+            cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [table])
+            row = cursor.fetchone()
+            return int(row[0]) if row and row[0] >= 0 else None
+        if connection.vendor == 'sqlite' and model._meta.pk.get_internal_type() in ('AutoField', 'BigAutoField'):
+            # Ids only grow, so the largest is the row count plus rows deleted since; one index seek
+            cursor.execute(f'SELECT MAX({connection.ops.quote_name(model._meta.pk.column)}) '
+                           f'FROM {connection.ops.quote_name(table)}')
+            return cursor.fetchone()[0] or 0
+    return None
+
+
+def _table_estimate(queryset):
+    """Estimate for an unfiltered queryset over a large table, else None"""
+    query = queryset.query
+    if query.where or query.distinct or query.combinator:
+        return None
+    estimate = estimated_row_count(queryset.model, queryset.db)
+    return estimate if estimate is not None and estimate >= ESTIMATE_THRESHOLD else None
+
+
+def _planner_estimate(queryset):
+    """PostgreSQL planner's row estimate for queryset, or None elsewhere"""
+    if connections[queryset.db].vendor != 'postgresql':
+        return None
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def estimated_count(queryset):
+    """
+    Approximate number of rows in queryset, without a COUNT(*) per call.
+
+    Whole large tables use estimated_row_count. Filtered querysets use the
+    planner's estimate on PostgreSQL when it is large, and otherwise an
+    exact count cached for COUNT_CACHE_TIMEOUT seconds, so paging through
+    one search counts it once.
+    """
+    estimate = _table_estimate(queryset)
+    if estimate is None:
+        estimate = _planner_estimate(queryset)
+        if estimate is not None and estimate < ESTIMATE_THRESHOLD:
+            # Small results are cheap to count, and estimates are least reliable there
+            estimate = None
+    if estimate is not None:
+        return estimate
+
+    sql, params = queryset.order_by().query.sql_with_params()
+    key = 'excelexport.count.' + hashlib.sha1(repr((queryset.db, sql, params)).encode()).hexdigest()
+    return cache.get_or_set(key, queryset.count, COUNT_CACHE_TIMEOUT)
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for the admin changelists of very large tables.
+
+    An unfiltered changelist would COUNT(*) the whole table on every page
+    view; its count is estimated instead once the table is past
+    ESTIMATE_THRESHOLD rows. Filtered lists are counted exactly, since the
+    filters narrow the scan.
+    """
+
+    @cached_property
+    def count(self):
+        if hasattr(self.object_list, 'query'):
+            estimate = _table_estimate(self.object_list)
+            if estimate is not None:
+                return estimate
+        return super().count
+
+
+def _cursor_salt(fields):
+    # A cursor is only valid for the keyset it was taken from
+    return f"{CURSOR_SALT}:{','.join(fields)}"
+
+
+def encode_cursor(fields, values):
+    return signing.dumps(list(values), salt=_cursor_salt(fields), compress=True)
+
+
+def decode_cursor(token, fields):
+    """
+    Key values and serial number stored in a cursor token for fields;
+    raises ValueError when it was tampered with or taken from another keyset
+    """
+    try:
+        payload = signing.loads(token, salt=_cursor_salt(fields))
+    except signing.BadSignature:
+        raise ValueError('Invalid page cursor')
+    if not isinstance(payload, list) or len(payload) != len(fields) + 1 or not isinstance(payload[-1], int):
+        raise ValueError('Invalid page cursor')
+    return payload[:-1], payload[-1]
+
+
+def _past_cursor(queryset, fields, token, descending=False):
+    """queryset narrowed to the rows past the cursor token, and the cursor's serial number"""
+    values, serial = decode_cursor(token, fields)
+    try:
+        return queryset.filter(_after(fields, values, descending)), serial
+    except (ValidationError, TypeError) as e:
+        # Values the fields cannot take; a signed cursor from a keyset of other types
+        raise ValueError('Invalid page cursor') from e
+
+
+def _after(fields, values, descending=False):
+    """
+    Rows strictly after (or before) values in (fields[0], fields[1]) order.
+
+    Written as "a >= x AND (a > x OR b > y)" so the leading column stays a
+    range seek on its index rather than an OR the planner cannot use.
+    """
+    (first, second), (first_value, second_value) = fields, values
+    bound, strict = ('lte', 'lt') if descending else ('gte', 'gt')
+    return Q(**{f'{first}__{bound}': first_value}) & (
+        Q(**{f'{first}__{strict}': first_value}) | Q(**{f'{second}__{strict}': second_value})
+    )
+
+
+class KeysetPage:
+    """One page of a keyset-paginated queryset"""
+
+    def __init__(self, object_list, start_index, has_previous, has_next, fields, key):
+        self.object_list = object_list
+        self.start_index = start_index
+        self.has_previous_page = has_previous
+        self.has_next_page = has_next
+        self._fields = fields
+        self._key = key
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def end_index(self):
+        return self.start_index + len(self.object_list) - 1
+
+    def has_previous(self):
+        return self.has_previous_page
+
+    def has_next(self):
+        return self.has_next_page
+
+    @property
+    def next_cursor(self):
+        if not self.has_next_page or not self.object_list:
+            return None
+        last = self.object_list[-1]
+        return encode_cursor(self._fields, self._key(last) + [self.start_index + len(self.object_list) - 1])
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous_page or not self.object_list:
+            return None
+        return encode_cursor(self._fields, self._key(self.object_list[0]) + [self.start_index])
+
+
+def keyset_page(queryset, fields, per_page, after=None, before=None):
+    """
+    Fetch one page of queryset ordered ascending by fields.
+
+    fields is a (column, unique tie-breaker) pair such as ('created_at', 'id').
+    after / before are cursor tokens taken from a previous page; at most one
+    should be given. Serial numbers carried in the cursor let callers keep a
+    running row number without counting. Raises ValueError for a cursor that
+    is invalid or was taken from another keyset.
+    """
+    def key(obj):
+        return [
+            value.isoformat() if hasattr(value, 'isoformat') else value
+            for value in (getattr(obj, field) for field in fields)
+        ]
+
+    if before:
+        queryset, first_serial = _past_cursor(queryset, fields, before, descending=True)
+        rows = list(queryset.order_by(*[f'-{field}' for field in fields])[:per_page + 1])
+        has_previous = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        return KeysetPage(rows, max(first_serial - len(rows), 1), has_previous, True, fields, key)
+
+    start_index = 1
+    if after:
+        queryset, last_serial = _past_cursor(queryset, fields, after)
+        start_index = last_serial + 1
+
+    rows = list(queryset.order_by(*fields)[:per_page + 1])
+    has_next = len(rows) > per_page
+    return KeysetPage(rows[:per_page], start_index, bool(after), has_next, fields, key)
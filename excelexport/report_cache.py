@@ -0,0 +1,175 @@
+"""
+Rendered mechanical inspection report pages, cached until the data changes.
+
+Each report depends on a data version: a timestamp stored in the cache and
+moved forward after every committed write to StressCalculation or
+InspectionReport, globally and for the lot written to. Reports filtered to
+a lot follow that lot's version, everything else the global one. A page is
+cached under a hash of its version and query string, so a write simply
+stops old entries being asked for; nothing has to find and delete them.
+
+Writes are picked up from post_save/post_delete signals of the models a
+report shows (StressCalculation, InspectionReport, SampleParameters). Bulk
+and raw writes send no signals: StressCalculation ones are caught by the
+LotStatistics maintenance every such path already goes through, and the
+others have to call rows_changed() themselves.
+
+The same hash is the page's ETag and the version its Last-Modified, so a
+browser revalidating an unchanged report gets a 304. With several worker
+processes the cache backend must be shared (CACHE_BACKEND=file or redis);
+the local-memory default only sees writes made by its own process.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .models import InspectionReport, SampleParameters, StressCalculation
+from .reports import parse_report_filters
+
+VERSION_KEY = 'excelexport.report.version'
+LOT_VERSION_KEY = 'excelexport.report.version.lot.{}'
+PAGE_KEY = 'excelexport.report.page.{}'
+
+
+def invalidate(inspection_report_ids=()):
+    """
+    Move the global data version, and those of the given lots, forward
+    once the current transaction commits (immediately outside one)
+    """
+    keys = [VERSION_KEY] + [LOT_VERSION_KEY.format(i) for i in set(inspection_report_ids) if i is not None]
+
+    def bump():
+        now = time.time()
+        cache.set_many({key: now for key in keys}, None)
+
+    # Bumping before the commit would let a concurrent request cache the old rows under the new version
+    transaction.on_commit(bump)
+
+
+def _lots_of(model, pks):
+    """Lots whose report pages show the given rows of model"""
+    if model is InspectionReport:
+        return set(pks)
+    if model is SampleParameters:
+        return set(
+            StressCalculation.objects.filter(sample_parameters_id__in=pks)
+            .order_by().values_list('inspection_report_id', flat=True).distinct()
+        )
+    if model is StressCalculation:
+        return set(
+            StressCalculation.objects.filter(pk__in=pks)
+            .order_by().values_list('inspection_report_id', flat=True).distinct()
+        )
+    return None
+
+
+def rows_changed(model, pks):
+    """
+    Invalidate the reports showing the given rows of model, after a bulk or
+    raw write that sent no signals; a no-op for models no report shows
+    """
+    lots = _lots_of(model, list(pks))
+    if lots is not None:
+        invalidate(lots)
+
+
+def _version(key):
+    version = cache.get(key)
+    if version is None:
+        # Unknown (first use or evicted): start now, so no older page can match
+        cache.add(key, time.time(), None)
+        version = cache.get(key) or time.time()
+    return version
+
+
+def report_version(filters):
+    """Timestamp of the last write that can change a report with these filters"""
+    if 'inspection_report' in filters:
+        lots = [filters['inspection_report']]
+    elif 'lot' in filters:
+        lots = list(InspectionReport.objects.filter(batch_number=filters['lot']).values_list('id', flat=True))
+    else:
+        lots = []
+    if not lots:
+        return _version(VERSION_KEY)
+    return max(_version(LOT_VERSION_KEY.format(lot)) for lot in lots)
+
+
+def _page_state(request):
+    """(version, etag) of the requested page, or None when its filters are invalid"""
+    if not hasattr(request, '_report_page_state'):
+        try:
+            filters = parse_report_filters(request.GET)
+        except ValueError:
+            request._report_page_state = None
+        else:
+            version = report_version(filters)
+            query = urlencode(sorted(request.GET.lists()), doseq=True)
+            etag = hashlib.sha1(f'{version!r}?{query}'.encode()).hexdigest()
+            request._report_page_state = (version, etag)
+    return request._report_page_state
+
+
+def _etag(request, *args, **kwargs):
+    state = _page_state(request)
+    return state[1] if state else None
+
+
+def _last_modified(request, *args, **kwargs):
+    state = _page_state(request)
+    return datetime.fromtimestamp(state[0], tz=timezone.utc) if state else None
+
+
+def cached_report(view):
+    """Serve view's successful GET responses from the cache, with ETag/Last-Modified"""
+
+    @condition(etag_func=_etag, last_modified_func=_last_modified)
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        state = _page_state(request)
+        if state is None or request.method != 'GET':
+            return view(request, *args, **kwargs)
+
+        key = PAGE_KEY.format(state[1])
+        content = cache.get(key)
+        if content is None:
+            response = view(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            cache.set(key, response.content, settings.REPORT_CACHE_TIMEOUT)
+        else:
+            response = HttpResponse(content)
+        # Browsers keep the page but revalidate it every time
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    return wrapper
+
+
+@receiver([post_save, post_delete], sender=StressCalculation)
+def _stress_calculation_changed(sender, instance, **kwargs):
+    invalidate({instance.inspection_report_id})
+
+
+@receiver([post_save, post_delete], sender=InspectionReport)
+def _inspection_report_changed(sender, instance, **kwargs):
+    invalidate({instance.pk})
+
+
+# pre_delete: the sample's calculations lose their link to it during the delete
+@receiver([post_save, pre_delete], sender=SampleParameters)
+def _sample_changed(sender, instance, created=False, **kwargs):
+    # A new sample is not on any report until a calculation links to it
+    if not created:
+        rows_changed(SampleParameters, [instance.pk])
@@ -0,0 +1,219 @@
+"""
+Shared data access for the mechanical properties report and its exports
+"""
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+from django.db.models import Avg, Count, F, Max, Min, Sum
+
+from .models import InspectionReport, StressCalculation
+
+REPORT_TITLE = 'Final Inspection Report - Mechanical Properties'
+
+# (field, export header, decimal places) in report column order
+REPORT_COLUMNS = [
+    ('serial_no', 'S. No', None),
+    ('heat_number', 'Heat Number', None),
+    ('time', 'Time', None),
+    ('mass', 'Mass (kg)', 2),
+    ('length', 'Length (m)', 3),
+    ('mass_per_meter', 'Mass/Meter (kg/m)', 4),
+    ('cross_section_area', 'Cross Sec Area (mm²)', 2),
+    ('calibrated_yield_load', 'Calibrated Yield Load (kN)', 1),
+    ('yield_stress', 'Yield Stress (N/mm²)', 2),
+    ('calibrated_tensile_load', 'Calibrated Tensile Load (kN)', 1),
+    ('tensile_stress', 'Tensile Stress (N/mm²)', 2),
+    ('elongation', 'Elongation %', None),
+    ('bend_test', 'Bend Test', None),
+]
+
+REPORT_HEADERS = [header for _, header, _ in REPORT_COLUMNS]
+
+# Summary field -> the column it aggregates, relative to StressCalculation
+SUMMARY_COLUMNS = {
+    'mass': 'sample_parameters__mass',
+    'length': 'sample_parameters__length',
+    'mass_per_meter': 'mass_per_meter',
+    'cross_section_area': 'cross_section_area',
+    'calibrated_yield_load': 'yield_machine_reading',
+    'yield_stress': 'yield_stress',
+    'calibrated_tensile_load': 'tensile_machine_reading',
+    'tensile_stress': 'tensile_stress',
+}
+
+SUMMARY_FIELDS = list(SUMMARY_COLUMNS)
+
+SUMMARY_STATISTICS = (
+    ('min', Min),
+    ('max', Max),
+    ('avg', Avg),
+    ('count', Count),
+)
+
+DATE_FORMAT = '%Y-%m-%d'
+
+REPORT_PAGE_SIZE = 15
+MAX_REPORT_PAGE_SIZE = 200
+
+# Keyset used to page through the report
+REPORT_ORDERING = ('created_at', 'id')
+
+
+def parse_report_filters(params):
+    """
+    Read the report filters from a QueryDict.
+
+    Supported keys are lot (batch number), inspection_report (id),
+    heat_number, date_from and date_to (YYYY-MM-DD, inclusive). Raises
+    ValueError for malformed values.
+    """
+    filters = {}
+
+    for key in ('lot', 'heat_number'):
+        value = (params.get(key) or '').strip()
+        if value:
+            filters[key] = value
+
+    inspection_report = (params.get('inspection_report') or '').strip()
+    if inspection_report:
+        if not inspection_report.isdigit():
+            raise ValueError('inspection_report must be a numeric id')
+        filters['inspection_report'] = int(inspection_report)
+
+    for key in ('date_from', 'date_to'):
+        value = (params.get(key) or '').strip()
+        if value:
+            try:
+                filters[key] = datetime.strptime(value, DATE_FORMAT).date()
+            except ValueError:
+                raise ValueError(f'{key} must use the YYYY-MM-DD format')
+
+    return filters
+
+
+def filter_stress_calculations(filters):
+    """Stress calculations matching the report filters, oldest first"""
+    qs = StressCalculation.objects.select_related('sample_parameters', 'inspection_report')
+
+    if 'lot' in filters:
+        qs = qs.filter(inspection_report__batch_number=filters['lot'])
+    if 'inspection_report' in filters:
+        qs = qs.filter(inspection_report_id=filters['inspection_report'])
+    if 'heat_number' in filters:
+        qs = qs.filter(sample_parameters__heat_number=filters['heat_number'])
+    # Compare against datetime bounds so the created_at column stays sargable
+    if 'date_from' in filters:
+        qs = qs.filter(created_at__gte=datetime.combine(filters['date_from'], datetime.min.time()))
+    if 'date_to' in filters:
+        qs = qs.filter(created_at__lt=datetime.combine(filters['date_to'] + timedelta(days=1), datetime.min.time()))
+
+    return qs.order_by(*REPORT_ORDERING)
+
+
+def filter_query_string(filters):
+    """Filters encoded back into a query string for links and exports"""
+    return urlencode({
+        key: value.strftime(DATE_FORMAT) if hasattr(value, 'strftime') else value
+        for key, value in filters.items()
+    })
+
+
+def report_header(filters):
+    """Section, lot and rolling date for the selected lot, or the latest report"""
+    header_data = {
+        'section': '',
+        'lot_no': '',
+        'date_of_rolling': ''
+    }
+
+    inspections = InspectionReport.objects.order_by('-created_at')
+    if 'inspection_report' in filters:
+        inspections = inspections.filter(id=filters['inspection_report'])
+    elif 'lot' in filters:
+        inspections = inspections.filter(batch_number=filters['lot'])
+
+    inspection = inspections.first()
+    if inspection:
+        header_data['section'] = inspection.section
+        header_data['lot_no'] = inspection.batch_number
+        header_data['date_of_rolling'] = inspection.date.strftime(DATE_FORMAT)
+    return header_data
+
+
+def report_values(calc):
+    """Raw numeric values of one report row; missing values are None"""
+    sample = calc.sample_parameters
+    return {
+        'heat_number': sample.heat_number if sample else '',
+        'time': calc.created_at.strftime('%H:%M:%S') if calc.created_at else '',
+        'mass': sample.mass if sample and sample.mass else None,
+        'length': sample.length if sample and sample.length else None,
+        'mass_per_meter': calc.mass_per_meter or None,
+        'cross_section_area': calc.cross_section_area or None,
+        'calibrated_yield_load': calc.yield_machine_reading or None,
+        'yield_stress': calc.yield_stress or None,
+        'calibrated_tensile_load': calc.tensile_machine_reading or None,
+        'tensile_stress': calc.tensile_stress or None,
+        'elongation': '',  # This field is not in the current model
+        'bend_test': ''    # This field is not in the current model
+    }
+
+
+def format_report_row(serial_no, calc):
+    """One report row with every value formatted for display"""
+    values = report_values(calc)
+    row_data = {'serial_no': serial_no}
+    for field, _, places in REPORT_COLUMNS[1:]:
+        value = values[field]
+        if places is None:
+            row_data[field] = value
+        else:
+            row_data[field] = f"{value:.{places}f}" if value is not None else ''
+    return row_data
+
+
+def _population_stddev(count, total, total_squares):
+    # Same formula as LotStatistics; clamped, as rounding can leave it just below zero
+    if not count:
+        return None
+    mean = total / count
+    return max(total_squares / count - mean * mean, 0) ** 0.5
+
+
+def summarize_stress_calculations(queryset):
+    """
+    Summary statistics over every row of queryset in one aggregate query.
+
+    Returns {'count': rows, 'fields': {field: {'min', 'max', 'avg',
+    'stddev', 'count'}}} with raw numbers (None where a field has no values).
+    The standard deviation is derived from SUM(x) and SUM(x*x): SQLite has no
+    native StdDev, and Django's fallback calls back into Python per row.
+    """
+    aggregates = {'rows': Count('id')}
+    for field, column in SUMMARY_COLUMNS.items():
+        for statistic, function in SUMMARY_STATISTICS:
+            aggregates[f'{field}__{statistic}'] = function(column)
+        aggregates[f'{field}__sum'] = Sum(column)
+        aggregates[f'{field}__sum_squares'] = Sum(F(column) * F(column))
+
+    row = queryset.order_by().aggregate(**aggregates)
+    fields = {}
+    for field in SUMMARY_COLUMNS:
+        stats = {statistic: row[f'{field}__{statistic}'] for statistic, _ in SUMMARY_STATISTICS}
+        stats['stddev'] = _population_stddev(stats['count'], row[f'{field}__sum'], row[f'{field}__sum_squares'])
+        fields[field] = stats
+    return {
+        'count': row['rows'],
+        'fields': fields
+    }
+
+
+def format_summary(summary):
+    """Summary statistics formatted for display, '' where a field has no values"""
+    summary_data = {}
+    for field, stats in summary['fields'].items():
+        summary_data[field] = {
+            statistic: f"{stats[statistic]:.2f}" if stats[statistic] is not None else ''
+            for statistic in ('min', 'max', 'avg', 'stddev')
+        }
+    return summary_data
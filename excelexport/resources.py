@@ -0,0 +1,171 @@
+"""
+django-import-export resources used by the admin.
+
+The library defaults import one instance at a time (a lookup query, a diff
+and a save per row) and export by touching every foreign key lazily. These
+resources switch on bulk writes and skip the per-row diff, load the
+instances referenced by an import file in one query, write foreign keys by
+id instead of fetching each related object, and export from a queryset
+narrowed with select_related()/only() to exactly the exported columns.
+
+Updates do not go through QuerySet.bulk_update: it compiles a CASE WHEN per
+row and column, which costs more than the import itself. An executemany of
+one plain UPDATE per row is written instead. Neither it nor bulk_create
+sends signals, so both tell report_cache which rows they wrote.
+"""
+from django.db import connections
+from import_export import fields, resources, widgets
+from import_export.instance_loaders import CachedInstanceLoader
+
+from .lot_statistics import recompute_lot_statistics, record_stress_calculations
+from .models import CountryGDP, InspectionReport, SampleParameters, ScaleLoadMeasurements, StressCalculation, WaterSystem
+from .report_cache import rows_changed
+from .xlsx_writer import EXPORT_CHUNK_SIZE
+
+IMPORT_BATCH_SIZE = 1000
+
+
+class BulkModelResource(resources.ModelResource):
+    """ModelResource defaults for large imports and exports"""
+
+    class Meta:
+        use_bulk = True
+        batch_size = IMPORT_BATCH_SIZE
+        skip_diff = True
+        use_transactions = True
+        instance_loader_class = CachedInstanceLoader
+        chunk_size = EXPORT_CHUNK_SIZE
+
+    def export_queryset(self, queryset):
+        """Narrow queryset to the columns (and joins) the export fields read"""
+        related = set()
+        columns = {'pk'}
+        for field in self.get_export_fields():
+            if not field.attribute:
+                continue
+            columns.add(field.attribute)
+            if '__' in field.attribute:
+                related.add(field.attribute.rsplit('__', 1)[0])
+        # Drop joins added elsewhere (e.g. the changelist) that only() would defer
+        queryset = queryset.select_related(None)
+        if related:
+            queryset = queryset.select_related(*related)
+        return queryset.only(*columns)
+
+    def get_queryset(self):
+        return self.export_queryset(super().get_queryset())
+
+    def get_bulk_update_fields(self):
+        return [name for name in super().get_bulk_update_fields() if not self.fields[name].readonly]
+
+    def save_updates(self, instances):
+        """Write the import fields of instances with one executemany"""
+        opts = self._meta.model._meta
+        model_fields = [
+            opts.get_field(self.fields[name].attribute) for name in self.get_bulk_update_fields()
+            if self.fields[name].attribute
+        ]
+        model_fields = [field for field in model_fields if field.concrete and not field.primary_key]
+        connection = connections[self.get_db_connection_name()]
+        quote = connection.ops.quote_name
+        assignments = ', '.join(f'{quote(field.column)} = %s' for field in model_fields)
+        rows = [
+            [field.get_db_prep_save(getattr(instance, field.attname), connection) for field in model_fields]
+            + [instance.pk]
+            for instance in instances
+        ]
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'UPDATE {quote(opts.db_table)} SET {assignments} WHERE {quote(opts.pk.column)} = %s', rows
+            )
+        rows_changed(self._meta.model, [instance.pk for instance in instances])
+
+    def bulk_create(self, using_transactions, dry_run, raise_errors, batch_size=None, result=None):
+        instances = list(self.create_instances)
+        super().bulk_create(using_transactions, dry_run, raise_errors, batch_size=batch_size, result=result)
+        created = [instance.pk for instance in instances if instance.pk is not None]
+        if created:
+            rows_changed(self._meta.model, created)
+
+    def bulk_update(self, using_transactions, dry_run, raise_errors, batch_size=None, result=None):
+        try:
+            if self.update_instances and (using_transactions or not dry_run):
+                self.save_updates(list(self.update_instances))
+        except Exception as e:
+            self.handle_import_error(result, e, raise_errors)
+        finally:
+            self.update_instances.clear()
+
+    def iter_queryset(self, queryset):
+        if hasattr(queryset, 'only'):
+            queryset = self.export_queryset(queryset)
+        return super().iter_queryset(queryset)
+
+
+def foreign_key_id(column_name):
+    """
+    Foreign key column written and read as the raw id, so neither import
+    (ForeignKeyWidget.clean) nor export (.render) fetches the related row
+    """
+    return fields.Field(attribute=f'{column_name}_id', column_name=column_name, widget=widgets.IntegerWidget())
+
+
+class CountryGDPResource(BulkModelResource):
+    class Meta(BulkModelResource.Meta):
+        model = CountryGDP
+
+
+class InspectionReportResource(BulkModelResource):
+    class Meta(BulkModelResource.Meta):
+        model = InspectionReport
+
+
+class SampleParametersResource(BulkModelResource):
+    class Meta(BulkModelResource.Meta):
+        model = SampleParameters
+
+
+class WaterSystemResource(BulkModelResource):
+    class Meta(BulkModelResource.Meta):
+        model = WaterSystem
+
+
+class ScaleLoadMeasurementsResource(BulkModelResource):
+    class Meta(BulkModelResource.Meta):
+        model = ScaleLoadMeasurements
+
+
+class StressCalculationResource(BulkModelResource):
+    sample_parameters = foreign_key_id('sample_parameters')
+    inspection_report = foreign_key_id('inspection_report')
+    # Read-only context columns, filled from the select_related join
+    sample_number = fields.Field(attribute='sample_parameters__sample_number', column_name='sample_number', readonly=True)
+    heat_number = fields.Field(attribute='sample_parameters__heat_number', column_name='heat_number', readonly=True)
+    batch_number = fields.Field(attribute='inspection_report__batch_number', column_name='batch_number', readonly=True)
+
+    class Meta(BulkModelResource.Meta):
+        model = StressCalculation
+        # Same leading columns as the default resource, context columns last
+        export_order = (
+            'id', 'mass_per_meter', 'cross_section_area', 'yield_machine_reading', 'tensile_machine_reading',
+            'yield_stress', 'tensile_stress', 'division_type', 'created_at', 'updated_at',
+            'sample_parameters', 'inspection_report', 'sample_number', 'heat_number', 'batch_number'
+        )
+
+    def save_updates(self, instances):
+        # Recompute the statistics of every lot a row leaves or joins
+        lots = set(
+            StressCalculation.objects.filter(pk__in=[instance.pk for instance in instances])
+            .order_by().values_list('inspection_report_id', flat=True).distinct()
+        )
+        lots.update(instance.inspection_report_id for instance in instances)
+        super().save_updates(instances)
+        recompute_lot_statistics(lots)
+
+    def bulk_create(self, using_transactions, dry_run, raise_errors, batch_size=None, result=None):
+        # bulk_create bypasses StressCalculation.save(); fold the new rows into LotStatistics
+        instances = list(self.create_instances)
+        super().bulk_create(using_transactions, dry_run, raise_errors, batch_size=batch_size, result=result)
+        created = [instance for instance in instances if instance.pk is not None]
+        if created:
+            record_stress_calculations(created)
@@ -0,0 +1,55 @@
+"""
+Signed handles for calculation results.
+
+analysis_results used to read the last calculation from the session, which
+cost a django_session write per submission and a read per results page.
+Intake responses now redirect to /analysis_results/?results=<handle>, where
+the handle is the rounded results themselves, compressed and signed with
+SECRET_KEY: the page renders without touching the database, and the link
+works for whoever it is shared with. Signed, not encrypted; the values are
+test results, not secrets.
+"""
+from urllib.parse import urlencode
+
+from django.core import signing
+
+RESULTS_SALT = 'excelexport.analysis_results'
+
+
+def calculation_results(calculated_values, utn_scale, ids):
+    """Rounded results of one intake, as shown by analysis_results"""
+    return {
+        'mass_per_meter': round(calculated_values['mass_per_meter'], 4),
+        'cross_section_area': round(calculated_values['cross_section_area'], 2),
+        'yield_machine_reading': round(calculated_values['yield_machine_reading'], 1),
+        'tensile_machine_reading': round(calculated_values['tensile_machine_reading'], 1),
+        'yield_stress': round(calculated_values['yield_stress'], 2),
+        'tensile_stress': round(calculated_values['tensile_stress'], 2),
+        'division_type': calculated_values['division_type'],
+        'utn_scale': utn_scale,
+        **ids
+    }
+
+
+def results_url(results):
+    return '/analysis_results/?' + urlencode({'results': signing.dumps(results, salt=RESULTS_SALT, compress=True)})
+
+
+def load_results(handle):
+    """The results signed into handle, or None for a missing or tampered one"""
+    if not handle:
+        return None
+    try:
+        return signing.loads(handle, salt=RESULTS_SALT)
+    except signing.BadSignature:
+        return None
+
+
+def intake_result(ids, results):
+    """Response body for a stored submission, replayed to retries of it"""
+    return {
+        'status': 'success',
+        'message': 'Data saved and calculations completed successfully',
+        'redirect_url': results_url(results),
+        'data': ids
+    }
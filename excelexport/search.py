@@ -0,0 +1,243 @@
+"""
+Substring search over country names, sample/heat numbers and lot batch
+numbers.
+
+name__icontains compiles to LIKE '%term%', which no B-tree index can
+serve. Migration 0007 adds trigram indexes instead: on SQLite an FTS5
+table per source table (tokenize='trigram', kept in sync by triggers, so
+raw and bulk inserts are covered too), on PostgreSQL pg_trgm GIN indexes.
+Triggers lost to a table-remaking migration are put back after migrate,
+or by `manage.py rebuild_search_index` (see repair_search_index).
+Trigrams need at least MIN_TERM_LENGTH characters; shorter terms fall back
+to a plain scan in contains() and are rejected by search().
+"""
+import contextlib
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.models import F, FloatField, Func, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Greatest
+
+from .models import CountryGDP, InspectionReport, SampleParameters
+
+MIN_TERM_LENGTH = 3
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# Matches scored per kind on SQLite
+RANK_CANDIDATES = 1000
+
+# kind: (model, indexed columns, result label)
+SEARCH_SOURCES = {
+    'country': (CountryGDP, ('name',), lambda obj: f'{obj.name} ({obj.year})'),
+    'sample': (SampleParameters, ('sample_number', 'heat_number'),
+               lambda obj: f'Sample {obj.sample_number} - Heat {obj.heat_number}'),
+    'lot': (InspectionReport, ('batch_number',), lambda obj: f'Lot {obj.batch_number} ({obj.section}, {obj.date})'),
+}
+
+
+def _index_table(model):
+    return f'{model._meta.db_table}_search'
+
+
+SEARCH_TRIGGER_ACTIONS = ('insert', 'delete', 'update')
+
+
+def _trigger_sql(model, columns):
+    """The triggers migration 0007 creates on model's table, by action"""
+    table, index = model._meta.db_table, _index_table(model)
+    names = ', '.join(columns)
+    new = ', '.join(f'new.{column}' for column in columns)
+    old = ', '.join(f'old.{column}' for column in columns)
+    return {
+        'insert': f'CREATE TRIGGER {index}_insert AFTER INSERT ON {table} BEGIN '
+                  f'INSERT INTO {index}(rowid, {names}) VALUES (new.id, {new}); END',
+        'delete': f'CREATE TRIGGER {index}_delete AFTER DELETE ON {table} BEGIN '
+                  f"INSERT INTO {index}({index}, rowid, {names}) VALUES ('delete', old.id, {old}); END",
+        'update': f'CREATE TRIGGER {index}_update AFTER UPDATE OF {names} ON {table} BEGIN '
+                  f"INSERT INTO {index}({index}, rowid, {names}) VALUES ('delete', old.id, {old}); "
+                  f'INSERT INTO {index}(rowid, {names}) VALUES (new.id, {new}); END',
+    }
+
+
+def missing_search_triggers(using=DEFAULT_DB_ALIAS):
+    """
+    {index table: [missing trigger actions]} for the SQLite search indexes
+    whose triggers are gone; indexes not created yet are left out
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return {}
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT type, name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+        existing = set(cursor.fetchall())
+    missing = {}
+    for model, _, _ in SEARCH_SOURCES.values():
+        index = _index_table(model)
+        if ('table', index) not in existing:
+            continue
+        actions = [action for action in SEARCH_TRIGGER_ACTIONS if ('trigger', f'{index}_{action}') not in existing]
+        if actions:
+            missing[index] = actions
+    return missing
+
+
+def repair_search_index(rebuild_all=False, using=DEFAULT_DB_ALIAS):
+    """
+    Recreate missing search index triggers and rebuild the indexes that
+    lost any (every index with rebuild_all), in one transaction. Migrations
+    that remake a table drop its triggers, and so does a bulk load killed
+    inside deferred_search_index. A no-op outside SQLite. Returns
+    the index tables rebuilt.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return []
+    rebuilt = []
+    with transaction.atomic(using=using):
+        missing = missing_search_triggers(using)
+        with connection.cursor() as cursor:
+            for model, columns, _ in SEARCH_SOURCES.values():
+                index = _index_table(model)
+                if index not in missing and not rebuild_all:
+                    continue
+                triggers = _trigger_sql(model, columns)
+                for action in missing.get(index, ()):
+                    cursor.execute(triggers[action])
+                cursor.execute(f"INSERT INTO {index}({index}) VALUES ('rebuild')")
+                rebuilt.append(index)
+    return rebuilt
+
+
+def repair_after_migrate(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """post_migrate receiver: put back the triggers a table-remaking migration dropped"""
+    repair_search_index(using=using)
+
+
+@contextlib.contextmanager
+def deferred_search_index():
+    """
+    Index rows inserted inside the block with one INSERT ... SELECT per
+    table at the end, instead of row by row from the insert triggers.
+
+    FTS5 indexes a large batch several times faster in one statement. The
+    insert triggers are dropped for the duration, while the block commits
+    as it goes, so other writers wait for one chunk at a time rather than
+    the whole load. On exit, after an error too, every row with an id past
+    the table's maximum at entry is indexed and the triggers are restored
+    in one transaction; that covers rows other connections inserted
+    meanwhile. A process killed inside the block leaves the triggers
+    missing until the next deferred_search_index, migrate or
+    rebuild_search_index repairs the index (see repair_search_index). Run
+    one bulk load at a time. A no-op outside SQLite.
+    """
+    if connection.vendor != 'sqlite':
+        yield
+        return
+    # A load killed part way left its triggers dropped
+    repair_search_index()
+    sources = [(model, columns) for model, columns, _ in SEARCH_SOURCES.values()]
+    high_water = {
+        model: model._base_manager.order_by('-pk').values_list('pk', flat=True).first() or 0
+        for model, _ in sources
+    }
+    with connection.cursor() as cursor:
+        for model, _ in sources:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {_index_table(model)}_insert')
+    try:
+        yield
+    finally:
+        with transaction.atomic(), connection.cursor() as cursor:
+            for model, columns in sources:
+                names = ', '.join(columns)
+                cursor.execute(
+                    f'INSERT INTO {_index_table(model)}(rowid, {names}) '
+                    f'SELECT id, {names} FROM {model._meta.db_table} WHERE id > %s',
+                    [high_water[model]]
+                )
+                cursor.execute(_trigger_sql(model, columns)['insert'])
+
+
+def _match_expression(term, columns=None):
+    """FTS5 query matching term as a literal substring, optionally in some columns only"""
+    phrase = '"{}"'.format(term.replace('"', '""'))
+    if columns:
+        return '{%s} : %s' % (' '.join(columns), phrase)
+    return phrase
+
+
+def _similarity(column, term):
+    return Func(F(column), Value(term), function='similarity', output_field=FloatField())
+
+
+def contains(queryset, field, term):
+    """queryset narrowed to rows whose field contains term, ignoring case, through the index"""
+    if len(term) < MIN_TERM_LENGTH or connections[queryset.db].vendor != 'sqlite':
+        # PostgreSQL answers ILIKE from the trigram index by itself
+        return queryset.filter(**{f'{field}__icontains': term})
+    table = _index_table(queryset.model)
+    return queryset.filter(pk__in=RawSQL(
+        f'SELECT rowid FROM {table} WHERE {table} MATCH %s', [_match_expression(term, [field])]
+    ))
+
+
+def _ranked_ids_sqlite(queryset, term, limit):
+    table = _index_table(queryset.model)
+    with connections[queryset.db].cursor() as cursor:
+        # Only the first RANK_CANDIDATES matches are scored: ORDER BY rank over
+        # a term found in every row costs seconds, and bm25() tells such
+        # matches little apart anyway. bm25() is negative, better matches lower.
+        cursor.execute(
+            f'SELECT rowid, score FROM (SELECT rowid, -bm25({table}) AS score FROM {table} '
+            f'WHERE {table} MATCH %s LIMIT %s) ORDER BY score DESC, rowid LIMIT %s',
+            [_match_expression(term), RANK_CANDIDATES, limit]
+        )
+        return cursor.fetchall()
+
+
+def _ranked_ids_postgresql(queryset, columns, term, limit):
+    condition = Q()
+    for column in columns:
+        condition |= Q(**{f'{column}__icontains': term})
+    similarities = [_similarity(column, term) for column in columns]
+    score = Greatest(*similarities) if len(similarities) > 1 else similarities[0]
+    return list(
+        queryset.filter(condition).annotate(score=score)
+        .order_by('-score', 'pk').values_list('pk', 'score')[:limit]
+    )
+
+
+def search(term, kinds=None, limit=DEFAULT_LIMIT):
+    """
+    Best matches for term across the SEARCH_SOURCES kinds given (all by
+    default), as dicts with kind, id, label and score, best first.
+    Raises ValueError for terms the index cannot serve or unknown kinds.
+    """
+    term = term.strip()
+    if len(term) < MIN_TERM_LENGTH:
+        raise ValueError(f'Search terms need at least {MIN_TERM_LENGTH} characters')
+    kinds = kinds or list(SEARCH_SOURCES)
+    unknown = [kind for kind in kinds if kind not in SEARCH_SOURCES]
+    if unknown:
+        raise ValueError(f'Unknown search kind(s): {", ".join(unknown)}')
+
+    results = []
+    for kind in kinds:
+        model, columns, label = SEARCH_SOURCES[kind]
+        # The database the model is read from, which need not be the default one
+        queryset = model._default_manager.all()
+        vendor = connections[queryset.db].vendor
+        if vendor == 'sqlite':
+            ranked = _ranked_ids_sqlite(queryset, term, limit)
+        elif vendor == 'postgresql':
+            ranked = _ranked_ids_postgresql(queryset, columns, term, limit)
+        else:
+            ranked = [(pk, 0.0) for pk in contains(queryset.order_by('pk'), columns[0], term)
+                      .values_list('pk', flat=True)[:limit]]
+        objects = queryset.in_bulk([pk for pk, _ in ranked])
+        results.extend(
+            {'kind': kind, 'id': pk, 'label': label(objects[pk]), 'score': round(score, 4)}
+            for pk, score in ranked if pk in objects
+        )
+    results.sort(key=lambda result: -result['score'])
+    return results[:limit]
@@ -0,0 +1,303 @@
+"""
+Synthetic laboratory data for load and scale testing.
+
+Rows are generated column-wise with NumPy and written with multi-row
+INSERTs per table and batch. Samples are grouped into inspection lots of one bar section
+each; the section decides the UTN scale the lab would test it on, and the
+machine readings are derived from realistic Fe 500 yield and tensile
+strengths, so stresses come out of the real calibration curves.
+"""
+import contextlib
+from datetime import date, datetime, time, timedelta
+from itertools import chain
+
+import numpy as np
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from .calclation import DIVISION_COEFFICIENTS, division_stress_array
+from .lot_statistics import recompute_lot_statistics
+from .models import CountryGDP, InspectionReport, SampleParameters, ScaleLoadMeasurements, StressCalculation, WaterSystem
+from .search import deferred_search_index
+
+# Bar diameter (mm) -> UTN scale used to test it
+SECTIONS = {8: 10, 10: 10, 12: 25, 16: 25, 20: 50, 25: 50, 28: 100, 32: 100}
+
+# Share of rolling output per section
+SECTION_WEIGHTS = np.array([0.08, 0.14, 0.2, 0.2, 0.14, 0.12, 0.07, 0.05])
+
+GDP_YEARS = ('2013', '2014', '2015', '2016')
+
+STEEL_DENSITY = 0.00785  # kg per metre per mm² of section
+
+
+@contextlib.contextmanager
+def fast_sqlite_load():
+    """Skip fsync while bulk loading into SQLite; restored afterwards"""
+    # The safety level cannot change inside a transaction
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        yield
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA synchronous')
+        previous = cursor.fetchone()[0]
+        cursor.execute('PRAGMA synchronous = OFF')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA synchronous = {previous}')
+
+
+def _machine_reading(utn_scale, load_kn):
+    """kgf reading giving load_kn on the calibration curve (two Newton steps)"""
+    coefficients = np.array([DIVISION_COEFFICIENTS[int(scale)] for scale in utn_scale])
+    A, B, C, D = coefficients.T
+    x = (load_kn - A) / B
+    for _ in range(2):
+        f = A + x * (B + x * (C + x * D)) - load_kn
+        x = x - f / (B + x * (2 * C + x * 3 * D))
+    return x
+
+
+def generate_lot_samples(rng, lots, samples_per_lot):
+    """Column arrays for every sample of the given lots"""
+    count = len(lots) * samples_per_lot
+    diameters = np.repeat([lot['diameter'] for lot in lots], samples_per_lot)
+    utn_scale = np.array([SECTIONS[d] for d in diameters], dtype=float)
+
+    length = np.round(rng.uniform(0.5, 1.0, count), 3)
+    mass_per_meter = diameters ** 2 * np.pi / 4 * STEEL_DENSITY * rng.normal(1.0, 0.015, count)
+    mass = np.round(mass_per_meter * length, 4)
+    area = mass / length / STEEL_DENSITY
+
+    yield_strength = rng.normal(545, 18, count)
+    tensile_strength = yield_strength * rng.normal(1.15, 0.025, count)
+
+    yield_reading = _machine_reading(utn_scale, yield_strength * area / 1000)
+    tensile_reading = _machine_reading(utn_scale, tensile_strength * area / 1000)
+
+    # The dial shows the reading as main scale + counter divisions of utn_scale kgf
+    yield_counter = rng.integers(0, 100, count).astype(float)
+    tensile_counter = rng.integers(0, 100, count).astype(float)
+    yield_main = np.round(yield_reading - utn_scale * yield_counter)
+    tensile_main = np.round(tensile_reading - utn_scale * tensile_counter)
+    yield_reading = yield_main + utn_scale * yield_counter
+    tensile_reading = tensile_main + utn_scale * tensile_counter
+
+    yield_stress, tensile_stress = division_stress_array(utn_scale, yield_reading, tensile_reading, area)
+
+    return {
+        'utn_scale': utn_scale,
+        'mass': mass,
+        'length': length,
+        'area': area,
+        'yield_main': yield_main,
+        'yield_counter': yield_counter,
+        'tensile_main': tensile_main,
+        'tensile_counter': tensile_counter,
+        'yield_reading': yield_reading,
+        'tensile_reading': tensile_reading,
+        'yield_stress': yield_stress,
+        'tensile_stress': tensile_stress,
+        'has_water': rng.random(count) < 0.9,
+        'water': rng.normal([2.5, 1.8, 25.0, 31.0], [0.2, 0.15, 2.0, 2.5], (count, 4)),
+    }
+
+
+def _timestamps(values):
+    """datetime64[us] array as DateTimeField values for the current database"""
+    if connection.vendor == 'sqlite':
+        # The format Django's SQLite backend stores, without a Python call per value
+        return np.char.replace(np.datetime_as_string(values, unit='us'), 'T', ' ').tolist()
+    return [connection.ops.adapt_datetimefield_value(value) for value in values.astype(object)]
+
+
+class _Inserter:
+    """
+    Plain multi-row INSERTs with ids allocated up front.
+
+    bulk_create spends most of its time preparing every value through the
+    field machinery; writing already-adapted tuples is an order of magnitude
+    faster, and allocating ids here lets child rows reference their parents
+    without reading ids back. Each statement carries as many rows as the
+    database takes parameters, which SQLite runs in half the time of one
+    statement per row.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.next_id = (model.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+
+    def allocate(self, count):
+        first = self.next_id
+        self.next_id += count
+        return range(first, first + count)
+
+    def insert(self, fields, rows):
+        quote = connection.ops.quote_name
+        columns = ', '.join(quote(self.model._meta.get_field(field).column) for field in fields)
+        insert = f'INSERT INTO {quote(self.model._meta.db_table)} ({columns}) VALUES '
+        row = '({})'.format(', '.join(['%s'] * len(fields)))
+        # As many rows per statement as the database takes parameters
+        per_statement = max(connection.ops.bulk_batch_size(fields, rows), 1)
+        full = len(rows) - len(rows) % per_statement
+        with connection.cursor() as cursor:
+            if full:
+                cursor.executemany(insert + ', '.join([row] * per_statement), [
+                    list(chain.from_iterable(rows[i:i + per_statement])) for i in range(0, full, per_statement)
+                ])
+            if full < len(rows):
+                rest = rows[full:]
+                cursor.execute(insert + ', '.join([row] * len(rest)), list(chain.from_iterable(rest)))
+        return len(rows)
+
+
+def _lot_batch(rng, inserters, first_lot, lot_count, samples_per_lot, start):
+    """Rows for lot_count lots, as (inserter, fields, rows) triples, and the new lot ids"""
+    adapt = connection.ops.adapt_datetimefield_value
+    lots = []
+    for number in range(first_lot, first_lot + lot_count):
+        diameter = int(rng.choice(list(SECTIONS), p=SECTION_WEIGHTS))
+        lots.append({'number': number, 'diameter': diameter, 'rolled': start + timedelta(hours=number)})
+
+    report_ids = inserters[InspectionReport].allocate(len(lots))
+    inserts = [(
+        inserters[InspectionReport],
+        ('id', 'date', 'batch_number', 'section', 'created_at', 'updated_at'),
+        [
+            (report_id, lot['rolled'].date(), f"LOT-{lot['number']:07d}", f"{lot['diameter']}mm",
+             adapt(lot['rolled']), adapt(lot['rolled']))
+            for report_id, lot in zip(report_ids, lots)
+        ]
+    )]
+
+    columns = generate_lot_samples(rng, lots, samples_per_lot)
+    count = len(columns['mass'])
+    # Samples of a lot are tested over the hours after rolling
+    rolled = np.repeat(np.array([lot['rolled'] for lot in lots], dtype='datetime64[us]'), samples_per_lot)
+    tested = _timestamps(rolled + rng.integers(0, 6 * 3600 * 10 ** 6, count).astype('timedelta64[us]'))
+    heats = rng.integers(0, 4, count).tolist()
+    lot_numbers = [lots[i // samples_per_lot]['number'] for i in range(count)]
+
+    sample_ids = inserters[SampleParameters].allocate(count)
+    inserts.append((
+        inserters[SampleParameters],
+        ('id', 'sample_number', 'heat_number', 'mass', 'length', 'created_at', 'updated_at'),
+        [
+            (sample_id, f'LOT-{lot:07d}-{i % samples_per_lot + 1:03d}', f'H{lot:07d}-{heat}',
+             mass, length, when, when)
+            for i, (sample_id, lot, heat, mass, length, when) in enumerate(zip(
+                sample_ids, lot_numbers, heats, columns['mass'].tolist(), columns['length'].tolist(), tested
+            ))
+        ]
+    ))
+
+    inserts.append((
+        inserters[ScaleLoadMeasurements],
+        ('id', 'utn_scale', 'yield_load_main_scale', 'yield_load_counter_part',
+         'tensile_load_main_scale', 'tensile_load_counter_part', 'created_at', 'updated_at'),
+        list(zip(
+            inserters[ScaleLoadMeasurements].allocate(count),
+            columns['utn_scale'].tolist(), columns['yield_main'].tolist(), columns['yield_counter'].tolist(),
+            columns['tensile_main'].tolist(), columns['tensile_counter'].tolist(), tested, tested
+        ))
+    ))
+
+    water_rows = np.flatnonzero(columns['has_water']).tolist()
+    water = np.round(columns['water'], 2).tolist()
+    inserts.append((
+        inserters[WaterSystem],
+        ('id', 'water_pressure_in', 'water_pressure_out', 'water_in_temperature', 'water_out_temperature',
+         'created_at', 'updated_at'),
+        [
+            (water_id, *water[i], tested[i], tested[i])
+            for water_id, i in zip(inserters[WaterSystem].allocate(len(water_rows)), water_rows)
+        ]
+    ))
+
+    division_types = [f'Division {scale}kgf' for scale in columns['utn_scale'].tolist()]
+    inserts.append((
+        inserters[StressCalculation],
+        ('id', 'sample_parameters', 'inspection_report', 'mass_per_meter', 'cross_section_area',
+         'yield_machine_reading', 'tensile_machine_reading', 'yield_stress', 'tensile_stress',
+         'division_type', 'created_at', 'updated_at'),
+        [
+            (calc_id, sample_id, report_ids[i // samples_per_lot], mass / length, *values, division, when, when)
+            for i, (calc_id, sample_id, mass, length, division, when, *values) in enumerate(zip(
+                inserters[StressCalculation].allocate(count), sample_ids,
+                columns['mass'].tolist(), columns['length'].tolist(), division_types, tested,
+                columns['area'].tolist(), columns['yield_reading'].tolist(), columns['tensile_reading'].tolist(),
+                columns['yield_stress'].tolist(), columns['tensile_stress'].tolist()
+            ))
+        ]
+    ))
+    return inserts, report_ids
+
+
+def _country_batch(rng, inserter, first_country, rows):
+    """rows CountryGDP rows, GDP_YEARS for each country in turn, with log-normally distributed values"""
+    countries = -(-rows // len(GDP_YEARS))
+    base = rng.lognormal(24, 2, countries)
+    values = np.round(base[:, None] * rng.normal(1.03, 0.04, (countries, len(GDP_YEARS))).cumprod(axis=1), 2).tolist()
+    records = []
+    for country_id, i in zip(inserter.allocate(rows), range(rows)):
+        country, year = divmod(i, len(GDP_YEARS))
+        number = first_country + country
+        records.append((
+            country_id, f'Country {number:06d}', f'C{number % 10000:04d}', GDP_YEARS[year], values[country][year]
+        ))
+    return [(inserter, ('id', 'name', 'code', 'year', 'value'), records)], []
+
+
+def seed_lab_data(samples, countries=0, seed=0, samples_per_lot=50, batch_size=10000,
+                  start=None, progress=None):
+    """
+    Generate samples test records (with their lots, scale loads, water
+    system readings and stress calculations) plus countries CountryGDP rows.
+    samples is rounded up to whole lots.
+
+    The same seed always produces the same data. progress, if given, is
+    called with the number of rows written so far after every batch.
+    Returns the total number of rows written.
+    """
+    rng = np.random.default_rng(seed)
+    start = start or datetime.combine(date(2024, 1, 1), time(6, 0))
+    lots_per_batch = max(batch_size // samples_per_lot, 1)
+    total_lots = -(-samples // samples_per_lot)
+    first_lot = InspectionReport.objects.count() + 1
+    first_country = -(-CountryGDP.objects.count() // len(GDP_YEARS))
+
+    models = (InspectionReport, SampleParameters, ScaleLoadMeasurements, WaterSystem, StressCalculation, CountryGDP)
+    inserters = {model: _Inserter(model) for model in models}
+
+    def batches():
+        for offset in range(0, total_lots, lots_per_batch):
+            yield _lot_batch(
+                rng, inserters, first_lot + offset, min(lots_per_batch, total_lots - offset), samples_per_lot, start
+            )
+        # Whole countries per batch, so every country gets all of its years
+        step = max(batch_size // len(GDP_YEARS), 1) * len(GDP_YEARS)
+        for offset in range(0, countries, step):
+            yield _country_batch(
+                rng, inserters[CountryGDP], first_country + offset // len(GDP_YEARS), min(step, countries - offset)
+            )
+
+    written = 0
+    with fast_sqlite_load(), deferred_search_index():
+        for inserts, lot_ids in batches():
+            with transaction.atomic():
+                for inserter, fields, rows in inserts:
+                    written += inserter.insert(fields, rows)
+                # Raw inserts bypass StressCalculation.save(), so build the lots' statistics here
+                recompute_lot_statistics(lot_ids)
+            if progress:
+                progress(written)
+
+    # Explicit ids leave PostgreSQL sequences behind; no-op on SQLite
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    if statements:
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+    return written
@@ -20,11 +20,42 @@ function selectTab(tabElement) {
 function performSearch() {
     const searchTerm = document.getElementById('searchInput').value;
     if (searchTerm.trim()) {
-        alert('Searching for: ' + searchTerm);
-        // Add your search logic here
+        searchRecords(searchTerm.trim());
     }
 }
 
+// Query the search endpoint and list the matches under the search box
+function searchRecords(searchTerm) {
+    const container = document.getElementById('searchContainer') || document.getElementById('searchInput').parentNode;
+    let results = document.getElementById('searchResults');
+    if (!results) {
+        results = document.createElement('ul');
+        results.id = 'searchResults';
+        results.style.cssText = 'position: absolute; z-index: 1000; list-style: none; margin: 4px 0 0; padding: 4px 0; ' +
+            'background: white; color: #2d3748; border-radius: 6px; box-shadow: 0 4px 12px rgba(0, 0, 0, 0.15); min-width: 260px;';
+        container.style.position = 'relative';
+        container.appendChild(results);
+    }
+
+    fetch('/search/?q=' + encodeURIComponent(searchTerm))
+        .then(response => response.json())
+        .then(data => {
+            results.replaceChildren();
+            const messages = data.status !== 'success' ? [data.message]
+                : data.results.length === 0 ? ['No matches for "' + searchTerm + '"'] : [];
+            messages.concat(data.status === 'success' ? data.results : []).forEach(item => {
+                const entry = document.createElement('li');
+                entry.style.padding = '4px 12px';
+                entry.textContent = typeof item === 'string' ? item : item.kind + ': ' + item.label;
+                results.appendChild(entry);
+            });
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            results.replaceChildren();
+        });
+}
+
 // Allow search on Enter key
 document.addEventListener('DOMContentLoaded', function() {
     document.getElementById('searchInput').addEventListener('keypress', function(e) {
@@ -57,16 +88,19 @@ function submitForm() {
     };
     
     // Send AJAX request
+    const body = JSON.stringify(data);
     fetch('/', {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
+            'Idempotency-Key': submissionKey(body)
         },
-        body: JSON.stringify(data)
+        body: body
     })
     .then(response => response.json())
     .then(data => {
         if (data.status === 'success') {
+            submissionDone();
             alert('Form submitted successfully!');
             form.reset();
             // Set today's date as default after form reset
@@ -0,0 +1,17 @@
+// One Idempotency-Key per submission: sending the same data again after a
+// failure reuses the key, so the server stores the submission only once
+var pendingSubmission = null;
+
+function submissionKey(body) {
+    if (!pendingSubmission || pendingSubmission.body !== body) {
+        const key = window.crypto && crypto.randomUUID
+            ? crypto.randomUUID()
+            : Date.now().toString(36) + '-' + Math.random().toString(36).slice(2);
+        pendingSubmission = {body: body, key: key};
+    }
+    return pendingSubmission.key;
+}
+
+function submissionDone() {
+    pendingSubmission = null;
+}
@@ -1,91 +1,332 @@
+import math
+
 from django.db import transaction
-from .models import StressCalculation
-from .calclation import (
-    division_10kgf,
-    division_25kgf,
-    division_50kgf,
-    division_100kgf
-)
+from .models import SampleParameters, ScaleLoadMeasurements, StressCalculation, WaterSystem
+import numpy as np
+
+from .calclation import DIVISION_COEFFICIENTS, division_stress, division_stress_array
+from .instrumentation import span
+from .lot_statistics import record_stress_calculations
+from . import metrics
 
-def calculate_and_store_stress(
+def calculate_stress(
     mass,
     length,
     utn_scale,
     yield_load_main_scale,
     yield_load_counter_part,
     tensile_load_main_scale,
-    tensile_load_counter_part,
-    sample_parameters=None,
-    inspection_report=None
+    tensile_load_counter_part
 ):
     """
-    Calculate stress values and store them in the database
+    Calculate stress values without touching the database
     """
-    try:
-        # Calculate derived values
+    # Calculate derived values
+    mass_per_meter = mass / length
+    cross_section_area = mass_per_meter / 0.00785
+
+    # Calculate machine readings
+    yield_machine_reading = yield_load_main_scale + utn_scale * yield_load_counter_part
+    tensile_machine_reading = tensile_load_main_scale + utn_scale * tensile_load_counter_part
+
+    # Calculate stresses from the calibration table for this UTN scale
+    yield_stress, tensile_stress = division_stress(
+        utn_scale,
+        yield_machine_reading,
+        tensile_machine_reading,
+        cross_section_area
+    )
+    # Extreme (if finite) inputs can still overflow or underflow on the way
+    if not (cross_section_area > 0 and all(
+        math.isfinite(value) for value in (cross_section_area, yield_stress, tensile_stress)
+    )):
+        raise ValueError('mass and length give no usable cross section area')
+
+    return {
+        'mass_per_meter': mass_per_meter,
+        'cross_section_area': cross_section_area,
+        'yield_machine_reading': yield_machine_reading,
+        'tensile_machine_reading': tensile_machine_reading,
+        'yield_stress': yield_stress,
+        'tensile_stress': tensile_stress,
+        'division_type': f"Division {utn_scale}kgf"
+    }
+
+
+def calculate_stress_array(
+    mass,
+    length,
+    utn_scale,
+    yield_load_main_scale,
+    yield_load_counter_part,
+    tensile_load_main_scale,
+    tensile_load_counter_part
+):
+    """
+    Vectorised calculate_stress for equally sized arrays of inputs.
+
+    Rows calculate_stress would reject come out with a zero or non-finite
+    area or stress instead of raising; see usable_rows.
+    """
+    mass = np.asarray(mass, dtype=float)
+    length = np.asarray(length, dtype=float)
+    utn_scale = np.asarray(utn_scale, dtype=float)
+
+    with np.errstate(divide='ignore', over='ignore', invalid='ignore'):
         mass_per_meter = mass / length
         cross_section_area = mass_per_meter / 0.00785
-        
-        # Calculate machine readings
-        yield_machine_reading = yield_load_main_scale + utn_scale * yield_load_counter_part
-        tensile_machine_reading = tensile_load_main_scale + utn_scale * tensile_load_counter_part
-        
-        # Select and call the appropriate division function based on UTN scale value
-        division_functions = {
-            10: division_10kgf,
-            25: division_25kgf,
-            50: division_50kgf,
-            100: division_100kgf
-        }
-        
-        if utn_scale not in division_functions:
-            raise ValueError(f"Invalid UTN scale value: {utn_scale}. Must be 10, 25, 50, or 100")
-            
-        # Calculate stresses
-        yield_stress, tensile_stress = division_functions[utn_scale](
+
+    yield_machine_reading = np.asarray(yield_load_main_scale, dtype=float) + utn_scale * np.asarray(yield_load_counter_part, dtype=float)
+    tensile_machine_reading = np.asarray(tensile_load_main_scale, dtype=float) + utn_scale * np.asarray(tensile_load_counter_part, dtype=float)
+
+    with np.errstate(divide='ignore', over='ignore', invalid='ignore'):
+        yield_stress, tensile_stress = division_stress_array(
+            utn_scale,
             yield_machine_reading,
             tensile_machine_reading,
             cross_section_area
         )
-        
-        # Store results in database
-        with transaction.atomic():
-            stress_calc = StressCalculation.objects.create(
-                # Physical Properties
-                mass_per_meter=mass_per_meter,
-                cross_section_area=cross_section_area,
-                
-                # Machine Readings
-                yield_machine_reading=yield_machine_reading,
-                tensile_machine_reading=tensile_machine_reading,
-                
-                # Stress Analysis Results
-                yield_stress=yield_stress,
-                tensile_stress=tensile_stress,
-                division_type=f"Division {utn_scale}kgf",
-                
-                # Relations
-                sample_parameters=sample_parameters,
-                inspection_report=inspection_report
-            )
-        
-        return {
-            'success': True,
-            'stress_calculation': stress_calc,
-            'calculated_values': {
-                'mass_per_meter': mass_per_meter,
-                'cross_section_area': cross_section_area,
-                'yield_machine_reading': yield_machine_reading,
-                'tensile_machine_reading': tensile_machine_reading,
-                'yield_stress': yield_stress,
-                'tensile_stress': tensile_stress,
-                'division_type': f"Division {utn_scale}kgf"
+
+    return {
+        'mass_per_meter': mass_per_meter,
+        'cross_section_area': cross_section_area,
+        'yield_machine_reading': yield_machine_reading,
+        'tensile_machine_reading': tensile_machine_reading,
+        'yield_stress': yield_stress,
+        'tensile_stress': tensile_stress,
+        'division_type': [f"Division {scale}kgf" for scale in utn_scale.tolist()]
+    }
+
+
+def usable_rows(calculated):
+    """Mask of the rows of calculate_stress_array's result that may be stored"""
+    area = calculated['cross_section_area']
+    return (
+        np.isfinite(area) & (area > 0)
+        & np.isfinite(calculated['yield_stress']) & np.isfinite(calculated['tensile_stress'])
+    )
+
+
+SAMPLE_FIELDS = ('mass', 'length')
+SCALE_FIELDS = (
+    'utn_scale',
+    'yield_load_main_scale',
+    'yield_load_counter_part',
+    'tensile_load_main_scale',
+    'tensile_load_counter_part'
+)
+WATER_FIELDS = (
+    'water_pressure_in',
+    'water_pressure_out',
+    'water_in_temperature',
+    'water_out_temperature'
+)
+VALID_UTN_SCALES = tuple(DIVISION_COEFFICIENTS)
+
+
+def _is_blank(value):
+    return value is None or value == ''
+
+
+def parse_submission(data):
+    """
+    Validate one intake record and return its cleaned values.
+
+    Raises ValueError with a user-facing message when the record is invalid.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Record must be a JSON object')
+
+    sample_data = data.get('sample_parameters') or {}
+    water_data = data.get('water_system') or {}
+    scale_data = data.get('scale_load_measurements') or {}
+    if not all(isinstance(part, dict) for part in (sample_data, water_data, scale_data)):
+        raise ValueError('sample_parameters, water_system and scale_load_measurements must be objects')
+
+    # Validate required fields for calculations
+    required_fields = {field: sample_data.get(field) for field in SAMPLE_FIELDS}
+    required_fields.update({field: scale_data.get(field) for field in SCALE_FIELDS})
+    # 0 is a valid reading (a counter part often is); only absent or blank values are missing
+    missing_fields = [field for field, value in required_fields.items() if _is_blank(value)]
+    if missing_fields:
+        raise ValueError(f'Missing required fields for calculations: {", ".join(missing_fields)}')
+
+    # Convert to float
+    try:
+        values = {field: float(value) for field, value in required_fields.items()}
+        water = {
+            field: float(water_data.get(field) or 0)
+            for field in WATER_FIELDS
+        } if any(not _is_blank(water_data.get(field)) for field in WATER_FIELDS) else None
+    except (ValueError, TypeError) as e:
+        raise ValueError(f'Invalid numeric values: {str(e)}')
+
+    # float() accepts "inf" and "nan", which no column can store
+    not_finite = [field for field, value in {**values, **(water or {})}.items() if not math.isfinite(value)]
+    if not_finite:
+        raise ValueError(f'Values must be finite numbers: {", ".join(not_finite)}')
+    not_positive = [field for field in SAMPLE_FIELDS if values[field] <= 0]
+    if not_positive:
+        raise ValueError(f'Values must be greater than zero: {", ".join(not_positive)}')
+
+    if values['utn_scale'] not in VALID_UTN_SCALES:
+        raise ValueError(f"Invalid UTN scale value: {values['utn_scale']}. Must be 10, 25, 50, or 100")
+
+    return {
+        'sample': {
+            'sample_number': sample_data.get('sample_number') or '',
+            'heat_number': sample_data.get('heat_number') or '',
+            'mass': values['mass'],
+            'length': values['length']
+        },
+        'water': water,
+        'scale': {field: values[field] for field in SCALE_FIELDS}
+    }
+
+
+def store_submission(cleaned, calculated_values, inspection_report=None):
+    """
+    Persist one validated record in a single transaction.
+
+    Each entity is inserted exactly once and the StressCalculation links to
+    the SampleParameters row created here.
+    """
+    with transaction.atomic():
+        sample = SampleParameters.objects.create(**cleaned['sample'])
+        stress_calc = StressCalculation.objects.create(
+            sample_parameters=sample,
+            inspection_report=inspection_report,
+            **calculated_values
+        )
+        water_system = WaterSystem.objects.create(**cleaned['water']) if cleaned['water'] else None
+        scale_load = ScaleLoadMeasurements.objects.create(**cleaned['scale'])
+
+    metrics.inc('excelexport_stress_calculations_total', division_type=stress_calc.division_type)
+    return {
+        'sample': sample,
+        'stress_calculation': stress_calc,
+        'water_system': water_system,
+        'scale_load': scale_load
+    }
+
+
+def submission_ids(saved):
+    """Ids of the rows store_submission wrote, shaped like store_submission_batch's"""
+    water_system = saved['water_system']
+    return {
+        'stress_calculation_id': saved['stress_calculation'].id,
+        'sample_id': saved['sample'].id,
+        'water_system_id': water_system.id if water_system else None,
+        'scale_load_id': saved['scale_load'].id
+    }
+
+
+def calculate_and_store_stress_batch(records, inspection_report=None):
+    """
+    Validate, calculate and store a batch of intake records.
+
+    Every valid record is persisted with bulk_create inside one transaction;
+    invalid records are reported back without aborting the rest of the batch.
+    Returns one result dict per input record, in input order.
+    """
+    results = [None] * len(records)
+    valid = []
+
+    # Validate everything up front
+    with span('validate'):
+        for index, record in enumerate(records):
+            try:
+                valid.append((index, parse_submission(record)))
+            except ValueError as e:
+                results[index] = {'index': index, 'status': 'error', 'message': str(e)}
+
+    if not valid:
+        return results
+
+    # Calculate stresses for the whole batch in one vectorised pass
+    with span('calculate'):
+        calculated = calculate_stress_array(
+            mass=[cleaned['sample']['mass'] for _, cleaned in valid],
+            length=[cleaned['sample']['length'] for _, cleaned in valid],
+            **{
+                field: [cleaned['scale'][field] for _, cleaned in valid]
+                for field in SCALE_FIELDS
             }
+        )
+        usable = usable_rows(calculated).tolist()
+        columns = {
+            field: values.tolist() if isinstance(values, np.ndarray) else values
+            for field, values in calculated.items()
+        }
+        for position, (index, cleaned) in enumerate(valid):
+            if usable[position]:
+                cleaned['calculated_values'] = {field: column[position] for field, column in columns.items()}
+            else:
+                results[index] = {
+                    'index': index,
+                    'status': 'error',
+                    'message': 'Invalid input - mass and length give no usable cross section area'
+                }
+        valid = [(index, cleaned) for index, cleaned in valid if 'calculated_values' in cleaned]
+
+    if not valid:
+        return results
+
+    with span('persist'):
+        stored = store_submission_batch([cleaned for _, cleaned in valid], inspection_report)
+
+    for (index, cleaned), ids in zip(valid, stored):
+        results[index] = {
+            'index': index,
+            'status': 'success',
+            'calculated_values': cleaned['calculated_values'],
+            **ids
         }
-        
-    except ValueError as e:
-        return {'success': False, 'error': f"Invalid input - {str(e)}"}
-    except ZeroDivisionError:
-        return {'success': False, 'error': "Division by zero. Check your input values."}
-    except Exception as e:
-        return {'success': False, 'error': f"An unexpected error occurred: {str(e)}"}
+    return results
+
+
+def store_submission_batch(cleaned_records, inspection_report=None):
+    """
+    Persist validated records, each carrying its calculated_values, with
+    bulk_create in one transaction (the caller's, if one is open).
+
+    Returns the ids of the rows written for each record, in input order.
+    """
+    with transaction.atomic():
+        samples = SampleParameters.objects.bulk_create(
+            [SampleParameters(**cleaned['sample']) for cleaned in cleaned_records]
+        )
+        calculations = StressCalculation.objects.bulk_create([
+            StressCalculation(
+                sample_parameters=sample,
+                inspection_report=inspection_report,
+                **cleaned['calculated_values']
+            )
+            for sample, cleaned in zip(samples, cleaned_records)
+        ])
+        # bulk_create bypasses save(), so fold the rows into the lot statistics here
+        record_stress_calculations(calculations)
+        scale_loads = ScaleLoadMeasurements.objects.bulk_create(
+            [ScaleLoadMeasurements(**cleaned['scale']) for cleaned in cleaned_records]
+        )
+        water_records = [position for position, cleaned in enumerate(cleaned_records) if cleaned['water']]
+        water_systems = dict(zip(
+            water_records,
+            WaterSystem.objects.bulk_create(
+                [WaterSystem(**cleaned_records[position]['water']) for position in water_records]
+            )
+        ))
+
+    for calc in calculations:
+        metrics.inc('excelexport_stress_calculations_total', division_type=calc.division_type)
+
+    stored = []
+    for position, (sample, calc, scale_load) in enumerate(zip(samples, calculations, scale_loads)):
+        water_system = water_systems.get(position)
+        stored.append({
+            'stress_calculation_id': calc.id,
+            'sample_id': sample.id,
+            'water_system_id': water_system.id if water_system else None,
+            'scale_load_id': scale_load.id
+        })
+    return stored
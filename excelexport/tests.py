@@ -1,3 +1,1347 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import datetime
+from decimal import Decimal
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+
+from .calclation import division_stress, division_stress_array
+from openpyxl import load_workbook
+
+from .models import CountryGDP, InspectionReport, LotStatistics, SampleParameters, ScaleLoadMeasurements, StressCalculation, WaterSystem
+from .reports import filter_stress_calculations, summarize_stress_calculations
+
+
+def make_record(**overrides):
+    record = {
+        'sample_parameters': {
+            'sample_number': 'S-001',
+            'heat_number': 'H-001',
+            'mass': 3.95,
+            'length': 1.0
+        },
+        'water_system': {
+            'water_pressure_in': 2.5,
+            'water_pressure_out': 1.8,
+            'water_in_temperature': 25.0,
+            'water_out_temperature': 30.0
+        },
+        'scale_load_measurements': {
+            'utn_scale': 25,
+            'yield_load_main_scale': 12000,
+            'yield_load_counter_part': 40,
+            'tensile_load_main_scale': 15000,
+            'tensile_load_counter_part': 60
+        }
+    }
+    for section, values in overrides.items():
+        record[section] = {**record[section], **values}
+    return record
+
+
+class BatchIntakeTests(TestCase):
+    url = '/advanced_materials_testing/batch/'
+
+    def post(self, payload):
+        return self.client.post(self.url, json.dumps(payload), content_type='application/json')
+
+    def test_batch_stores_every_record(self):
+        response = self.post({'records': [make_record() for _ in range(5)]})
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['status'], 'success')
+        self.assertEqual(body['saved'], 5)
+        self.assertEqual(StressCalculation.objects.count(), 5)
+        self.assertEqual(SampleParameters.objects.count(), 5)
+        self.assertEqual(WaterSystem.objects.count(), 5)
+        self.assertEqual(ScaleLoadMeasurements.objects.count(), 5)
+
+        result = body['results'][0]
+        calc = StressCalculation.objects.get(id=result['stress_calculation_id'])
+        self.assertEqual(calc.sample_parameters_id, result['sample_id'])
+
+    def test_batch_reports_invalid_records(self):
+        response = self.post({'records': [
+            make_record(),
+            make_record(scale_load_measurements={'utn_scale': 30}),
+            make_record(sample_parameters={'mass': 'heavy'}),
+        ]})
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['status'], 'partial')
+        self.assertEqual([r['status'] for r in body['results']], ['success', 'error', 'error'])
+        self.assertIn('Invalid UTN scale', body['results'][1]['message'])
+        self.assertEqual(StressCalculation.objects.count(), 1)
+
+    def test_batch_rejects_unusable_numbers_per_record(self):
+        response = self.post({'records': [
+            make_record(sample_parameters={'length': 'inf'}),
+            make_record(sample_parameters={'mass': 'nan'}),
+            make_record(sample_parameters={'mass': -3.95}),
+            make_record(water_system={'water_in_temperature': 'nan'}),
+            # Finite, but the area underflows to zero
+            make_record(sample_parameters={'mass': 1e-320, 'length': 1e10}),
+            make_record(),
+        ]})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(b'Infinity', response.content)
+        self.assertNotIn(b'NaN', response.content)
+        results = response.json()['results']
+        self.assertEqual([r['status'] for r in results], ['error'] * 5 + ['success'])
+        self.assertIn('finite', results[0]['message'])
+        self.assertIn('greater than zero', results[2]['message'])
+        self.assertIn('cross section area', results[4]['message'])
+        self.assertEqual(StressCalculation.objects.count(), 1)
+
+    def test_single_record_rejects_unusable_numbers(self):
+        for sample in ({'mass': 'nan'}, {'length': 'inf'}, {'length': 0.0}):
+            response = self.client.post(
+                '/advanced_materials_testing/', json.dumps(make_record(sample_parameters=sample)),
+                content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 400, sample)
+        self.assertFalse(StressCalculation.objects.exists())
+
+    def test_zero_counter_parts_are_valid(self):
+        zero = {'yield_load_counter_part': 0, 'tensile_load_counter_part': 0}
+        response = self.post({'records': [
+            make_record(scale_load_measurements=zero),
+            make_record(scale_load_measurements={'yield_load_counter_part': None}),
+        ]})
+
+        results = response.json()['results']
+        self.assertEqual([r['status'] for r in results], ['success', 'error'])
+        self.assertIn('Missing required fields', results[1]['message'])
+        self.assertEqual(ScaleLoadMeasurements.objects.get().yield_load_counter_part, 0)
+
+    def test_batch_requires_records(self):
+        response = self.post({'records': []})
+        self.assertEqual(response.status_code, 400)
+
+
+class CalibrationEngineTests(SimpleTestCase):
+
+    def test_array_matches_scalar_for_mixed_scales(self):
+        scales = [10, 25, 50, 100, 25]
+        yields = [9000.0, 13000.0, 15000.0, 21000.0, 500.0]
+        tensiles = [11000.0, 16500.0, 19000.0, 26000.0, 800.0]
+        areas = [490.0, 503.2, 615.8, 804.2, 78.5]
+
+        yield_stress, tensile_stress = division_stress_array(scales, yields, tensiles, areas)
+
+        for i, scale in enumerate(scales):
+            expected = division_stress(scale, yields[i], tensiles[i], areas[i])
+            self.assertAlmostEqual(yield_stress[i], expected[0], places=9)
+            self.assertAlmostEqual(tensile_stress[i], expected[1], places=9)
+
+    def test_array_rejects_unknown_scale(self):
+        with self.assertRaises(ValueError):
+            division_stress_array([10, 30], [1000, 1000], [1200, 1200], [500, 500])
+
+
+class IntakeWritePathTests(TestCase):
+    url = '/advanced_materials_testing/'
+
+    def test_submission_inserts_each_entity_once(self):
+        # One transaction holding the four INSERTs plus the lot statistics
+        # upsert (UPDATE, then a savepointed INSERT for a new group); no session save
+        with self.assertNumQueries(10):
+            response = self.client.post(self.url, json.dumps(make_record()), content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(SampleParameters.objects.count(), 1)
+        self.assertEqual(WaterSystem.objects.count(), 1)
+        self.assertEqual(ScaleLoadMeasurements.objects.count(), 1)
+
+        calc = StressCalculation.objects.get()
+        with self.assertNumQueries(0):
+            page = self.client.get(response.json()['redirect_url'])
+        results = page.context['results']
+        self.assertEqual(calc.sample_parameters_id, results['sample_id'])
+        self.assertEqual(calc.id, results['stress_calculation_id'])
+
+    def test_tampered_results_handle_is_rejected(self):
+        from .result_handles import results_url
+
+        url = results_url({'division_type': 'Division 25.0kgf', 'yield_stress': 400.0})
+        self.assertEqual(self.client.get(url).status_code, 200)
+        response = self.client.get(url.replace('results=', 'results=x'))
+        self.assertRedirects(response, '/advanced_materials_testing/', fetch_redirect_response=False)
+
+    def test_invalid_submission_writes_nothing(self):
+        record = make_record(scale_load_measurements={'utn_scale': 30})
+        response = self.client.post(self.url, json.dumps(record), content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(SampleParameters.objects.exists())
+        self.assertFalse(StressCalculation.objects.exists())
+
+
+class CountriesGdpExcelTests(TestCase):
+
+    def test_export_streams_all_rows(self):
+        CountryGDP.objects.bulk_create([
+            CountryGDP(name=f'Country {i:03d}', code=f'C{i:03d}', year='2015', value=Decimal('1234.50'))
+            for i in range(250)
+        ])
+
+        response = self.client.get('/countries_gdp_excel/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        workbook = load_workbook(io.BytesIO(b''.join(response.streaming_content)))
+        sheet = workbook.active
+        self.assertEqual(sheet['A1'].value, 'Countries GDP List 2013 - 2016')
+        self.assertEqual(sheet['A3'].value, 'Country Name')
+        self.assertEqual(sheet.max_row, 3 + 250)
+        self.assertEqual(sheet['A4'].value, 'Country 000')
+        self.assertEqual(sheet['D4'].number_format, '#,##0.00')
+
+
+class CountriesGdpListTests(TestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        # Two rows per name, so pages must break ties on id
+        CountryGDP.objects.bulk_create([
+            CountryGDP(name=f'Country {i // 2:03d}', code=f'C{i:03d}', year=str(2013 + i % 2), value=Decimal('1.00'))
+            for i in range(70)
+        ])
+
+    def test_keyset_pages_cover_every_row_once(self):
+        seen = []
+        url = '/countries_gdp_list/?year=2013'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            page = response.context['page']
+            seen.extend(row.code for row in page)
+            self.assertEqual(response.context['total_estimate'], 35)
+            url = f'/countries_gdp_list/?year=2013&after={page.next_cursor}' if page.has_next() else None
+
+        self.assertEqual(seen, [f'C{i:03d}' for i in range(0, 70, 2)])
+        previous = self.client.get(f'/countries_gdp_list/?year=2013&before={page.previous_cursor}').context['page']
+        self.assertEqual([row.code for row in previous][0], 'C000')
+        self.assertEqual((previous.start_index, previous.end_index), (1, 30))
+
+    def test_filters_reach_export_through_link_not_session(self):
+        response = self.client.get('/countries_gdp_list/?year=2014')
+
+        self.assertNotIn('year', self.client.session)
+        self.assertContains(response, 'href="/countries_gdp_excel/?year=2014"')
+        sheet = load_workbook(io.BytesIO(b''.join(self.client.get('/countries_gdp_excel/?year=2014').streaming_content))).active
+        self.assertEqual(sheet['A1'].value, 'Countries GDP List 2014')
+        self.assertEqual(sheet.max_row, 3 + 35)
+
+    def test_tampered_cursor_shows_first_page(self):
+        response = self.client.get('/countries_gdp_list/?name=Country&after=bogus')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['page'].start_index, 1)
+        self.assertContains(response, 'of about 70')
+
+
+def make_calculation(inspection_report=None, **overrides):
+    sample = SampleParameters.objects.create(sample_number='S-1', heat_number='H-1', mass=3.95, length=1.0)
+    values = {
+        'mass_per_meter': 3.95,
+        'cross_section_area': 503.18,
+        'yield_machine_reading': 13000.0,
+        'tensile_machine_reading': 16500.0,
+        'yield_stress': 334.52,
+        'tensile_stress': 496.56,
+        'division_type': 'Division 25.0kgf'
+    }
+    values.update(overrides)
+    return StressCalculation.objects.create(
+        sample_parameters=sample,
+        inspection_report=inspection_report,
+        **values
+    )
+
+
+class MechanicalInspectionExportTests(TestCase):
+    url = '/mechanical-inspection/export/'
+
+    def setUp(self):
+        self.lot_a = InspectionReport.objects.create(date=datetime.date(2025, 7, 1), batch_number='LOT-A', section='12mm')
+        self.lot_b = InspectionReport.objects.create(date=datetime.date(2025, 7, 2), batch_number='LOT-B', section='16mm')
+        for stress in (300.0, 320.0, 340.0):
+            make_calculation(self.lot_a, yield_stress=stress)
+        make_calculation(self.lot_b, yield_stress=500.0)
+
+    def test_csv_export_filters_by_lot(self):
+        response = self.client.get(self.url, {'format': 'csv', 'lot': 'LOT-A'})
+
+        self.assertEqual(response.status_code, 200)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertIn('Lot No:,LOT-A', lines)
+        data_rows = [line for line in lines if line.split(',')[0].isdigit()]
+        self.assertEqual(len(data_rows), 3)
+        self.assertIn('Min,,,3.95,1.00,3.95,503.18,13000.00,300.00,16500.00,496.56,,', lines)
+        self.assertIn('AVG,,,3.95,1.00,3.95,503.18,13000.00,320.00,16500.00,496.56,,', lines)
+        self.assertIn('SD,,,0.00,0.00,0.00,0.00,0.00,16.33,0.00,0.00,,', lines)
+
+    def test_xlsx_export_contains_every_row(self):
+        response = self.client.get(self.url, {'format': 'xlsx'})
+
+        self.assertEqual(response.status_code, 200)
+        sheet = load_workbook(io.BytesIO(b''.join(response.streaming_content))).active
+        serials = [row[0] for row in sheet.iter_rows(min_row=8, values_only=True) if isinstance(row[0], int)]
+        self.assertEqual(serials, [1, 2, 3, 4])
+
+    def test_export_rejects_bad_filters(self):
+        self.assertEqual(self.client.get(self.url, {'date_from': '01/07/2025'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'format': 'pdf'}).status_code, 400)
+
+
+class TableCsvExportTests(TestCase):
+    url = '/exports/stress-calculations.csv'
+
+    def setUp(self):
+        self.lot = InspectionReport.objects.create(date=datetime.date(2025, 7, 1), batch_number='LOT-A', section='12mm')
+        self.calcs = [make_calculation(self.lot, yield_stress=stress) for stress in (300.0, 310.0, 320.0, 330.0)]
+
+    def lines(self, response):
+        self.assertEqual(response.status_code, 200)
+        return list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+
+    def test_export_streams_rows_then_footer(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response['Accept-Ranges'], 'none')
+        lines = self.lines(response)
+        self.assertEqual(lines[0], ['Stress Calculations'])
+        self.assertEqual(lines[1][:2], ['ID', 'Sample ID'])
+        self.assertEqual([int(line[0]) for line in lines[2:6]], [calc.id for calc in self.calcs])
+        self.assertEqual(lines[-3][0], 'Min')
+        self.assertEqual(lines[-1][0], 'Mean')
+        self.assertEqual(lines[-1][7], '315.00')
+
+    def test_resumed_export_appends_to_partial_file(self):
+        full = self.lines(self.client.get(self.url))
+        resumed = self.lines(self.client.get(self.url, {'after': self.calcs[1].id}))
+
+        # No title or header, the remaining rows, and a footer over every row
+        self.assertEqual(full[:4] + resumed, full)
+
+    def test_filters_unknown_exports_and_bad_resume_points(self):
+        make_calculation(None, yield_stress=900.0)
+        rows = self.lines(self.client.get(self.url, {'lot': 'LOT-A'}))
+        self.assertEqual(rows[-2][7], '330.00')
+
+        self.assertEqual(self.client.get('/exports/users.csv').status_code, 404)
+        self.assertEqual(self.client.get(self.url, {'after': 'last'}).status_code, 400)
+        countries = self.lines(self.client.get('/exports/countries-gdp.csv'))
+        self.assertEqual(countries[1], ['ID', 'Country Name', 'Country Code', 'Year', 'Value'])
+
+
+class MechanicalInspectionReportTests(TestCase):
+    url = '/mechanical-inspection/'
+
+    def setUp(self):
+        from django.core.cache import cache
+
+        # Rendered pages are cached across tests, while the rows behind them roll back
+        cache.clear()
+        self.lot = InspectionReport.objects.create(date=datetime.date(2025, 7, 1), batch_number='LOT-A', section='12mm')
+        for i in range(40):
+            make_calculation(self.lot if i % 2 else None, yield_stress=300.0 + i)
+        # Ties on created_at must be broken by id
+        StressCalculation.objects.filter(id__lte=20).update(created_at=datetime.datetime(2025, 7, 1, 8, 0))
+
+    def serials(self, response):
+        return [row['serial_no'] for row in response.context['table_data']]
+
+    def test_pages_forward_and_back_by_cursor(self):
+        first = self.client.get(self.url)
+        self.assertEqual(self.serials(first), list(range(1, 16)))
+        self.assertFalse(first.context['page'].has_previous())
+
+        second = self.client.get(self.url, {'after': first.context['page'].next_cursor})
+        self.assertEqual(self.serials(second), list(range(16, 31)))
+
+        third = self.client.get(self.url, {'after': second.context['page'].next_cursor})
+        self.assertEqual(self.serials(third), list(range(31, 41)))
+        self.assertFalse(third.context['page'].has_next())
+
+        back = self.client.get(self.url, {'before': third.context['page'].previous_cursor})
+        self.assertEqual(self.serials(back), list(range(16, 31)))
+        self.assertEqual(
+            [row['yield_stress'] for row in back.context['table_data']],
+            [row['yield_stress'] for row in second.context['table_data']]
+        )
+
+    def test_cursor_from_another_keyset_is_rejected(self):
+        from .pagination import encode_cursor
+        from .reports import REPORT_ORDERING
+
+        CountryGDP.objects.bulk_create([
+            CountryGDP(name=f'Country {i:03d}', code=f'C{i:03d}', year='2015', value=Decimal('1.00')) for i in range(40)
+        ])
+        countries_cursor = self.client.get('/countries_gdp_list/').context['page'].next_cursor
+
+        for cursor in (countries_cursor, encode_cursor(REPORT_ORDERING, ['Country 029', 30]),
+                       encode_cursor(REPORT_ORDERING, ['Country 029', 30, 30])):
+            for direction in ('after', 'before'):
+                response = self.client.get(self.url, {direction: cursor})
+                self.assertEqual(response.status_code, 400, (direction, cursor))
+
+    def test_filters_by_lot(self):
+        response = self.client.get(self.url, {'lot': 'LOT-A', 'page_size': 50})
+        self.assertEqual(len(response.context['table_data']), 20)
+        self.assertEqual(response.context['header_data']['lot_no'], 'LOT-A')
+
+    def test_rejects_tampered_cursor(self):
+        self.assertEqual(self.client.get(self.url, {'after': 'garbage'}).status_code, 400)
+
+
+class ReportSummaryTests(TestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        for stress in (300.0, 310.0, 320.0, 330.0):
+            make_calculation(yield_stress=stress)
+
+    def test_summary_is_one_aggregate_query(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with self.assertNumQueries(1), CaptureQueriesContext(connection) as queries:
+            summary = summarize_stress_calculations(filter_stress_calculations({}))
+
+        # SQLite's StdDev is a Python callback per row; sums stay in SQL
+        self.assertNotIn('STDDEV', queries[0]['sql'].upper())
+        self.assertAlmostEqual(summary['fields']['mass']['stddev'], 0.0, places=6)
+
+        self.assertEqual(summary['count'], 4)
+        yield_stress = summary['fields']['yield_stress']
+        self.assertEqual((yield_stress['min'], yield_stress['max'], yield_stress['count']), (300.0, 330.0, 4))
+        self.assertAlmostEqual(yield_stress['avg'], 315.0)
+        self.assertAlmostEqual(yield_stress['stddev'], 11.1803398875)
+
+    def test_report_summary_covers_every_page(self):
+        response = self.client.get('/mechanical-inspection/', {'page_size': 2})
+        self.assertEqual(len(response.context['table_data']), 2)
+        self.assertEqual(response.context['summary_data']['yield_stress']['max'], '330.00')
+
+        body = self.client.get('/mechanical-inspection/summary/').json()
+        self.assertEqual(body['count'], 4)
+        self.assertEqual(body['fields']['yield_stress']['min'], 300.0)
+
+
+class LotStatisticsTests(TestCase):
+
+    def setUp(self):
+        self.lot = InspectionReport.objects.create(date=datetime.date(2025, 7, 1), batch_number='LOT-A', section='12mm')
+
+    def stats(self, inspection_report=None):
+        return LotStatistics.objects.get(inspection_report=inspection_report, division_type='Division 25.0kgf')
+
+    def test_inserts_update_statistics_incrementally(self):
+        for stress in (300.0, 320.0, 340.0):
+            make_calculation(self.lot, yield_stress=stress)
+
+        stats = self.stats(self.lot)
+        self.assertEqual(stats.count, 3)
+        self.assertEqual((stats.yield_min, stats.yield_max), (300.0, 340.0))
+        self.assertAlmostEqual(stats.yield_mean, 320.0)
+        self.assertAlmostEqual(stats.yield_stddev, 16.3299316186)
+
+    def test_batch_intake_updates_statistics(self):
+        self.client.post('/advanced_materials_testing/batch/', json.dumps({'records': [make_record()] * 4}),
+                         content_type='application/json')
+        self.assertEqual(self.stats().count, 4)
+
+    def test_deletes_recompute_statistics(self):
+        calcs = [make_calculation(self.lot, yield_stress=stress) for stress in (300.0, 320.0, 340.0)]
+
+        calcs[2].delete()
+        stats = self.stats(self.lot)
+        self.assertEqual((stats.count, stats.yield_max), (2, 320.0))
+
+        StressCalculation.objects.filter(yield_stress=300.0).delete()
+        stats = self.stats(self.lot)
+        self.assertEqual((stats.count, stats.yield_min), (1, 320.0))
+
+        StressCalculation.objects.all().delete()
+        self.assertFalse(LotStatistics.objects.exists())
+
+    def test_deleting_a_report_moves_tests_to_unassigned_lot(self):
+        make_calculation(self.lot, yield_stress=300.0)
+        make_calculation(None, yield_stress=400.0)
+
+        self.lot.delete()
+
+        stats = self.stats()
+        self.assertEqual((stats.count, stats.yield_min, stats.yield_max), (2, 300.0, 400.0))
+
+    def test_endpoint_pages_through_every_lot(self):
+        lots = [self.lot] + [
+            InspectionReport.objects.create(date=datetime.date(2025, 7, 2), batch_number=f'LOT-{i}', section='12mm')
+            for i in range(3)
+        ]
+        for lot in lots + [None]:
+            make_calculation(lot)
+
+        seen, after = [], ''
+        while True:
+            body = self.client.get('/lot-statistics/', {'page_size': 2, 'after': after}).json()
+            self.assertLessEqual(len(body['lots']), 2)
+            seen.extend(row['inspection_report_id'] for row in body['lots'])
+            after = body['next_cursor']
+            if not after:
+                break
+
+        self.assertEqual(seen, [None] + [lot.id for lot in lots])
+        self.assertEqual(self.client.get('/lot-statistics/', {'after': 'garbage'}).status_code, 400)
+
+
+class SqliteTuningTests(TestCase):
+    def test_pragmas_applied_to_connection(self):
+        from django.db import connection
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite only')
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA temp_store')
+            self.assertEqual(cursor.fetchone()[0], 2)  # MEMORY
+
+
+class SqliteWriteTransactionTests(TransactionTestCase):
+    def test_transactions_take_the_write_lock_at_begin(self):
+        from django.db import connection, transaction
+        from django.test.utils import CaptureQueriesContext
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite only')
+        with CaptureQueriesContext(connection) as queries, transaction.atomic():
+            SampleParameters.objects.create(sample_number='S-1', heat_number='H-1', mass=3.95, length=1.0)
+        self.assertEqual(queries.captured_queries[0]['sql'], 'BEGIN IMMEDIATE')
+
+
+class InstrumentationTests(TestCase):
+    def test_traced_request_logs_spans_and_query_count(self):
+        from django.test import override_settings
+
+        with override_settings(INSTRUMENTATION_ENABLED=True, INSTRUMENTATION_SAMPLE_RATE=1.0), \
+                self.assertLogs('excelexport.instrumentation', 'INFO') as logs:
+            response = self.client.post(
+                '/advanced_materials_testing/', json.dumps(make_record()),
+                content_type='application/json', HTTP_HOST='localhost'
+            )
+
+        self.assertEqual(response.status_code, 200)
+        event = logs.records[-1].event
+        self.assertEqual(event['path'], '/advanced_materials_testing/')
+        self.assertEqual(event['status'], 200)
+        self.assertGreater(event['queries'], 0)
+        self.assertEqual(set(event['spans']), {'parse', 'validate', 'calculate', 'persist'})
+
+    def test_disabled_instrumentation_logs_nothing(self):
+        from .instrumentation import span
+
+        with self.assertNoLogs('excelexport.instrumentation'):
+            with span('calculate'):
+                pass
+            self.client.post(
+                '/advanced_materials_testing/', json.dumps(make_record()),
+                content_type='application/json', HTTP_HOST='localhost'
+            )
+
+
+class MetricsTests(TestCase):
+    def scrape(self):
+        response = self.client.get('/metrics', HTTP_HOST='localhost')
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def sample(self, text, line_prefix):
+        for line in text.splitlines():
+            if line.startswith(line_prefix):
+                return float(line.rsplit(' ', 1)[1])
+        return 0.0
+
+    def test_submissions_and_exports_are_counted(self):
+        counter = 'excelexport_stress_calculations_total{division_type="Division 25.0kgf"}'
+        latency = 'excelexport_request_duration_seconds_count{view="advanced_materials_testing"}'
+        export_rows = 'excelexport_export_rows_sum{export="mechanical_inspection_xlsx"}'
+        before = self.scrape()
+
+        self.client.post(
+            '/advanced_materials_testing/', json.dumps(make_record()),
+            content_type='application/json', HTTP_HOST='localhost'
+        )
+        self.client.get('/mechanical-inspection/export/?format=xlsx', HTTP_HOST='localhost')
+
+        after = self.scrape()
+        self.assertIn('# TYPE excelexport_export_duration_seconds histogram', after)
+        self.assertEqual(self.sample(after, counter) - self.sample(before, counter), 1)
+        self.assertEqual(self.sample(after, latency) - self.sample(before, latency), 1)
+        self.assertEqual(self.sample(after, export_rows) - self.sample(before, export_rows), 1)
+
+    def test_worker_files_are_summed(self):
+        import tempfile
+        from django.test import override_settings
+        from . import metrics
+
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            other_worker = {'excelexport_stress_calculations_total': {
+                json.dumps([['division_type', 'Division 10.0kgf']]): 5
+            }}
+            with open(f'{directory}/999999.json', 'w') as f:
+                json.dump(other_worker, f)
+            metrics.inc('excelexport_stress_calculations_total', division_type='Division 10.0kgf')
+
+            total = metrics.collect()['excelexport_stress_calculations_total']
+            own = metrics._values['excelexport_stress_calculations_total']
+            key = json.dumps([['division_type', 'Division 10.0kgf']])
+            self.assertEqual(total[key], own[key] + 5)
+
+    def test_requests_flush_on_an_interval(self):
+        import os
+        import tempfile
+        from unittest import mock
+        from django.test import override_settings
+        from . import metrics
+
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(METRICS_DIR=directory, METRICS_FLUSH_INTERVAL=60):
+            with mock.patch.object(metrics, 'flush', wraps=metrics.flush) as flush:
+                metrics._last_flush = float('-inf')
+                for _ in range(5):
+                    self.client.get('/lot-statistics/', HTTP_HOST='localhost')
+                metrics._last_flush = float('-inf')
+                self.client.get('/lot-statistics/', HTTP_HOST='localhost')
+            self.assertEqual(flush.call_count, 2)
+
+            # A dead worker's file survives a new worker with the same pid
+            with open(os.path.join(directory, f'{os.getpid()}-1.json'), 'w') as f:
+                json.dump({}, f)
+            metrics.inc('excelexport_stress_calculations_total', division_type='Division 10.0kgf')
+            metrics.flush()
+            self.assertEqual(len(os.listdir(directory)), 2)
+
+
+class SeedLabDataTests(TestCase):
+    def test_command_generates_consistent_lots(self):
+        from django.core.management import call_command
+        from .stress_calculator import calculate_stress
+
+        call_command('seed_lab_data', samples=100, countries=10, samples_per_lot=25, seed=7, stdout=io.StringIO())
+
+        self.assertEqual(InspectionReport.objects.count(), 4)
+        self.assertEqual(SampleParameters.objects.count(), 100)
+        self.assertEqual(ScaleLoadMeasurements.objects.count(), 100)
+        self.assertEqual(StressCalculation.objects.count(), 100)
+        self.assertEqual(CountryGDP.objects.count(), 10)
+        self.assertEqual(sum(LotStatistics.objects.values_list('count', flat=True)), 100)
+
+        # Stored stresses agree with the calibration applied to the stored readings
+        calc = StressCalculation.objects.select_related('sample_parameters').order_by('id').first()
+        scale = ScaleLoadMeasurements.objects.order_by('id').first()
+        expected = calculate_stress(
+            mass=calc.sample_parameters.mass,
+            length=calc.sample_parameters.length,
+            utn_scale=int(scale.utn_scale),
+            yield_load_main_scale=scale.yield_load_main_scale,
+            yield_load_counter_part=scale.yield_load_counter_part,
+            tensile_load_main_scale=scale.tensile_load_main_scale,
+            tensile_load_counter_part=scale.tensile_load_counter_part
+        )
+        self.assertAlmostEqual(calc.yield_stress, expected['yield_stress'], places=6)
+        self.assertEqual(calc.division_type, f"Division {scale.utn_scale}kgf")
+        self.assertTrue(400 < calc.yield_stress < 700)
+
+    def test_same_seed_gives_same_data(self):
+        from .seeding import seed_lab_data
+
+        seed_lab_data(20, samples_per_lot=10, seed=3)
+        first = list(StressCalculation.objects.order_by('id').values_list('yield_stress', 'created_at'))
+        StressCalculation.objects.all().delete()
+        seed_lab_data(20, samples_per_lot=10, seed=3)
+        second = list(StressCalculation.objects.order_by('id').values_list('yield_stress', 'created_at'))
+        self.assertEqual([v for v, _ in first], [v for v, _ in second])
+
+
+IMPORT_HEADER = 'Sample Number,Heat Number,Mass,Length,UTN Scale,Yield Load Main Scale,Yield Load Counter Part,Tensile Load Main Scale,Tensile Load Counter Part,Water Pressure In\n'
+
+
+class SeedLabDataCommitTests(TransactionTestCase):
+    def test_seeding_commits_batch_by_batch(self):
+        import sqlite3
+        from django.db import connection
+        from .search import search
+        from .seeding import seed_lab_data
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite only')
+
+        name = str(connection.settings_dict['NAME'])
+        other = sqlite3.connect(name, uri=name.startswith('file:'), timeout=0, isolation_level=None)
+        self.addCleanup(other.close)
+
+        def progress(written):
+            # Another writer gets the lock between batches
+            other.execute('BEGIN IMMEDIATE')
+            other.execute('ROLLBACK')
+
+        seed_lab_data(100, samples_per_lot=10, batch_size=20, progress=progress)
+        self.assertEqual(StressCalculation.objects.count(), 100)
+        self.assertEqual(len(search('LOT-0000001', ['sample'], limit=100)), 10)
+
+
+class TensileImportTests(TestCase):
+    def setUp(self):
+        self.lot = InspectionReport.objects.create(date=datetime.date(2024, 1, 1), batch_number='LOT-1', section='12mm')
+
+    def test_csv_import_stores_linked_rows_and_reports_rejects(self):
+        from .importer import import_records
+
+        content = IMPORT_HEADER + (
+            'S-1,H-1,3.95,1.0,25,12000,40,15000,60,2.5\n'
+            'S-2,H-1,3.95,1.0,30,12000,40,15000,60,\n'
+            '\n'
+            'S-3,H-2,3.90,1.0,50,11000,20,14000,30,\n'
+        )
+        result = import_records(io.BytesIO(content.encode('utf-8-sig')), 'csv', inspection_report=self.lot, chunk_size=2)
+
+        self.assertEqual((result.rows, result.imported, result.rejected), (3, 2, 1))
+        self.assertEqual(result.rejects[0][0], 3)
+        self.assertIn('Invalid UTN scale', result.rejects[0][1])
+        calcs = StressCalculation.objects.filter(inspection_report=self.lot).select_related('sample_parameters')
+        self.assertEqual(sorted(c.sample_parameters.sample_number for c in calcs), ['S-1', 'S-3'])
+        self.assertEqual(ScaleLoadMeasurements.objects.count(), 2)
+        self.assertEqual(WaterSystem.objects.count(), 1)
+        self.assertEqual(LotStatistics.objects.filter(inspection_report=self.lot).count(), 2)
+
+    def test_bad_numeric_cells_are_rejected_without_losing_the_chunk(self):
+        from .importer import import_records
+
+        content = IMPORT_HEADER + (
+            'S-1,H-1,3.95,1.0,25,12000,40,15000,60,\n'
+            'S-2,H-1,nan,1.0,25,12000,40,15000,60,\n'
+            'S-3,H-1,3.95,inf,25,12000,40,15000,60,\n'
+            'S-4,H-1,3.95,1.0,25,12000,40,15000,60,NaN\n'
+            'S-5,H-1,3.95,1.0,25,12000,40,15000,60,\n'
+        )
+        result = import_records(io.BytesIO(content.encode()), 'csv', inspection_report=self.lot)
+
+        self.assertEqual((result.rows, result.imported, result.rejected), (5, 2, 3))
+        self.assertEqual([line for line, _ in result.rejects], [3, 4, 5])
+        self.assertEqual(
+            sorted(StressCalculation.objects.values_list('sample_parameters__sample_number', flat=True)), ['S-1', 'S-5']
+        )
+
+    def test_xlsx_import_and_missing_columns(self):
+        from openpyxl import Workbook
+        from .importer import import_records
+
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(IMPORT_HEADER.strip().split(','))
+        sheet.append(['S-1', 'H-1', 3.95, 1.0, 100, 12000, 40, 15000, 60, None])
+        handle = io.BytesIO()
+        workbook.save(handle)
+        handle.seek(0)
+
+        result = import_records(handle, 'xlsx')
+        self.assertEqual(result.imported, 1)
+        self.assertEqual(StressCalculation.objects.get().division_type, 'Division 100.0kgf')
+
+        with self.assertRaisesMessage(ValueError, 'Missing required columns: mass'):
+            import_records(io.BytesIO(b'length,utn_scale\n1,25\n'), 'csv')
+
+    def test_xlsx_zero_counter_parts_are_imported(self):
+        from openpyxl import Workbook
+        from .importer import import_records
+
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(IMPORT_HEADER.strip().split(','))
+        # Integer cells, as Excel stores whole numbers
+        sheet.append(['S-1', 'H-1', 3.95, 1.0, 25, 12000, 0, 15000, 0, None])
+        sheet.append(['S-2', 'H-1', 3.95, 1.0, 25, 12000, None, 15000, 60, None])
+        handle = io.BytesIO()
+        workbook.save(handle)
+        handle.seek(0)
+
+        result = import_records(handle, 'xlsx', inspection_report=self.lot)
+
+        self.assertEqual((result.imported, result.rejected), (1, 1))
+        self.assertEqual(result.rejects[0][0], 3)
+        self.assertIn('yield_load_counter_part', result.rejects[0][1])
+        self.assertEqual(ScaleLoadMeasurements.objects.get().tensile_load_counter_part, 0)
+
+    def test_admin_action_imports_upload_into_selected_lot(self):
+        from django.contrib.auth.models import User
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+        self.client.login(username='admin', password='secret')
+        upload = SimpleUploadedFile('records.csv', (IMPORT_HEADER + 'S-1,H-1,3.95,1.0,25,12000,40,15000,60,\n').encode())
+
+        response = self.client.post('/admin/excelexport/inspectionreport/', {
+            'action': 'import_tensile_records',
+            '_selected_action': [self.lot.pk],
+            'apply': 'Import',
+            'file': upload,
+        }, HTTP_HOST='localhost', follow=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(StressCalculation.objects.filter(inspection_report=self.lot).count(), 1)
+        self.assertContains(response, '1 of 1 rows imported')
+
+
+class ImportExportResourceTests(TestCase):
+    def setUp(self):
+        self.lot = InspectionReport.objects.create(date=datetime.date(2024, 1, 1), batch_number='LOT-1', section='12mm')
+        for i in range(5):
+            make_calculation(self.lot, yield_stress=500.0 + i)
+
+    def test_stress_calculation_export_is_one_query(self):
+        from .resources import StressCalculationResource
+
+        with self.assertNumQueries(1):
+            dataset = StressCalculationResource().export()
+
+        self.assertEqual(len(dataset), 5)
+        row = dict(zip(dataset.headers, dataset[0]))
+        self.assertEqual(row['inspection_report'], self.lot.pk)
+        self.assertEqual(row['batch_number'], 'LOT-1')
+
+    def test_raw_update_imports_invalidate_reports(self):
+        from django.core.cache import cache
+        from .resources import InspectionReportResource, SampleParametersResource
+
+        def reimport(resource, queryset, **changes):
+            dataset = resource.export(queryset=queryset)
+            dataset.dict = [{**row, **changes} for row in dataset.dict]
+            with self.captureOnCommitCallbacks(execute=True):
+                resource.import_data(dataset, raise_errors=True)
+
+        cache.clear()
+        url = '/mechanical-inspection/?lot=LOT-1'
+        self.client.get(url)
+        samples = SampleParameters.objects.filter(stress_calculations__inspection_report=self.lot)
+        reimport(SampleParametersResource(), samples, heat_number='H-IMPORTED')
+        self.assertContains(self.client.get(url), 'H-IMPORTED')
+        reimport(InspectionReportResource(), InspectionReport.objects.filter(pk=self.lot.pk), section='32mm')
+        self.assertContains(self.client.get(url), '32mm')
+
+    def test_bulk_import_creates_updates_and_keeps_lot_statistics(self):
+        from .resources import StressCalculationResource
+
+        resource = StressCalculationResource()
+        dataset = resource.export()
+        # Update every exported row and append new ones without an id
+        position = dataset.headers.index('yield_stress')
+        rows = []
+        for row in dataset:
+            row = list(row)
+            row[position] = 600.0
+            rows.append(row)
+        for row in list(rows[:3]):
+            new_row = list(row)
+            new_row[dataset.headers.index('id')] = ''
+            new_row[dataset.headers.index('sample_parameters')] = ''
+            rows.append(new_row)
+        # and move the first row to another lot
+        other_lot = InspectionReport.objects.create(date=datetime.date(2024, 1, 2), batch_number='LOT-2', section='12mm')
+        rows[0][dataset.headers.index('inspection_report')] = other_lot.pk
+        dataset.dict = [dict(zip(dataset.headers, row)) for row in rows]
+
+        result = resource.import_data(dataset, raise_errors=True)
+
+        self.assertFalse(result.has_errors())
+        self.assertEqual(StressCalculation.objects.count(), 8)
+        self.assertEqual(set(StressCalculation.objects.values_list('yield_stress', flat=True)), {600.0})
+        stats = LotStatistics.objects.get(inspection_report=self.lot)
+        self.assertEqual((stats.count, stats.yield_min, stats.yield_max), (7, 600.0, 600.0))
+        self.assertEqual(LotStatistics.objects.get(inspection_report=other_lot).count, 1)
+
+
+class AdminChangelistTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        lot = InspectionReport.objects.create(date=datetime.date(2024, 1, 1), batch_number='LOT-1', section='12mm')
+        for _ in range(3):
+            make_calculation(lot)
+
+    def test_estimated_count_only_for_unfiltered_large_tables(self):
+        from unittest import mock
+
+        from . import pagination
+
+        with mock.patch.object(pagination, 'ESTIMATE_THRESHOLD', 2):
+            StressCalculation.objects.filter(pk=StressCalculation.objects.order_by('id').first().pk).delete()
+            # Estimate from the largest id still counts the deleted row
+            self.assertEqual(pagination.EstimatedCountPaginator(StressCalculation.objects.all(), 10).count, 3)
+            filtered = StressCalculation.objects.filter(inspection_report__batch_number='LOT-1')
+            self.assertEqual(pagination.EstimatedCountPaginator(filtered, 10).count, 2)
+        self.assertEqual(pagination.EstimatedCountPaginator(StressCalculation.objects.all(), 10).count, 2)
+
+    def test_changelists_render_without_distinct_scans(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        for url in ('/admin/excelexport/stresscalculation/', '/admin/excelexport/sampleparameters/',
+                    '/admin/excelexport/stresscalculation/?division_type=25&heat_number=H-1',
+                    '/admin/excelexport/stresscalculation/?created_at__year=%d' % datetime.date.today().year):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertEqual(response.context['cl'].result_count, 3, url)
+            self.assertFalse([query for query in queries if 'DISTINCT' in query['sql']], url)
+
+    def test_filter_autocomplete_suggests_matching_values(self):
+        SampleParameters.objects.create(sample_number='S-2', heat_number='K-7', mass=3.95, length=1.0)
+
+        response = self.client.get('/admin/excelexport/sampleparameters/filter-autocomplete/heat_number/?term=H')
+
+        self.assertEqual(response.json(), {'results': ['H-1']})
+        response = self.client.get('/admin/excelexport/sampleparameters/filter-autocomplete/missing/')
+        self.assertEqual(response.status_code, 404)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        CountryGDP.objects.bulk_create([
+            CountryGDP(name=name, code=code, year='2015', value=Decimal('1.00'))
+            for name, code in (('Germany', 'DEU'), ('Oman', 'OMN'), ('Romania', 'ROU'))
+        ])
+        self.sample = SampleParameters.objects.create(sample_number='S-77', heat_number='HT-4411', mass=3.95, length=1.0)
+        InspectionReport.objects.create(date=datetime.date(2024, 1, 1), batch_number='LOT-4411', section='12mm')
+
+    def test_search_ranks_matches_across_kinds(self):
+        response = self.client.get('/search/?q=4411')
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(sorted(result['kind'] for result in data['results']), ['lot', 'sample'])
+        self.assertEqual(self.client.get('/search/?q=man&kind=country').json()['count'], 3)
+
+    def test_index_follows_updates_and_deletes(self):
+        from .search import search
+
+        self.sample.heat_number = 'HT-9000'
+        self.sample.save()
+        CountryGDP.objects.filter(name='Oman').delete()
+
+        self.assertEqual([result['kind'] for result in search('4411')], ['lot'])
+        self.assertEqual([result['id'] for result in search('9000')], [self.sample.pk])
+        self.assertEqual([result['label'] for result in search('MAN')], ['Germany (2015)', 'Romania (2015)'])
+
+    def test_bulk_seeding_indexes_rows_and_restores_triggers(self):
+        from .search import search
+        from .seeding import seed_lab_data
+
+        seed_lab_data(50, countries=4, seed=1)
+        CountryGDP.objects.create(name='Andorra', code='AND', year='2015', value=Decimal('1.00'))
+
+        seeded = CountryGDP.objects.exclude(name__in=['Germany', 'Oman', 'Romania', 'Andorra']).first()
+        self.assertIn(seeded.pk, [result['id'] for result in search(seeded.name, ['country'])])
+        self.assertEqual([result['label'] for result in search('dorr')], ['Andorra (2015)'])
+
+    def test_triggers_exist_after_migrate(self):
+        from django.db import connection
+        from .search import missing_search_triggers
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite only')
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE '%search%'")
+            self.assertEqual(cursor.fetchone()[0], 9)
+        self.assertEqual(missing_search_triggers(), {})
+
+    def test_failed_bulk_load_indexes_its_rows_and_restores_the_triggers(self):
+        from django.db import connection
+        from .search import deferred_search_index, missing_search_triggers, search
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite only')
+
+        with self.assertRaises(RuntimeError), deferred_search_index():
+            CountryGDP.objects.create(name='Andorra', code='AND', year='2015', value=Decimal('1.00'))
+            raise RuntimeError
+
+        self.assertEqual(missing_search_triggers(), {})
+        self.assertEqual([result['label'] for result in search('dorr')], ['Andorra (2015)'])
+
+        # As a killed load leaves it: the next one repairs the index first
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER excelexport_countrygdp_search_insert')
+        CountryGDP.objects.create(name='Bhutan', code='BTN', year='2015', value=Decimal('1.00'))
+        with deferred_search_index():
+            pass
+        self.assertEqual([result['label'] for result in search('hutan')], ['Bhutan (2015)'])
+
+    def test_rebuild_command_restores_missing_triggers(self):
+        from django.core.management import CommandError, call_command
+        from django.db import connection
+        from .search import missing_search_triggers, search
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite only')
+
+        # As a migration remaking the table would leave it
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER excelexport_countrygdp_search_insert')
+        CountryGDP.objects.create(name='Andorra', code='AND', year='2015', value=Decimal('1.00'))
+        self.assertEqual(search('dorr'), [])
+        with self.assertRaises(CommandError):
+            call_command('rebuild_search_index', check=True, stdout=io.StringIO())
+
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self.assertEqual(missing_search_triggers(), {})
+        self.assertEqual([result['label'] for result in search('dorr')], ['Andorra (2015)'])
+
+    def test_queries_run_on_the_querysets_database(self):
+        from unittest import mock
+        from django.db import connections
+        from . import search
+        if connections['default'].vendor != 'sqlite':
+            self.skipTest('SQLite only')
+
+        # Whatever the default connection is, the queryset's own database decides
+        with mock.patch.object(search, 'connection', mock.Mock(vendor='postgresql')):
+            queryset = search.contains(CountryGDP.objects.using('default'), 'name', 'man')
+            self.assertIn('MATCH', str(queryset.query))
+            self.assertEqual(queryset.count(), 3)
+            self.assertEqual([result['kind'] for result in search.search('4411', ['lot'])], ['lot'])
+
+    def test_rejects_short_terms_and_unknown_kinds(self):
+        self.assertEqual(self.client.get('/search/?q=ab').status_code, 400)
+        self.assertEqual(self.client.get('/search/?q=abc&kind=planet').json()['status'], 'error')
+
+    def test_countries_list_filters_through_the_index(self):
+        response = self.client.get('/countries_gdp_list/?name=ROMAN')
+
+        self.assertEqual([country.name for country in response.context['countries_list']], ['Romania'])
+
+
+class ReportCacheTests(TestCase):
+    url = '/mechanical-inspection/'
+
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        self.lot = InspectionReport.objects.create(date=datetime.date(2025, 7, 1), batch_number='LOT-A', section='12mm')
+        self.other_lot = InspectionReport.objects.create(date=datetime.date(2025, 7, 2), batch_number='LOT-B', section='12mm')
+        make_calculation(self.lot, yield_stress=301.0)
+
+    def test_unchanged_report_is_cached_and_revalidates_to_304(self):
+        first = self.client.get(self.url, {'lot': 'LOT-A'})
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first['ETag'])
+        self.assertIn('no-cache', first['Cache-Control'])
+
+        # Only the lot lookup behind the version remains
+        with self.assertNumQueries(1):
+            second = self.client.get(self.url, {'lot': 'LOT-A'})
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+        not_modified = self.client.get(self.url, {'lot': 'LOT-A'}, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        not_modified = self.client.get(self.url, {'lot': 'LOT-A'}, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_writes_invalidate_only_the_reports_they_affect(self):
+        lot_a = self.client.get(self.url, {'lot': 'LOT-A'})
+        everything = self.client.get(self.url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            make_calculation(self.other_lot, yield_stress=455.5)
+
+        self.assertEqual(self.client.get(self.url, {'lot': 'LOT-A'})['ETag'], lot_a['ETag'])
+        refreshed = self.client.get(self.url)
+        self.assertNotEqual(refreshed['ETag'], everything['ETag'])
+        self.assertContains(refreshed, '455.50')
+
+        # Bulk writes send no signals, but go through the LotStatistics upkeep
+        with self.captureOnCommitCallbacks(execute=True):
+            StressCalculation.objects.filter(inspection_report=self.lot).update(yield_stress=512.25)
+        self.assertContains(self.client.get(self.url, {'lot': 'LOT-A'}), '512.25')
+
+    def test_sample_edits_invalidate_reports(self):
+        self.client.get(self.url, {'lot': 'LOT-A'})
+        sample = StressCalculation.objects.get(inspection_report=self.lot).sample_parameters
+        with self.captureOnCommitCallbacks(execute=True):
+            sample.heat_number = 'H-EDITED'
+            sample.save()
+        self.assertContains(self.client.get(self.url, {'lot': 'LOT-A'}), 'H-EDITED')
+
+        # Bulk updates of columns LotStatistics ignores
+        with self.captureOnCommitCallbacks(execute=True):
+            StressCalculation.objects.filter(inspection_report=self.lot).update(cross_section_area=777.77)
+        self.assertContains(self.client.get(self.url, {'lot': 'LOT-A'}), '777.77')
+
+    def test_invalid_filters_are_not_cached(self):
+        response = self.client.get(self.url, {'date_from': 'yesterday'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.has_header('ETag'))
+
+
+class AsyncIntakeTests(TransactionTestCase):
+    def async_request(self, path, body):
+        from django.contrib.sessions.backends.db import SessionStore
+        from django.test import AsyncRequestFactory
+
+        request = AsyncRequestFactory().post(path, json.dumps(body), content_type='application/json')
+        request.session = SessionStore()
+        return request
+
+    async def test_async_intake_stores_submission(self):
+        from . import views_async
+
+        request = self.async_request('/advanced_materials_testing/', make_record())
+        response = await views_async.advanced_materials_testing(request)
+
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)['data']
+        self.assertTrue(await StressCalculation.objects.filter(
+            pk=data['stress_calculation_id'], sample_parameters_id=data['sample_id']
+        ).aexists())
+        self.assertIn('?results=', json.loads(response.content)['redirect_url'])
+        self.assertFalse(request.session.modified)
+
+        invalid = self.async_request('/advanced_materials_testing/', make_record(scale_load_measurements={'utn_scale': 30}))
+        response = await views_async.advanced_materials_testing(invalid)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(await StressCalculation.objects.acount(), 1)
+
+    async def test_async_retry_is_answered_before_parsing(self):
+        from . import views_async
+
+        first = self.async_request('/advanced_materials_testing/', make_record())
+        first.META['HTTP_IDEMPOTENCY_KEY'] = 'async-retry-1'
+        stored = await views_async.advanced_materials_testing(first)
+
+        # Even a retry whose body no longer validates gets the stored response
+        retry = self.async_request('/advanced_materials_testing/', make_record(scale_load_measurements={'utn_scale': 30}))
+        retry.META['HTTP_IDEMPOTENCY_KEY'] = 'async-retry-1'
+        response = await views_async.advanced_materials_testing(retry)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Idempotent-Replayed'], 'true')
+        self.assertEqual(json.loads(response.content), json.loads(stored.content))
+        self.assertEqual(await StressCalculation.objects.acount(), 1)
+
+    async def test_async_login(self):
+        from asgiref.sync import sync_to_async
+        from django.contrib.auth.models import User
+        from . import views_async
+
+        await sync_to_async(User.objects.create_user)('inspector', password='secret')
+
+        response = await views_async.user_login(self.async_request('/user-login/', {'username': 'inspector', 'password': 'wrong'}))
+        self.assertEqual(response.status_code, 401)
+
+        request = self.async_request('/user-login/', {'username': 'inspector', 'password': 'secret'})
+        with self.assertLogs('excelexport.views_async', 'INFO') as logs:
+            response = await views_async.user_login(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(logs.records[0].event, {'user': 'inspector'})
+        self.assertEqual(json.loads(response.content)['username'], 'inspector')
+        self.assertIn('_auth_user_id', request.session)
+
+    async def test_custom_middleware_runs_async(self):
+        from asgiref.sync import iscoroutinefunction
+        from .metrics import MetricsMiddleware
+
+        async def get_response(request):
+            pass
+
+        # Sync-only middleware would push every ASGI request through a thread
+        self.assertTrue(iscoroutinefunction(MetricsMiddleware(get_response)))
+        response = await self.async_client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+
+
+class IntakeWriteBehindTests(TestCase):
+    def setUp(self):
+        import tempfile
+        from django.test import override_settings
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(
+            INTAKE_WRITE_BEHIND=True, INTAKE_QUEUE_PATH=f'{directory.name}/intake_queue.sqlite3'
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def submit(self, key):
+        return self.client.post(
+            '/advanced_materials_testing/', json.dumps(make_record()),
+            content_type='application/json', HTTP_HOST='localhost', HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def test_submission_is_queued_then_stored_exactly_once(self):
+        from django.core.management import call_command
+        from . import intake_queue
+        from .models import IdempotencyKey
+
+        response = self.submit('station-1-0001')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['data'], {'idempotency_key': 'station-1-0001'})
+        page = self.client.get(response.json()['redirect_url'], HTTP_HOST='localhost')
+        self.assertEqual(page.context['results']['division_type'], 'Division 25.0kgf')
+        self.assertFalse(StressCalculation.objects.exists())
+
+        # A retry while queued is not queued again
+        self.assertEqual(self.submit('station-1-0001').status_code, 202)
+        self.assertEqual(intake_queue.pending(), 1)
+
+        call_command('drain_intake_queue', once=True, verbosity=0)
+        self.assertEqual(intake_queue.pending(), 0)
+        calculation = StressCalculation.objects.get()
+        self.assertEqual(LotStatistics.objects.get().count, 1)
+
+        # A retry once stored is answered with the stored ids
+        response = self.submit('station-1-0001')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['stress_calculation_id'], calculation.id)
+        self.assertEqual(IdempotencyKey.objects.get().key, 'station-1-0001')
+
+    def test_redelivered_entry_is_skipped(self):
+        from . import intake_queue
+        from .stress_calculator import calculate_stress, parse_submission
+
+        cleaned = parse_submission(make_record())
+        calculated = calculate_stress(mass=3.95, length=1.0, **cleaned['scale'])
+        self.assertTrue(intake_queue.enqueue('key-1', cleaned, calculated))
+        self.assertEqual(intake_queue.drain(), 1)
+
+        # As if the drainer died after committing but before clearing the journal
+        intake_queue.enqueue('key-1', cleaned, calculated)
+        self.assertEqual(intake_queue.drain(), 1)
+        self.assertEqual(StressCalculation.objects.count(), 1)
+
+
+    def test_failing_entry_is_dead_lettered_without_blocking_the_rest(self):
+        from . import intake_queue
+        from .stress_calculator import calculate_stress, parse_submission
+
+        cleaned = parse_submission(make_record())
+        calculated = calculate_stress(mass=3.95, length=1.0, **cleaned['scale'])
+        intake_queue.enqueue('good-1', cleaned, calculated)
+        intake_queue.enqueue('bad-1', {**cleaned, 'sample': {**cleaned['sample'], 'colour': 'red'}}, calculated)
+        intake_queue.enqueue('good-2', cleaned, calculated)
+
+        with self.assertLogs('excelexport.intake_queue', 'ERROR') as logs:
+            self.assertEqual(intake_queue.drain(), 3)
+
+        self.assertEqual(logs.records[0].event['idempotency_key'], 'bad-1')
+        self.assertEqual(StressCalculation.objects.count(), 2)
+        self.assertEqual((intake_queue.pending(), intake_queue.failed()), (0, 1))
+
+        self.assertEqual(intake_queue.requeue_failed(), 1)
+        self.assertEqual((intake_queue.pending(), intake_queue.failed()), (1, 0))
+
+
+class WriteBehindLockTests(TransactionTestCase):
+    def setUp(self):
+        import sqlite3
+        import tempfile
+        from django.db import connection
+        from django.test import override_settings
+
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite only')
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(
+            INTAKE_WRITE_BEHIND=True, INTAKE_QUEUE_PATH=f'{directory.name}/intake_queue.sqlite3'
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        # Another writer holds the database write lock throughout
+        name = connection.settings_dict['NAME']
+        self.writer = sqlite3.connect(str(name), uri=str(name).startswith('file:'), timeout=0, isolation_level=None)
+        self.writer.execute('BEGIN IMMEDIATE')
+        self.addCleanup(self.writer.close)
+        self.addCleanup(self.writer.execute, 'ROLLBACK')
+
+    def test_submissions_are_queued_while_the_database_is_locked(self):
+        from . import intake_queue
+
+        for headers in ({}, {'HTTP_IDEMPOTENCY_KEY': 'locked-1'}):
+            with self.subTest(headers=headers):
+                response = self.client.post(
+                    '/advanced_materials_testing/', json.dumps(make_record()),
+                    content_type='application/json', HTTP_HOST='localhost', **headers
+                )
+                self.assertEqual(response.status_code, 202)
+                self.assertTrue(response.json()['queued'])
+        self.assertEqual(intake_queue.pending(), 2)
+
+
+class IdempotencyTests(TestCase):
+    def post(self, path, body, key):
+        return self.client.post(
+            path, json.dumps(body), content_type='application/json', HTTP_HOST='localhost', HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def test_intake_retry_returns_stored_result(self):
+        first = self.post('/advanced_materials_testing/', make_record(), 'retry-1')
+        retry = self.post('/advanced_materials_testing/', make_record(), 'retry-1')
+
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(StressCalculation.objects.count(), 1)
+        self.assertEqual(SampleParameters.objects.count(), 1)
+        self.assertEqual(LotStatistics.objects.get().count, 1)
+
+        self.post('/advanced_materials_testing/', make_record(), 'retry-2')
+        self.assertEqual(StressCalculation.objects.count(), 2)
+
+    def test_expired_key_is_not_replayed(self):
+        from .models import IdempotencyKey
+
+        first = self.post('/advanced_materials_testing/', make_record(), 'expired-1')
+        # Past IDEMPOTENCY_KEY_TTL, but not purged yet
+        IdempotencyKey.objects.update(created_at=datetime.datetime(2020, 1, 1))
+        second = self.post('/advanced_materials_testing/', make_record(), 'expired-1')
+
+        self.assertEqual(second.status_code, 200)
+        self.assertFalse(second.has_header('Idempotent-Replayed'))
+        self.assertNotEqual(second.json()['data'], first.json()['data'])
+        self.assertEqual(StressCalculation.objects.count(), 2)
+        retry = self.post('/advanced_materials_testing/', make_record(), 'expired-1')
+        self.assertEqual(retry.json(), second.json())
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+
+    def test_inspection_report_failures_are_not_stored(self):
+        report = {'date': '2024-03-01', 'batchNumber': 'B-77', 'section': 'T16'}
+
+        self.assertEqual(self.post('/', {**report, 'date': 'yesterday'}, 'report-1').status_code, 400)
+        created = self.post('/', report, 'report-1')
+        retry = self.post('/', report, 'report-1')
+
+        self.assertEqual(created.status_code, 200)
+        self.assertEqual(retry.json()['data']['id'], created.json()['data']['id'])
+        self.assertEqual(InspectionReport.objects.count(), 1)
+
+    def test_purge_deletes_expired_keys(self):
+        from django.core.management import call_command
+        from .models import IdempotencyKey
+
+        IdempotencyKey.objects.create(scope='intake', key='old', response={})
+        IdempotencyKey.objects.create(scope='intake', key='new', response={})
+        IdempotencyKey.objects.filter(key='old').update(created_at=datetime.datetime(2020, 1, 1))
+
+        call_command('purge_idempotency_keys', stdout=io.StringIO())
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['new'])
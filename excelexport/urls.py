@@ -1,13 +1,27 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, views_csv
+
+if settings.ASYNC_VIEWS:
+    from . import views_async as intake_views
+else:
+    intake_views = views
 
 urlpatterns = [
     path('', views.home, name='home'),
     path('countries_gdp_list/', views.countries_gdp_list, name='countries_gdp_list'),
     path('countries_gdp_excel/', views.countries_gdp_excel, name='countries_gdp_excel'),
-    path('advanced_materials_testing/', views.advanced_materials_testing, name='advanced_materials_testing'),
+    path('advanced_materials_testing/', intake_views.advanced_materials_testing, name='advanced_materials_testing'),
+    path('advanced_materials_testing/batch/', views.advanced_materials_testing_batch, name='advanced_materials_testing_batch'),
     path('analysis_results/', views.analysis_results, name='analysis_results'),
     path('mechanical-inspection/', views.mechanical_inspection_report, name='mechanical_inspection_report'),
+    path('mechanical-inspection/summary/', views.mechanical_inspection_summary, name='mechanical_inspection_summary'),
+    path('mechanical-inspection/export/', views_csv.mechanical_inspection_export, name='mechanical_inspection_export'),
+    path('mechanical-inspection/csv/', views_csv.mechanical_inspection_csv_export, name='mechanical_inspection_csv_export'),
+    path('exports/<slug:name>.csv', views_csv.table_csv_export, name='table_csv_export'),
+    path('lot-statistics/', views.lot_statistics, name='lot_statistics'),
     path('reset-database/', views.reset_database, name='reset_database'),
-    path('user-login/', views.user_login, name='user_login'),
+    path('user-login/', intake_views.user_login, name='user_login'),
+    path('search/', views.search_records, name='search_records'),
+    path('metrics', views.metrics_endpoint, name='metrics'),
 ]
\ No newline at end of file
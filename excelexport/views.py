@@ -1,24 +1,76 @@
 from django.shortcuts import render, redirect
 from django.http.response import HttpResponse, JsonResponse
 from .models import *
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from openpyxl import Workbook
-from openpyxl.styles import *
-import decimal
 from django.views.decorators.csrf import csrf_exempt
 from django.core.exceptions import ValidationError
 import json
+import logging
+import time
 from datetime import datetime
+from urllib.parse import urlencode
 from django.contrib.auth import authenticate, login
 from django.db import transaction
+from django.conf import settings
+from . import intake_queue, metrics
+from .idempotency import idempotent, persist_request
+from .instrumentation import span
+from .lot_statistics import LOT_STATISTICS_ORDERING, lot_statistics_for
+from . import search
+from .pagination import estimated_count, keyset_page
+from .report_cache import cached_report
+from .result_handles import calculation_results, intake_result, load_results, results_url
+from .reports import (
+    MAX_REPORT_PAGE_SIZE,
+    REPORT_ORDERING,
+    REPORT_PAGE_SIZE,
+    filter_query_string,
+    filter_stress_calculations,
+    format_report_row,
+    format_summary,
+    parse_report_filters,
+    report_header,
+    summarize_stress_calculations
+)
+from .xlsx_writer import EXPORT_CHUNK_SIZE, StreamingWorkbook
+
+logger = logging.getLogger(__name__)
+
+
+def queue_submission(request, cleaned, calculated_values):
+    """
+    Write-behind intake: queue the submission and answer with its results
+    before it reaches the database (see intake_queue)
+    """
+    try:
+        key = intake_queue.idempotency_key(request)
+    except ValueError as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': str(e)
+        }, status=400)
+
+    with span('persist'):
+        intake_queue.enqueue(key, cleaned, calculated_values)
+
+    results = calculation_results(calculated_values, cleaned['scale']['utn_scale'], {'idempotency_key': key})
+    return JsonResponse({
+        'status': 'success',
+        'message': 'Calculations completed; data queued for saving',
+        'redirect_url': results_url(results),
+        'queued': True,
+        'data': {'idempotency_key': key}
+    }, status=202)
+
 
 @csrf_exempt
+@idempotent(intake_queue.SCOPE)
 def advanced_materials_testing(request):
     if request.method == 'POST':
         try:
             # Parse request body
             try:
-                data = json.loads(request.body) if request.body else request.POST
+                with span('parse'):
+                    data = json.loads(request.body) if request.body else request.POST
             except json.JSONDecodeError:
                 return JsonResponse({
                     'status': 'error',
@@ -32,180 +84,49 @@ def advanced_materials_testing(request):
                     'message': 'Request data must be a JSON object'
                 }, status=400)
             
-            # Get structured data from the form
-            sample_data = data.get('sample_parameters', {})
-            water_data = data.get('water_system', {})
-            scale_data = data.get('scale_load_measurements', {})
-            
-            # Extract required values for calculations
-            mass = sample_data.get('mass')
-            length = sample_data.get('length')
-            utn_scale = scale_data.get('utn_scale')
-            yield_load_main_scale = scale_data.get('yield_load_main_scale')
-            yield_load_counter_part = scale_data.get('yield_load_counter_part')
-            tensile_load_main_scale = scale_data.get('tensile_load_main_scale')
-            tensile_load_counter_part = scale_data.get('tensile_load_counter_part')
-            
-            # Validate required fields for calculations
-            required_fields = {
-                'mass': mass,
-                'length': length,
-                'utn_scale': utn_scale,
-                'yield_load_main_scale': yield_load_main_scale,
-                'yield_load_counter_part': yield_load_counter_part,
-                'tensile_load_main_scale': tensile_load_main_scale,
-                'tensile_load_counter_part': tensile_load_counter_part
-            }
-            
-            missing_fields = [field for field, value in required_fields.items() if not value]
-            if missing_fields:
-                return JsonResponse({
-                    'status': 'error',
-                    'message': f'Missing required fields for calculations: {", ".join(missing_fields)}'
-                }, status=400)
-            
-            # Convert to float
+            from .stress_calculator import calculate_stress, parse_submission, store_submission, submission_ids
+
+            # Validate and convert the structured form data
             try:
-                mass = float(mass)
-                length = float(length)
-                utn_scale = float(utn_scale)
-                yield_load_main_scale = float(yield_load_main_scale)
-                yield_load_counter_part = float(yield_load_counter_part)
-                tensile_load_main_scale = float(tensile_load_main_scale)
-                tensile_load_counter_part = float(tensile_load_counter_part)
-            except (ValueError, TypeError) as e:
+                with span('validate'):
+                    cleaned = parse_submission(data)
+            except ValueError as e:
                 return JsonResponse({
                     'status': 'error',
-                    'message': f'Invalid numeric values: {str(e)}'
+                    'message': str(e)
                 }, status=400)
-            
-            # Create a new SampleParameters instance if provided
-            sample_parameters = None
-            if all(sample_data.get(field) for field in ['sample_number', 'heat_number']):
-                sample_parameters = SampleParameters.objects.create(
-                    sample_number=sample_data['sample_number'],
-                    heat_number=sample_data['heat_number'],
-                    mass=mass,
-                    length=length
-                )
 
-            # Calculate and store stress results
-            from .stress_calculator import calculate_and_store_stress
-            
-            result = calculate_and_store_stress(
-                mass=mass,
-                length=length,
-                utn_scale=utn_scale,
-                yield_load_main_scale=yield_load_main_scale,
-                yield_load_counter_part=yield_load_counter_part,
-                tensile_load_main_scale=tensile_load_main_scale,
-                tensile_load_counter_part=tensile_load_counter_part,
-                sample_parameters=sample_parameters
-            )
-            
-            if not result['success']:
-                return JsonResponse({
-                    'status': 'error',
-                    'message': result['error']
-                }, status=400)
-            
-            # Extract calculated values
-            calculated_values = result['calculated_values']
-            yield_stress = calculated_values['yield_stress']
-            tensile_stress = calculated_values['tensile_stress']
-            division_type = calculated_values['division_type']
-            
-            # Store related data if provided
-            if water_data:
-                WaterSystem.objects.create(
-                    water_pressure_in=float(water_data.get('water_pressure_in', 0)),
-                    water_pressure_out=float(water_data.get('water_pressure_out', 0)),
-                    water_in_temperature=float(water_data.get('water_in_temperature', 0)),
-                    water_out_temperature=float(water_data.get('water_out_temperature', 0))
-                )
-                
-            if scale_data:
-                ScaleLoadMeasurements.objects.create(
-                    utn_scale=utn_scale,
-                    yield_load_main_scale=yield_load_main_scale,
-                    yield_load_counter_part=yield_load_counter_part,
-                    tensile_load_main_scale=tensile_load_main_scale,
-                    tensile_load_counter_part=tensile_load_counter_part
-                )
-            else:
+            sample_data = cleaned['sample']
+            utn_scale = cleaned['scale']['utn_scale']
+
+            # Calculate stress results before touching the database
+            try:
+                with span('calculate'):
+                    calculated_values = calculate_stress(
+                        mass=sample_data['mass'],
+                        length=sample_data['length'],
+                        **cleaned['scale']
+                    )
+            except (ValueError, ZeroDivisionError) as e:
                 return JsonResponse({
                     'status': 'error',
-                    'message': f'Invalid UTN scale value: {utn_scale}. Must be 10, 25, 50, or 100.'
+                    'message': f'Invalid input - {str(e)}'
                 }, status=400)
-            
-            # Save data to database
-            sample = None
-            water_system = None
-            scale_load = None
-            
-            # Create SampleParameters record
-            if sample_data.get('mass') and sample_data.get('length'):
-                sample_kwargs = {
-                    'mass': mass,
-                    'length': length
-                }
-                if sample_data.get('sample_number'):
-                    sample_kwargs['sample_number'] = sample_data.get('sample_number')
-                if sample_data.get('heat_number'):
-                    sample_kwargs['heat_number'] = sample_data.get('heat_number')
-                
-                sample = SampleParameters.objects.create(**sample_kwargs)
-            
-            # Create WaterSystem record if water data exists
-            if any(water_data.values()):
-                water_kwargs = {}
-                for field_name, field_value in water_data.items():
-                    if field_value:
-                        water_kwargs[field_name] = float(field_value)
-                
-                if water_kwargs:
-                    water_system = WaterSystem.objects.create(**water_kwargs)
-            
-            # Create ScaleLoadMeasurements record
-            scale_kwargs = {
-                'utn_scale': utn_scale,
-                'yield_load_main_scale': yield_load_main_scale,
-                'yield_load_counter_part': yield_load_counter_part,
-                'tensile_load_main_scale': tensile_load_main_scale,
-                'tensile_load_counter_part': tensile_load_counter_part
-            }
-            scale_load = ScaleLoadMeasurements.objects.create(**scale_kwargs)
-            
-            # Store calculation results in session for analysis_results view
-            request.session['calculation_results'] = {
-                'mass_per_meter': round(calculated_values['mass_per_meter'], 4),
-                'cross_section_area': round(calculated_values['cross_section_area'], 2),
-                'yield_machine_reading': round(calculated_values['yield_machine_reading'], 1),
-                'tensile_machine_reading': round(calculated_values['tensile_machine_reading'], 1),
-                'yield_stress': round(yield_stress, 2),
-                'tensile_stress': round(tensile_stress, 2),
-                'division_type': division_type,
-                'utn_scale': utn_scale,
-                'sample_id': sample.id if sample else None,
-                'water_system_id': water_system.id if water_system else None,
-                'scale_load_id': scale_load.id if scale_load else None
-            }
-            
-            return JsonResponse({
-                'status': 'success',
-                'message': 'Data saved and calculations completed successfully',
-                'redirect_url': '/analysis_results/',
-                'data': {
-                    'sample_id': sample.id if sample else None,
-                    'water_system_id': water_system.id if water_system else None,
-                    'scale_load_id': scale_load.id if scale_load else None
-                }
-            })
+
+            if settings.INTAKE_WRITE_BEHIND:
+                return queue_submission(request, cleaned, calculated_values)
+
+            def persist():
+                # Save every entity once, in a single transaction
+                ids = submission_ids(store_submission(cleaned, calculated_values))
+                # The results travel in the redirect URL (see result_handles), not the session
+                return JsonResponse(intake_result(ids, calculation_results(calculated_values, utn_scale, ids)))
+
+            with span('persist'):
+                return persist_request(request, persist)
             
         except Exception as e:
-            import traceback
-            print(f"Error in advanced_materials_testing view: {str(e)}")
-            print(traceback.format_exc())
+            logger.exception('Error in advanced_materials_testing view')
             return JsonResponse({
                 'status': 'error',
                 'message': f'Server error: {str(e)}'
@@ -215,12 +136,68 @@ def advanced_materials_testing(request):
     return render(request, 'advanced_materials_testing/advanced_materials_testing.html')
 
 
+MAX_BATCH_RECORDS = 1000
+
+
+@csrf_exempt
+def advanced_materials_testing_batch(request):
+    """
+    Accept many intake records in one POST and store them in one transaction
+    """
+    if request.method != 'POST':
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Only POST method allowed'
+        }, status=405)
+
+    try:
+        data = json.loads(request.body) if request.body else {}
+    except json.JSONDecodeError:
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Invalid JSON data format'
+        }, status=400)
+
+    records = data.get('records') if isinstance(data, dict) else data
+    if not isinstance(records, list) or not records:
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Request data must contain a non-empty "records" array'
+        }, status=400)
+
+    if len(records) > MAX_BATCH_RECORDS:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'A batch may contain at most {MAX_BATCH_RECORDS} records'
+        }, status=400)
+
+    from .stress_calculator import calculate_and_store_stress_batch
+
+    try:
+        results = calculate_and_store_stress_batch(records)
+    except Exception as e:
+        logger.exception('Error in advanced_materials_testing_batch view')
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Server error: {str(e)}'
+        }, status=500)
+
+    saved = sum(1 for result in results if result['status'] == 'success')
+    return JsonResponse({
+        'status': 'success' if saved == len(results) else 'partial' if saved else 'error',
+        'message': f'{saved} of {len(results)} records saved',
+        'saved': saved,
+        'failed': len(results) - saved,
+        'results': results
+    }, status=200 if saved else 400)
+
+
 def analysis_results(request):
     """Display calculation results"""
-    calculation_results = request.session.get('calculation_results')
+    calculation_results = load_results(request.GET.get('results'))
     
     if not calculation_results:
-        # If no calculation results in session, redirect back to form
+        # If no (valid) results handle, redirect back to form
         return redirect('advanced_materials_testing')
     
     context = {
@@ -241,27 +218,26 @@ def countries_gdp_list(request):
     name = request.GET.get('name')
     year = request.GET.get('year')
 
-    request.session['name'] = name
-    request.session['year'] = year
-
     if is_valid_queryparam(name):
-        qs = qs.filter(name__icontains=name)
+        qs = search.contains(qs, 'name', name)
 
     if is_valid_queryparam(year):
         qs = qs.filter(year=year)
 
-    page = request.GET.get('page', 1)
-    paginator = Paginator(qs, 30)
-
+    # Keyset pages on (name, id): any page costs one index seek
     try:
-        qs = paginator.page(page)
-    except PageNotAnInteger:
-        qs = paginator.page(1)
-    except EmptyPage:
-        qs = paginator.page(paginator.num_pages)
+        page = keyset_page(qs, ('name', 'id'), 30,
+                           after=request.GET.get('after'), before=request.GET.get('before'))
+    except ValueError:
+        page = keyset_page(qs, ('name', 'id'), 30)
 
     context = {
-        'countries_list': qs,
+        'countries_list': page,
+        'page': page,
+        'total_estimate': estimated_count(qs),
+        'filter_query': urlencode({
+            key: value for key, value in (('name', name), ('year', year)) if is_valid_queryparam(value)
+        }),
         'name': name,
         'year':year,
     }
@@ -269,6 +245,7 @@ def countries_gdp_list(request):
 
 
 @csrf_exempt
+@idempotent('inspection_report')
 def home(request):
     if request.method == 'POST':
         try:
@@ -295,24 +272,27 @@ def home(request):
                     'message': 'Invalid date format'
                 }, status=400)
 
-            # Create new inspection report
-            inspection = InspectionReport.objects.create(
-                date=inspection_date,
-                batch_number=batch_number,
-                section=section
-            )
+            def persist():
+                # Create new inspection report
+                inspection = InspectionReport.objects.create(
+                    date=inspection_date,
+                    batch_number=batch_number,
+                    section=section
+                )
 
-            return JsonResponse({
-                'status': 'success',
-                'message': 'Inspection report created successfully',
-                'data': {
-                    'id': inspection.id,
-                    'date': inspection.date.isoformat(),
-                    'batch_number': inspection.batch_number,
-                    'section': inspection.section,
-                    'created_at': inspection.created_at.isoformat()
-                }
-            })
+                return JsonResponse({
+                    'status': 'success',
+                    'message': 'Inspection report created successfully',
+                    'data': {
+                        'id': inspection.id,
+                        'date': inspection.date.isoformat(),
+                        'batch_number': inspection.batch_number,
+                        'section': inspection.section,
+                        'created_at': inspection.created_at.isoformat()
+                    }
+                })
+
+            return persist_request(request, persist)
 
         except json.JSONDecodeError:
             return JsonResponse({
@@ -331,20 +311,15 @@ def home(request):
 
 
 def countries_gdp_excel(request):
+    started = time.perf_counter()
     qs = CountryGDP.objects.order_by('name')
 
-    if 'name' in request.session:
-        name = request.session['name']
-    else:
-        name = None
-
-    if 'year' in request.session:
-        year = request.session['year']
-    else:
-        year = None
+    # The list page passes its filters on in the link (filter_query)
+    name = request.GET.get('name')
+    year = request.GET.get('year')
 
     if is_valid_queryparam(name):
-        qs = qs.filter(name__icontains=name)
+        qs = search.contains(qs, 'name', name)
 
     if is_valid_queryparam(year):
         qs = qs.filter(year=year)
@@ -359,136 +334,190 @@ def countries_gdp_excel(request):
     else:
         name = name
 
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',)
-    response['Content-Disposition'] = 'attachment; filename="' + 'Countries GDP List' +'.xlsx"'
-    workbook = Workbook()
-
-    worksheet = workbook.active
-
-    worksheet.merge_cells('A1:D1')
-    worksheet.merge_cells('A2:D2')
-    first_cell = worksheet['A1']
-    first_cell.value = "Countries GDP List" + " " + year
-    first_cell.fill = PatternFill("solid", fgColor="246ba1")
-    first_cell.font  = Font(bold=True, color="F7F6FA")
-    first_cell.alignment = Alignment(horizontal="center", vertical="center")
-
-    second_cell = worksheet['A2']
-    second_cell.value = name
-    second_cell.font  = Font(bold=True, color="246ba1")
-    second_cell.alignment = Alignment(horizontal="center", vertical="center")
+    title = "Countries GDP List" + " " + year
+    export = StreamingWorkbook(title)
 
-    worksheet.title = 'Countries GDP List' + " " + year
+    export.merge('A1:D1')
+    export.merge('A2:D2')
+    export.append([title], styles=['export_title'])
+    export.append([name], styles=['export_subtitle'])
 
     # Define the titles for columns
     columns = ['Country Name','Country Code','Year', 'Value in USD']
-    row_num = 3
-
-    # Assign the titles for each cell of the header
-    for col_num, column_title in enumerate(columns, 1):
-        cell = worksheet.cell(row=row_num, column=col_num)
-        cell.value = column_title
-        cell.fill = PatternFill("solid", fgColor="50C878")
-        cell.font  = Font(bold=True, color="F7F6FA")
-        third_cell = worksheet['D3']
-        third_cell.alignment = Alignment(horizontal="right")
-
-    for countries in qs:
-        row_num += 1
-
-        # Define the data for each cell in the row
-        row = [countries.name,countries.code,countries.year,countries.value]
-
-        # Assign the data for each cell of the row
-        for col_num, cell_value in enumerate(row, 1):
-            cell = worksheet.cell(row=row_num, column=col_num)
-            cell.value = cell_value
-            if isinstance(cell_value, decimal.Decimal):
-                cell.number_format = numbers.FORMAT_NUMBER_COMMA_SEPARATED1
-
-    workbook.save(response)
+    export.append(columns, styles=['export_header'] * 3 + ['export_header_right'])
+
+    # Stream the rows straight from the cursor in chunks
+    rows = qs.values_list('name', 'code', 'year', 'value').iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    value_styles = [None, None, None, 'export_number']
+    for row in rows:
+        export.append(row, styles=value_styles)
+
+    response = export.response('Countries GDP List' + '.xlsx')
+    metrics.record_export('countries_gdp_xlsx', export.rows_written - 3, started)
     return response
 
+
+def search_records(request):
+    """
+    Ranked substring search over countries, samples and lots as JSON
+    """
+    started = time.perf_counter()
+    try:
+        limit = min(int(request.GET.get('limit') or search.DEFAULT_LIMIT), search.MAX_LIMIT)
+        if limit < 1:
+            raise ValueError('limit must be positive')
+        kinds = [kind for kind in request.GET.get('kind', '').split(',') if kind]
+        results = search.search(request.GET.get('q', ''), kinds, limit)
+    except ValueError as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': str(e)
+        }, status=400)
+
+    return JsonResponse({
+        'status': 'success',
+        'query': request.GET.get('q', '').strip(),
+        'count': len(results),
+        'took_ms': round((time.perf_counter() - started) * 1000, 2),
+        'results': results
+    })
+
+
+def metrics_endpoint(request):
+    """Prometheus scrape target"""
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@cached_report
 def mechanical_inspection_report(request):
     """
     View function for the mechanical inspection report page.
     """
-    # Fetch all stress calculations with related data
-    stress_calculations = StressCalculation.objects.select_related(
-        'sample_parameters', 'inspection_report'
-    ).order_by('created_at')[:15]  # Get oldest 15 records in ascending time order
-    
-    # Get header data from the latest inspection report
-    header_data = {
-        'section': '',
-        'lot_no': '',
-        'date_of_rolling': ''
-    }
+    try:
+        filters = parse_report_filters(request.GET)
+        per_page = min(int(request.GET.get('page_size') or REPORT_PAGE_SIZE), MAX_REPORT_PAGE_SIZE)
+        if per_page < 1:
+            raise ValueError('page_size must be positive')
+        # Fetch one keyset page of stress calculations with related data
+        page = keyset_page(
+            filter_stress_calculations(filters),
+            REPORT_ORDERING,
+            per_page,
+            after=request.GET.get('after'),
+            before=request.GET.get('before')
+        )
+    except ValueError as e:
+        return HttpResponse(str(e), status=400)
     
-    latest_inspection = InspectionReport.objects.order_by('-created_at').first()
-    if latest_inspection:
-        header_data['section'] = latest_inspection.section
-        header_data['lot_no'] = latest_inspection.batch_number
-        header_data['date_of_rolling'] = latest_inspection.date.strftime('%Y-%m-%d')
+    # Get header data for the selected lot, or the latest inspection report
+    header_data = report_header(filters)
     
     # Prepare data for the template
-    table_data = []
-    for i, calc in enumerate(stress_calculations, 1):
-        # Get sample parameters if available
-        sample = calc.sample_parameters
-        
-        row_data = {
-            'serial_no': i,
-            'heat_number': sample.heat_number if sample else '',
-            'time': calc.created_at.strftime('%H:%M:%S') if calc.created_at else '',
-            'mass': f"{sample.mass:.2f}" if sample and sample.mass else '',
-            'length': f"{sample.length:.3f}" if sample and sample.length else '',
-            'mass_per_meter': f"{calc.mass_per_meter:.4f}" if calc.mass_per_meter else '',
-            'cross_section_area': f"{calc.cross_section_area:.2f}" if calc.cross_section_area else '',
-            'calibrated_yield_load': f"{calc.yield_machine_reading:.1f}" if calc.yield_machine_reading else '',
-            'yield_stress': f"{calc.yield_stress:.2f}" if calc.yield_stress else '',
-            'calibrated_tensile_load': f"{calc.tensile_machine_reading:.1f}" if calc.tensile_machine_reading else '',
-            'tensile_stress': f"{calc.tensile_stress:.2f}" if calc.tensile_stress else '',
-            'elongation': '',  # This field is not in the current model
-            'bend_test': ''    # This field is not in the current model
-        }
-        table_data.append(row_data)
+    table_data = [
+        format_report_row(i, calc)
+        for i, calc in enumerate(page, page.start_index)
+    ]
     
-    # Calculate summary statistics if we have data
+    # Summary statistics over the whole filtered selection, computed in SQL
     summary_data = {}
     if table_data:
-        # Extract numeric values for calculations
-        numeric_fields = ['mass', 'length', 'mass_per_meter', 'cross_section_area', 
-                         'calibrated_yield_load', 'yield_stress', 'calibrated_tensile_load', 'tensile_stress']
-        
-        for field in numeric_fields:
-            values = []
-            for row in table_data:
-                try:
-                    if row[field]:
-                        values.append(float(row[field]))
-                except (ValueError, TypeError):
-                    continue
-            
-            if values:
-                summary_data[field] = {
-                    'min': f"{min(values):.2f}",
-                    'max': f"{max(values):.2f}",
-                    'avg': f"{sum(values)/len(values):.2f}"
-                }
-            else:
-                summary_data[field] = {'min': '', 'max': '', 'avg': ''}
+        summary_data = format_summary(summarize_stress_calculations(filter_stress_calculations(filters)))
     
     context = {
         'table_data': table_data,
         'summary_data': summary_data,
         'total_records': len(table_data),
-        'header_data': header_data
+        'header_data': header_data,
+        'filters': filters,
+        'filter_query': filter_query_string(filters),
+        'page_query': filter_query_string(
+            {**filters, 'page_size': per_page} if per_page != REPORT_PAGE_SIZE else filters
+        ),
+        'page': page
     }
     
     return render(request, 'mechanical_inspection/mechanical_properties_report.html', context)
 
 
+def mechanical_inspection_summary(request):
+    """
+    Summary statistics for the report filters as JSON
+    """
+    try:
+        filters = parse_report_filters(request.GET)
+    except ValueError as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': str(e)
+        }, status=400)
+
+    summary = summarize_stress_calculations(filter_stress_calculations(filters))
+    return JsonResponse({
+        'status': 'success',
+        'filters': filter_query_string(filters),
+        'count': summary['count'],
+        'fields': summary['fields']
+    })
+
+
+LOT_STATISTICS_PAGE_SIZE = 100
+MAX_LOT_STATISTICS_PAGE_SIZE = 500
+
+
+def lot_statistics(request):
+    """
+    Precomputed yield / tensile stress statistics per lot and division type,
+    one keyset page at a time: pass next_cursor back as ?after= for the next
+    """
+    inspection_report = request.GET.get('inspection_report')
+    if inspection_report and not inspection_report.isdigit():
+        return JsonResponse({
+            'status': 'error',
+            'message': 'inspection_report must be a numeric id'
+        }, status=400)
+
+    try:
+        per_page = min(int(request.GET.get('page_size') or LOT_STATISTICS_PAGE_SIZE), MAX_LOT_STATISTICS_PAGE_SIZE)
+        if per_page < 1:
+            raise ValueError('page_size must be positive')
+        rows = keyset_page(
+            lot_statistics_for(int(inspection_report) if inspection_report else None),
+            LOT_STATISTICS_ORDERING,
+            per_page,
+            after=request.GET.get('after')
+        )
+    except ValueError as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': str(e)
+        }, status=400)
+
+    return JsonResponse({
+        'status': 'success',
+        'next_cursor': rows.next_cursor,
+        'lots': [
+            {
+                'inspection_report_id': row.inspection_report_id,
+                'lot_no': row.inspection_report.batch_number if row.inspection_report else None,
+                'division_type': row.division_type,
+                'count': row.count,
+                'yield_stress': {
+                    'min': row.yield_min,
+                    'max': row.yield_max,
+                    'avg': row.yield_mean,
+                    'stddev': row.yield_stddev
+                },
+                'tensile_stress': {
+                    'min': row.tensile_min,
+                    'max': row.tensile_max,
+                    'avg': row.tensile_mean,
+                    'stddev': row.tensile_stddev
+                }
+            }
+            for row in rows
+        ]
+    })
+
+
 @csrf_exempt
 def reset_database(request):
     """
@@ -549,9 +578,9 @@ def reset_database(request):
                 WaterSystem.objects.all().delete()
                 ScaleLoadMeasurements.objects.all().delete()
                 StressCalculation.objects.all().delete()
+                LotStatistics.objects.all().delete()
                 
-                # Log the reset action (optional)
-                print(f"Database reset performed by user: {username} at {datetime.now()}")
+                logger.warning('Database reset', extra={'event': {'user': username}})
                 
             return JsonResponse({
                 'status': 'success',
@@ -629,8 +658,7 @@ def user_login(request):
         # Log the user in
         login(request, user)
         
-        # Log the login action
-        print(f"User login successful: {username} at {datetime.now()}")
+        logger.info('User login', extra={'event': {'user': username}})
         
         return JsonResponse({
             'status': 'success',
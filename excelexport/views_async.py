@@ -0,0 +1,213 @@
+"""
+async def variants of the intake and login endpoints, for ASGI deployments.
+
+With settings.ASYNC_VIEWS (on by default when served through
+excel.asgi:application, e.g. `uvicorn excel.asgi:application`) these views
+answer /advanced_materials_testing/ and /user-login/ in place of the
+synchronous ones. JSON parsing, validation and the stress calculation run on
+the event loop; everything that blocks (database writes, password hashing
+and the login session) is handed to one bounded pool of settings.ASYNC_DB_THREADS
+threads. A lab station waiting on a busy database holds a queued job rather
+than a thread and a connection of its own, so one worker can keep hundreds
+of stations connected while SQLite sees at most ASYNC_DB_THREADS writers.
+"""
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import authenticate, login
+from django.db import close_old_connections
+from django.http.response import JsonResponse
+from django.shortcuts import render
+
+from .instrumentation import span, trace_queries
+from .idempotency import persist_once, request_key, stored_response
+from .intake_queue import SCOPE
+from .result_handles import calculation_results, intake_result
+from .stress_calculator import calculate_stress, parse_submission, store_submission, submission_ids
+from .views import queue_submission
+
+logger = logging.getLogger(__name__)
+
+_db_executor = ThreadPoolExecutor(max_workers=settings.ASYNC_DB_THREADS, thread_name_prefix='excelexport-db')
+
+
+def in_db_thread(func):
+    """
+    func as a coroutine function that runs on the database thread pool.
+
+    Each pool thread keeps its own connection; like a request, a job closes
+    it before and after running when it has outlived CONN_MAX_AGE or broke.
+    """
+    def job(*args, **kwargs):
+        close_old_connections()
+        try:
+            with trace_queries():
+                return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(job, thread_sensitive=False, executor=_db_executor)
+
+
+def csrf_exempt(view):
+    # Django 4.2's csrf_exempt wraps views in a sync function, hiding the coroutine
+    view.csrf_exempt = True
+    return view
+
+
+def _store_intake(request, key, cleaned, calculated_values):
+    if settings.INTAKE_WRITE_BEHIND:
+        # The key is journalled with the submission (see intake_queue)
+        return queue_submission(request, cleaned, calculated_values)
+
+    def persist():
+        ids = submission_ids(store_submission(cleaned, calculated_values))
+        return JsonResponse(intake_result(ids, calculation_results(calculated_values, cleaned['scale']['utn_scale'], ids)))
+
+    return persist_once(SCOPE, key, persist)
+
+
+@csrf_exempt
+async def advanced_materials_testing(request):
+    if request.method != 'POST':
+        return await in_db_thread(render)(request, 'advanced_materials_testing/advanced_materials_testing.html')
+
+    # A retry of a stored submission is answered before its body is even parsed
+    try:
+        key = request_key(request)
+    except ValueError as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': str(e)
+        }, status=400)
+    if key is not None:
+        replay = await in_db_thread(stored_response)(SCOPE, key)
+        if replay is not None:
+            return replay
+
+    try:
+        with span('parse'):
+            data = json.loads(request.body) if request.body else request.POST
+    except json.JSONDecodeError:
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Invalid JSON data format'
+        }, status=400)
+
+    if not isinstance(data, dict):
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Request data must be a JSON object'
+        }, status=400)
+
+    try:
+        with span('validate'):
+            cleaned = parse_submission(data)
+    except ValueError as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': str(e)
+        }, status=400)
+
+    try:
+        with span('calculate'):
+            calculated_values = calculate_stress(
+                mass=cleaned['sample']['mass'],
+                length=cleaned['sample']['length'],
+                **cleaned['scale']
+            )
+    except (ValueError, ZeroDivisionError) as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Invalid input - {str(e)}'
+        }, status=400)
+
+    try:
+        with span('persist'):
+            return await in_db_thread(_store_intake)(request, key, cleaned, calculated_values)
+    except Exception as e:
+        logger.exception('Error in async advanced_materials_testing view')
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Server error: {str(e)}'
+        }, status=500)
+
+
+def _authenticate_and_login(request, username, password):
+    user = authenticate(username=username, password=password)
+    if user is not None and user.is_active:
+        login(request, user)
+    return user
+
+
+@csrf_exempt
+async def user_login(request):
+    """
+    User login view for the popup login system
+    """
+    if request.method != 'POST':
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Only POST method allowed'
+        }, status=405)
+
+    try:
+        data = json.loads(request.body) if request.body else {}
+    except json.JSONDecodeError:
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Invalid JSON data'
+        }, status=400)
+
+    username = str(data.get('username', '')).strip() if isinstance(data, dict) else ''
+    password = data.get('password', '') if isinstance(data, dict) else ''
+    if not username:
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Username is required',
+            'field': 'username'
+        }, status=400)
+
+    if not password:
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Password is required',
+            'field': 'password'
+        }, status=400)
+
+    try:
+        # Password hashing is deliberately slow; keep it off the event loop
+        user = await in_db_thread(_authenticate_and_login)(request, username, password)
+    except Exception as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Server error: {str(e)}'
+        }, status=500)
+
+    if user is None:
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Invalid username or password',
+            'field': 'username'
+        }, status=401)
+
+    if not user.is_active:
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Account is disabled',
+            'field': 'username'
+        }, status=401)
+
+    logger.info('User login', extra={'event': {'user': username}})
+
+    return JsonResponse({
+        'status': 'success',
+        'message': 'Successfully logged in',
+        'username': user.username,
+        'user_id': user.id,
+        'is_staff': user.is_staff,
+        'is_superuser': user.is_superuser
+    })
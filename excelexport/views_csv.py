@@ -1,139 +1,213 @@
 import csv
-from django.http import HttpResponse
-from .models import StressCalculation, InspectionReport
+import time
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from .csv_export import CSV_EXPORTS, Echo, RunningStats, parse_after, stream_rows
+from .reports import (
+    REPORT_COLUMNS,
+    REPORT_HEADERS,
+    REPORT_TITLE,
+    SUMMARY_COLUMNS,
+    SUMMARY_FIELDS,
+    filter_stress_calculations,
+    format_report_row,
+    format_summary,
+    parse_report_filters,
+    report_header,
+    report_values
+)
+from . import metrics
+from .xlsx_writer import EXPORT_CHUNK_SIZE, StreamingWorkbook
+
+
+SUMMARY_ROWS = (('Min', 'min'), ('Max', 'max'), ('AVG', 'avg'), ('SD', 'stddev'))
+
+
+def _summary_rows(summary_data):
+    """Min / Max / AVG / SD rows laid out under the report columns"""
+    rows = []
+    for label, key in SUMMARY_ROWS:
+        row = [label, '', '']
+        row.extend(summary_data[field][key] for field in SUMMARY_FIELDS)
+        row.extend(['', ''])  # Elongation and Bend Test
+        rows.append(row)
+    return rows
+
+
+class RunningSummary:
+    """
+    The report's summary statistics, accumulated row by row while exporting;
+    result() has the shape of summarize_stress_calculations
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.stats = {field: RunningStats() for field in SUMMARY_COLUMNS}
+
+    def add(self, calc):
+        self.count += 1
+        for field, column in SUMMARY_COLUMNS.items():
+            value = calc
+            for attribute in column.split('__'):
+                value = getattr(value, attribute) if value is not None else None
+            self.stats[field].add(value)
+
+    def result(self):
+        return {
+            'count': self.count,
+            'fields': {field: stats.result() for field, stats in self.stats.items()}
+        }
+
+
+def _bad_filters(error):
+    return JsonResponse({
+        'status': 'error',
+        'message': str(error)
+    }, status=400)
+
 
 def mechanical_inspection_csv_export(request):
     """
     Export mechanical inspection report data as CSV
     """
-    # Fetch all stress calculations with related data
-    stress_calculations = StressCalculation.objects.select_related(
-        'sample_parameters', 'inspection_report'
-    ).order_by('created_at')[:15]  # Get oldest 15 records in ascending time order
-    
-    # Get header data from the latest inspection report
-    header_data = {
-        'section': '',
-        'lot_no': '',
-        'date_of_rolling': ''
-    }
-    
-    latest_inspection = InspectionReport.objects.order_by('-created_at').first()
-    if latest_inspection:
-        header_data['section'] = latest_inspection.section
-        header_data['lot_no'] = latest_inspection.batch_number
-        header_data['date_of_rolling'] = latest_inspection.date.strftime('%Y-%m-%d')
-    
-    # Create the HttpResponse object with CSV header
-    response = HttpResponse(content_type='text/csv')
+    started = time.perf_counter()
+    try:
+        filters = parse_report_filters(request.GET)
+    except ValueError as e:
+        return _bad_filters(e)
+
+    stress_calculations = filter_stress_calculations(filters)
+    header_data = report_header(filters)
+
+    def generate():
+        writer = csv.writer(Echo())
+
+        # Write header information
+        yield writer.writerow([REPORT_TITLE])
+        yield writer.writerow([])  # Empty row
+        yield writer.writerow(['Section:', header_data['section']])
+        yield writer.writerow(['Lot No:', header_data['lot_no']])
+        yield writer.writerow(['Date of Rolling:', header_data['date_of_rolling']])
+        yield writer.writerow([])  # Empty row
+        yield writer.writerow(REPORT_HEADERS)
+
+        # Write data rows, summarizing them on the way
+        running = RunningSummary()
+        rows = 0
+        for rows, calc in enumerate(stress_calculations.iterator(chunk_size=EXPORT_CHUNK_SIZE), 1):
+            running.add(calc)
+            row_data = format_report_row(rows, calc)
+            yield writer.writerow([row_data[field] for field, _, _ in REPORT_COLUMNS])
+
+        # Add summary statistics if we have data
+        summary = running.result()
+        if summary['count']:
+            yield writer.writerow([])  # Empty row
+            for row in _summary_rows(format_summary(summary)):
+                yield writer.writerow(row)
+
+        # Only reached when the client read the whole file
+        metrics.record_export('mechanical_inspection_csv', rows, started)
+        metrics.flush_soon()
+
+    response = StreamingHttpResponse(generate(), content_type='text/csv')
     response['Content-Disposition'] = 'attachment; filename="mechanical_properties_report.csv"'
-    
-    writer = csv.writer(response)
-    
-    # Write header information
-    writer.writerow(['Final Inspection Report - Mechanical Properties'])
-    writer.writerow([])  # Empty row
-    writer.writerow(['Section:', header_data['section']])
-    writer.writerow(['Lot No:', header_data['lot_no']])
-    writer.writerow(['Date of Rolling:', header_data['date_of_rolling']])
-    writer.writerow([])  # Empty row
-    
-    # Write table headers
-    headers = [
-        'S. No', 'Heat Number', 'Time', 'Mass (kg)', 'Length (m)', 
-        'Mass/Meter (kg/m)', 'Cross Sec Area (mm²)', 'Calibrated Yield Load (kN)',
-        'Yield Stress (N/mm²)', 'Calibrated Tensile Load (kN)', 'Tensile Stress (N/mm²)',
-        'Elongation %', 'Bend Test'
-    ]
-    writer.writerow(headers)
-    
-    # Write data rows
-    for i, calc in enumerate(stress_calculations, 1):
-        sample = calc.sample_parameters
-        
-        row = [
-            i,  # Serial number
-            sample.heat_number if sample else '',
-            calc.created_at.strftime('%H:%M:%S') if calc.created_at else '',
-            f"{sample.mass:.2f}" if sample and sample.mass else '',
-            f"{sample.length:.3f}" if sample and sample.length else '',
-            f"{calc.mass_per_meter:.4f}" if calc.mass_per_meter else '',
-            f"{calc.cross_section_area:.2f}" if calc.cross_section_area else '',
-            f"{calc.yield_machine_reading:.1f}" if calc.yield_machine_reading else '',
-            f"{calc.yield_stress:.2f}" if calc.yield_stress else '',
-            f"{calc.tensile_machine_reading:.1f}" if calc.tensile_machine_reading else '',
-            f"{calc.tensile_stress:.2f}" if calc.tensile_stress else '',
-            '',  # Elongation - not in current model
-            ''   # Bend Test - not in current model
-        ]
-        writer.writerow(row)
-    
-    # Add summary statistics if we have data
-    if stress_calculations:
-        writer.writerow([])  # Empty row
-        
-        # Calculate summary statistics
-        numeric_data = {
-            'mass': [],
-            'length': [],
-            'mass_per_meter': [],
-            'cross_section_area': [],
-            'calibrated_yield_load': [],
-            'yield_stress': [],
-            'calibrated_tensile_load': [],
-            'tensile_stress': []
-        }
-        
-        for calc in stress_calculations:
-            sample = calc.sample_parameters
-            if sample and sample.mass:
-                numeric_data['mass'].append(sample.mass)
-            if sample and sample.length:
-                numeric_data['length'].append(sample.length)
-            if calc.mass_per_meter:
-                numeric_data['mass_per_meter'].append(calc.mass_per_meter)
-            if calc.cross_section_area:
-                numeric_data['cross_section_area'].append(calc.cross_section_area)
-            if calc.yield_machine_reading:
-                numeric_data['calibrated_yield_load'].append(calc.yield_machine_reading)
-            if calc.yield_stress:
-                numeric_data['yield_stress'].append(calc.yield_stress)
-            if calc.tensile_machine_reading:
-                numeric_data['calibrated_tensile_load'].append(calc.tensile_machine_reading)
-            if calc.tensile_stress:
-                numeric_data['tensile_stress'].append(calc.tensile_stress)
-        
-        # Write Min row
-        min_row = ['Min', '', '']
-        for field in ['mass', 'length', 'mass_per_meter', 'cross_section_area', 
-                     'calibrated_yield_load', 'yield_stress', 'calibrated_tensile_load', 'tensile_stress']:
-            if numeric_data[field]:
-                min_row.append(f"{min(numeric_data[field]):.2f}")
-            else:
-                min_row.append('')
-        min_row.extend(['', ''])  # Elongation and Bend Test
-        writer.writerow(min_row)
-        
-        # Write Max row
-        max_row = ['Max', '', '']
-        for field in ['mass', 'length', 'mass_per_meter', 'cross_section_area', 
-                     'calibrated_yield_load', 'yield_stress', 'calibrated_tensile_load', 'tensile_stress']:
-            if numeric_data[field]:
-                max_row.append(f"{max(numeric_data[field]):.2f}")
-            else:
-                max_row.append('')
-        max_row.extend(['', ''])  # Elongation and Bend Test
-        writer.writerow(max_row)
-        
-        # Write Average row
-        avg_row = ['AVG', '', '']
-        for field in ['mass', 'length', 'mass_per_meter', 'cross_section_area', 
-                     'calibrated_yield_load', 'yield_stress', 'calibrated_tensile_load', 'tensile_stress']:
-            if numeric_data[field]:
-                avg_row.append(f"{sum(numeric_data[field])/len(numeric_data[field]):.2f}")
-            else:
-                avg_row.append('')
-        avg_row.extend(['', ''])  # Elongation and Bend Test
-        writer.writerow(avg_row)
-    
-    return response
\ No newline at end of file
+    return response
+
+
+def mechanical_inspection_xlsx_export(request):
+    """
+    Export mechanical inspection report data as XLSX
+    """
+    started = time.perf_counter()
+    try:
+        filters = parse_report_filters(request.GET)
+    except ValueError as e:
+        return _bad_filters(e)
+
+    stress_calculations = filter_stress_calculations(filters)
+    header_data = report_header(filters)
+
+    export = StreamingWorkbook('Mechanical Properties')
+    last_column = chr(ord('A') + len(REPORT_COLUMNS) - 1)
+    export.merge(f'A1:{last_column}1')
+    export.append([REPORT_TITLE], styles=['export_title'])
+    export.append([])
+    export.append(['Section:', header_data['section']], styles=['export_label', None])
+    export.append(['Lot No:', header_data['lot_no']], styles=['export_label', None])
+    export.append(['Date of Rolling:', header_data['date_of_rolling']], styles=['export_label', None])
+    export.append([])
+    export.append(REPORT_HEADERS, styles=['export_header'] * len(REPORT_HEADERS))
+
+    running = RunningSummary()
+    rows = 0
+    for rows, calc in enumerate(stress_calculations.iterator(chunk_size=EXPORT_CHUNK_SIZE), 1):
+        running.add(calc)
+        values = report_values(calc)
+        values['serial_no'] = rows
+        export.append([
+            round(values[field], places) if places is not None and values[field] is not None else values[field]
+            for field, _, places in REPORT_COLUMNS
+        ])
+
+    summary = running.result()
+    if summary['count']:
+        export.append([])
+        for label, key in SUMMARY_ROWS:
+            stats = summary['fields']
+            export.append(
+                [label, '', ''] + [
+                    round(stats[field][key], 2) if stats[field][key] is not None else None
+                    for field in SUMMARY_FIELDS
+                ],
+                styles=['export_label']
+            )
+
+    response = export.response('mechanical_properties_report.xlsx')
+    metrics.record_export('mechanical_inspection_xlsx', rows, started)
+    return response
+
+
+def mechanical_inspection_export(request):
+    """
+    Server-side export of the mechanical inspection report.
+
+    ?format=xlsx (default) or ?format=csv, combined with the report filters
+    lot, inspection_report, date_from and date_to.
+    """
+    export_format = request.GET.get('format', 'xlsx').lower()
+    if export_format == 'csv':
+        return mechanical_inspection_csv_export(request)
+    if export_format == 'xlsx':
+        return mechanical_inspection_xlsx_export(request)
+    return JsonResponse({
+        'status': 'error',
+        'message': 'format must be xlsx or csv'
+    }, status=400)
+
+
+def table_csv_export(request, name):
+    """
+    Stream one table as CSV (see csv_export): /exports/<name>.csv, where name
+    is stress-calculations, sample-parameters, water-systems or countries-gdp.
+    Resume an interrupted download with ?after=<last id received>.
+    """
+    export = CSV_EXPORTS.get(name)
+    if export is None:
+        raise Http404('Unknown export')
+
+    started = time.perf_counter()
+    try:
+        queryset = export.queryset(request.GET)
+        after = parse_after(request.GET.get('after'))
+    except ValueError as e:
+        return _bad_filters(e)
+
+    def done(rows):
+        # Only reached when the client read the whole file
+        metrics.record_export(f'{name}_csv', rows, started)
+        metrics.flush_soon()
+
+    response = StreamingHttpResponse(stream_rows(export, queryset, after, done), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{name}.csv"'
+    response['Accept-Ranges'] = 'none'
+    return response
@@ -1,5 +1,6 @@
 import requests
 import json
+import uuid
 
 # URL of the advanced_materials_testing endpoint
 url = 'http://127.0.0.1:8000/advanced_materials_testing/'
@@ -27,11 +28,11 @@ data = {
     }
 }
 
-# Send POST request
+# Send POST request; a resend with the same Idempotency-Key is stored only once
 response = requests.post(
     url,
     data=json.dumps(data),
-    headers={'Content-Type': 'application/json'}
+    headers={'Content-Type': 'application/json', 'Idempotency-Key': str(uuid.uuid4())}
 )
 
 # Print response